@@ -1,26 +1,87 @@
+import csv
+import io
+import json
+import zlib
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
-from app.database.connection import get_db
-from app.database.models import Interaction
+from app.database.async_connection import get_async_db, AsyncSessionLocal
+from app.database.dialect import date_trunc
+from app.database.models import Interaction, InteractionRollup
+from app.database.rollups import hour_bucket
+from app.api.pagination import keyset_page
 
 router = APIRouter()
 
 
+async def _count(db, *criteria):
+    return await db.scalar(
+        select(func.count()).select_from(Interaction).where(*criteria))
+
+
+# ستون‌های خروجی export به ترتیب ستون‌های CSV
+EXPORT_COLUMNS = [
+    Interaction.id,
+    Interaction.account_id,
+    Interaction.session_id,
+    Interaction.interaction_type,
+    Interaction.target_user_id,
+    Interaction.target_user_username,
+    Interaction.target_media_id,
+    Interaction.target_media_shortcode,
+    Interaction.content,
+    Interaction.created_at,
+    Interaction.success,
+    Interaction.error
+]
+
+# تعداد ردیف هر دسته خواندن از cursor سمت سرور
+EXPORT_BATCH_SIZE = 1000
+
+
+def _filter_criteria(type=None, username=None, success=None, account_id=None, days=30):
+    """شرط‌های کوئری فیلتر تعاملات (days صفر یا منفی یعنی کل تاریخچه)"""
+    criteria = []
+
+    # محدوده زمانی
+    if days and days > 0:
+        criteria.append(
+            Interaction.created_at >= datetime.now() - timedelta(days=days))
+
+    # اعمال فیلترها
+    if type:
+        criteria.append(Interaction.interaction_type == type)
+
+    if username:
+        criteria.append(Interaction.target_user_username == username)
+
+    if success is not None:
+        criteria.append(Interaction.success == success)
+
+    if account_id:
+        criteria.append(Interaction.account_id == account_id)
+
+    return criteria
+
+
 @router.get("/recent")
-def get_recent_interactions(limit: int = 50, db: Session = Depends(get_db)):
-    """دریافت تعاملات اخیر بات"""
-    interactions = db.query(Interaction).order_by(
-        Interaction.created_at.desc()
-    ).limit(limit).all()
+async def get_recent_interactions(limit: int = 50, cursor: Optional[str] = None,
+                                  db: AsyncSession = Depends(get_async_db)):
+    """دریافت تعاملات اخیر بات (صفحه‌بندی با نشانگر)"""
+    interactions, next_cursor, prev_cursor = await keyset_page(
+        db, [], limit, cursor)
 
     # تبدیل داده‌ها به فرمت مناسب
     result = []
     for interaction in interactions:
         result.append({
             "id": interaction.id,
+            "account_id": interaction.account_id,
             "type": interaction.interaction_type,
             "target_username": interaction.target_user_username,
             "target_media_shortcode": interaction.target_media_shortcode,
@@ -32,30 +93,31 @@ def get_recent_interactions(limit: int = 50, db: Session = Depends(get_db)):
 
     return {
         "limit": limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "interactions": result
     }
 
 
 @router.get("/by-type/{interaction_type}")
-def get_interactions_by_type(interaction_type: str, limit: int = 50, db: Session = Depends(get_db)):
-    """دریافت تعاملات بر اساس نوع"""
+async def get_interactions_by_type(interaction_type: str, limit: int = 50, cursor: Optional[str] = None,
+                                   db: AsyncSession = Depends(get_async_db)):
+    """دریافت تعاملات بر اساس نوع (صفحه‌بندی با نشانگر)"""
     # بررسی معتبر بودن نوع تعامل
     valid_types = ["like", "comment", "follow", "unfollow", "view_story", "dm"]
     if interaction_type not in valid_types:
         raise HTTPException(
             status_code=400, detail=f"نوع تعامل نامعتبر. گزینه‌های مجاز: {', '.join(valid_types)}")
 
-    interactions = db.query(Interaction).filter(
-        Interaction.interaction_type == interaction_type
-    ).order_by(
-        Interaction.created_at.desc()
-    ).limit(limit).all()
+    interactions, next_cursor, prev_cursor = await keyset_page(
+        db, [Interaction.interaction_type == interaction_type], limit, cursor)
 
     # تبدیل داده‌ها به فرمت مناسب
     result = []
     for interaction in interactions:
         result.append({
             "id": interaction.id,
+            "account_id": interaction.account_id,
             "type": interaction.interaction_type,
             "target_username": interaction.target_user_username,
             "target_media_shortcode": interaction.target_media_shortcode,
@@ -68,24 +130,25 @@ def get_interactions_by_type(interaction_type: str, limit: int = 50, db: Session
     return {
         "type": interaction_type,
         "limit": limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "interactions": result
     }
 
 
 @router.get("/by-username/{username}")
-def get_interactions_by_username(username: str, limit: int = 50, db: Session = Depends(get_db)):
-    """دریافت تعاملات با یک کاربر خاص"""
-    interactions = db.query(Interaction).filter(
-        Interaction.target_user_username == username
-    ).order_by(
-        Interaction.created_at.desc()
-    ).limit(limit).all()
+async def get_interactions_by_username(username: str, limit: int = 50, cursor: Optional[str] = None,
+                                       db: AsyncSession = Depends(get_async_db)):
+    """دریافت تعاملات با یک کاربر خاص (صفحه‌بندی با نشانگر)"""
+    interactions, next_cursor, prev_cursor = await keyset_page(
+        db, [Interaction.target_user_username == username], limit, cursor)
 
     # تبدیل داده‌ها به فرمت مناسب
     result = []
     for interaction in interactions:
         result.append({
             "id": interaction.id,
+            "account_id": interaction.account_id,
             "type": interaction.interaction_type,
             "target_username": interaction.target_user_username,
             "target_media_shortcode": interaction.target_media_shortcode,
@@ -98,46 +161,36 @@ def get_interactions_by_username(username: str, limit: int = 50, db: Session = D
     return {
         "username": username,
         "limit": limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "interactions": result
     }
 
 
 @router.get("/filter")
-def filter_interactions(
+async def filter_interactions(
     type: Optional[str] = None,
     username: Optional[str] = None,
     success: Optional[bool] = None,
+    account_id: Optional[str] = None,
     days: int = 30,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """فیلتر کردن تعاملات بر اساس معیارهای مختلف"""
-    # محدوده زمانی
-    date_limit = datetime.now() - timedelta(days=days)
-
-    # ساخت کوئری
-    query = db.query(Interaction).filter(Interaction.created_at >= date_limit)
-
-    # اعمال فیلترها
-    if type:
-        query = query.filter(Interaction.interaction_type == type)
-
-    if username:
-        query = query.filter(Interaction.target_user_username == username)
-
-    if success is not None:
-        query = query.filter(Interaction.success == success)
+    criteria = _filter_criteria(type, username, success, account_id, days)
 
     # دریافت نتایج
-    total = query.count()
-    interactions = query.order_by(
-        Interaction.created_at.desc()).limit(limit).all()
+    total = await _count(db, *criteria)
+    interactions = (await db.scalars(select(Interaction).where(*criteria).order_by(
+        Interaction.created_at.desc()).limit(limit))).all()
 
     # تبدیل داده‌ها به فرمت مناسب
     result = []
     for interaction in interactions:
         result.append({
             "id": interaction.id,
+            "account_id": interaction.account_id,
             "type": interaction.interaction_type,
             "target_username": interaction.target_user_username,
             "target_media_shortcode": interaction.target_media_shortcode,
@@ -152,6 +205,7 @@ def filter_interactions(
             "type": type,
             "username": username,
             "success": success,
+            "account_id": account_id,
             "days": days
         },
         "total": total,
@@ -160,19 +214,82 @@ def filter_interactions(
     }
 
 
+@router.get("/export")
+async def export_interactions(
+    format: str = "ndjson",
+    gzip: bool = False,
+    type: Optional[str] = None,
+    username: Optional[str] = None,
+    success: Optional[bool] = None,
+    account_id: Optional[str] = None,
+    days: int = 30
+):
+    """خروجی جریانی تعاملات به صورت NDJSON یا CSV با فیلترهای /filter
+
+    ردیف‌ها دسته به دسته از cursor سمت سرور (yield_per) خوانده و بلافاصله
+    ارسال می‌شوند، بنابراین مصرف حافظه به تعداد ردیف‌ها بستگی ندارد. با
+    gzip=true خروجی در حین ارسال فشرده می‌شود.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(
+            status_code=400, detail="فرمت نامعتبر. گزینه‌های مجاز: ndjson, csv")
+
+    criteria = _filter_criteria(type, username, success, account_id, days)
+    query = select(*EXPORT_COLUMNS).where(*criteria).order_by(
+        Interaction.created_at, Interaction.id
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    names = [column.key for column in EXPORT_COLUMNS]
+
+    def encode(rows):
+        rows = [[value.isoformat() if isinstance(value, datetime) else value
+                 for value in row] for row in rows]
+        if format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            return buffer.getvalue()
+        return "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n"
+                       for row in rows)
+
+    async def generate():
+        compressor = zlib.compressobj(wbits=31) if gzip else None
+
+        def emit(text):
+            data = text.encode()
+            return compressor.compress(data) if compressor else data
+
+        if format == "csv":
+            yield emit(",".join(names) + "\n")
+        # نشست جدا تا cursor تا پایان ارسال پاسخ باز بماند
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query)
+            async for rows in result.partitions():
+                yield emit(encode(rows))
+        if compressor:
+            yield compressor.flush()
+
+    filename = f"interactions.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else (
+        "text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(generate(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'})
+
+
 @router.get("/summary")
-def get_interactions_summary(days: int = 30, db: Session = Depends(get_db)):
-    """دریافت خلاصه تعاملات بات"""
+async def get_interactions_summary(days: int = 30, db: AsyncSession = Depends(get_async_db)):
+    """دریافت خلاصه تعاملات بات (از شمارنده‌های ساعتی، با دقت یک ساعت)"""
     # محدوده زمانی
     date_limit = datetime.now() - timedelta(days=days)
 
-    # آمار کلی
-    total_count = db.query(Interaction).filter(
-        Interaction.created_at >= date_limit).count()
-    success_count = db.query(Interaction).filter(
-        Interaction.created_at >= date_limit,
-        Interaction.success == True
-    ).count()
+    # شمارش کل و موفق به تفکیک روز و نوع در یک کوئری
+    day = date_trunc("day", InteractionRollup.bucket).label("day")
+    rows = (await db.execute(select(
+        day,
+        InteractionRollup.interaction_type,
+        func.sum(InteractionRollup.total).label("total"),
+        func.sum(InteractionRollup.success).label("success")
+    ).where(
+        InteractionRollup.bucket >= hour_bucket(date_limit)
+    ).group_by(day, InteractionRollup.interaction_type))).all()
 
     # آمار به تفکیک نوع تعامل
     interaction_types = ["like", "comment",
@@ -180,16 +297,10 @@ def get_interactions_summary(days: int = 30, db: Session = Depends(get_db)):
     type_stats = {}
 
     for type_name in interaction_types:
-        type_count = db.query(Interaction).filter(
-            Interaction.created_at >= date_limit,
-            Interaction.interaction_type == type_name
-        ).count()
-
-        type_success_count = db.query(Interaction).filter(
-            Interaction.created_at >= date_limit,
-            Interaction.interaction_type == type_name,
-            Interaction.success == True
-        ).count()
+        type_count = sum(
+            row.total for row in rows if row.interaction_type == type_name)
+        type_success_count = sum(
+            row.success for row in rows if row.interaction_type == type_name)
 
         type_stats[type_name] = {
             "total": type_count,
@@ -197,20 +308,19 @@ def get_interactions_summary(days: int = 30, db: Session = Depends(get_db)):
             "success_rate": (type_success_count / type_count * 100) if type_count > 0 else 0
         }
 
-    # آمار روزانه - تعداد کل تعاملات در هر روز
-    daily_stats = {}
-
-    for day in range(days):
-        day_date = datetime.now() - timedelta(days=day)
-        day_start = day_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-
-        day_count = db.query(Interaction).filter(
-            Interaction.created_at >= day_start,
-            Interaction.created_at < day_end
-        ).count()
+    # آمار کلی
+    total_count = sum(row.total for row in rows)
+    success_count = sum(row.success for row in rows)
 
-        daily_stats[day_date.strftime("%Y-%m-%d")] = day_count
+    # آمار روزانه - تعداد کل تعاملات در هر روز
+    daily_stats = {
+        (datetime.now() - timedelta(days=day)).strftime("%Y-%m-%d"): 0
+        for day in range(days)
+    }
+    for row in rows:
+        key = row.day.strftime("%Y-%m-%d")
+        if key in daily_stats:
+            daily_stats[key] += row.total
 
     # نتیجه نهایی
     return {
@@ -228,51 +338,46 @@ def get_interactions_summary(days: int = 30, db: Session = Depends(get_db)):
 
 
 @router.get("/most-interacted")
-def get_most_interacted_users(limit: int = 10, days: int = 30, db: Session = Depends(get_db)):
-    """دریافت کاربرانی که بیشترین تعامل با آنها انجام شده است"""
+async def get_most_interacted_users(limit: int = 10, days: int = 30, type: Optional[str] = None,
+                                    success: Optional[bool] = None, db: AsyncSession = Depends(get_async_db)):
+    """دریافت کاربرانی که بیشترین تعامل با آنها انجام شده است
+
+    شمارش و مرتب‌سازی با یک کوئری گروه‌بندی شده در دیتابیس انجام می‌شود
+    (ایندکس ix_interactions_created_username) و فقط limit ردیف برمی‌گردد.
+    """
+    valid_types = ["like", "comment", "follow", "unfollow", "view_story", "dm"]
+    if type and type not in valid_types:
+        raise HTTPException(
+            status_code=400, detail=f"نوع تعامل نامعتبر. گزینه‌های مجاز: {', '.join(valid_types)}")
+
     # محدوده زمانی
     date_limit = datetime.now() - timedelta(days=days)
-
-    # دریافت تمام تعاملات
-    interactions = db.query(Interaction).filter(
+    criteria = [
         Interaction.created_at >= date_limit,
         Interaction.target_user_username != None
-    ).all()
-
-    # شمارش تعاملات به تفکیک کاربر
-    user_interactions = {}
-
-    for interaction in interactions:
-        username = interaction.target_user_username
-
-        if username not in user_interactions:
-            user_interactions[username] = {
-                "username": username,
-                "total": 0,
-                "like": 0,
-                "comment": 0,
-                "follow": 0,
-                "unfollow": 0,
-                "view_story": 0,
-                "dm": 0,
-                "success": 0
-            }
-
-        user_interactions[username]["total"] += 1
-        user_interactions[username][interaction.interaction_type] += 1
-
-        if interaction.success:
-            user_interactions[username]["success"] += 1
-
-    # تبدیل به لیست و مرتب‌سازی
-    users_list = list(user_interactions.values())
-    users_list.sort(key=lambda x: x["total"], reverse=True)
-
-    # محدود کردن تعداد نتایج
-    result = users_list[:limit]
+    ]
+    if type:
+        criteria.append(Interaction.interaction_type == type)
+    if success is not None:
+        criteria.append(Interaction.success == success)
+
+    # شمارش تعاملات به تفکیک کاربر و نوع
+    total = func.count().label("total")
+    query = select(
+        Interaction.target_user_username.label("username"),
+        total,
+        *[func.count().filter(Interaction.interaction_type == type_name).label(type_name)
+          for type_name in valid_types],
+        func.count().filter(Interaction.success == True).label("success")
+    ).where(*criteria).group_by(
+        Interaction.target_user_username
+    ).order_by(total.desc(), Interaction.target_user_username).limit(limit)
+
+    result = [dict(row._mapping) for row in (await db.execute(query)).all()]
 
     return {
         "period_days": days,
         "limit": limit,
+        "filters": {"type": type, "success": success},
         "users": result
     }
@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, tuple_
+
+from app.database.models import Interaction, InteractionRollup
+
+# حالت‌های محاسبه تعداد کل: شمارش دقیق، تخمین از شمارنده‌های ساعتی یا بدون تعداد
+TOTAL_MODES = ("exact", "estimate", "none")
+
+
+def encode_cursor(interaction, direction):
+    """نشانگر مات صفحه: موقعیت (created_at, id) و جهت حرکت"""
+    payload = json.dumps({
+        "t": interaction.created_at.isoformat(),
+        "i": interaction.id,
+        "d": direction
+    }, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(payload["t"]), int(payload["i"]), direction
+    except Exception:
+        raise HTTPException(status_code=400, detail="نشانگر صفحه نامعتبر است")
+
+
+async def keyset_page(db, criteria, limit, cursor=None):
+    """یک صفحه از تعاملات به ترتیب نزولی (created_at, id)
+
+    به جای OFFSET از مقایسه ردیفی با آخرین موقعیت دیده شده استفاده می‌شود،
+    بنابراین هزینه هر صفحه به عمق آن در تاریخچه بستگی ندارد. خروجی:
+    (تعاملات، نشانگر صفحه بعد (قدیمی‌تر)، نشانگر صفحه قبل (جدیدتر)).
+    """
+    key = tuple_(Interaction.created_at, Interaction.id)
+    query = select(Interaction).where(*criteria)
+    direction = "next"
+
+    if cursor:
+        created_at, interaction_id, direction = decode_cursor(cursor)
+        position = tuple_(created_at, interaction_id)
+        query = query.where(key < position if direction == "next" else key > position)
+
+    if direction == "next":
+        query = query.order_by(Interaction.created_at.desc(), Interaction.id.desc())
+    else:
+        query = query.order_by(Interaction.created_at, Interaction.id)
+
+    # یک ردیف اضافه برای تشخیص وجود صفحه بعدی در همین جهت
+    rows = (await db.scalars(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+
+    if direction == "next":
+        next_cursor = encode_cursor(rows[-1], "next") if has_more else None
+        prev_cursor = encode_cursor(rows[0], "prev") if cursor else None
+    else:
+        next_cursor = encode_cursor(rows[-1], "next")
+        prev_cursor = encode_cursor(rows[0], "prev") if has_more else None
+    return rows, next_cursor, prev_cursor
+
+
+async def count_total(db, mode, criteria, rollup_criteria=None):
+    """تعداد کل برای صفحه‌بندی
+
+    mode=exact شمارش دقیق روی interactions، mode=estimate جمع شمارنده‌های
+    ساعتی interaction_rollups (فقط وقتی فیلترها در آن جدول موجود باشند) و
+    در غیر این صورت None.
+    """
+    if mode not in TOTAL_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"مقدار total نامعتبر. گزینه‌های مجاز: {', '.join(TOTAL_MODES)}")
+    if mode == "exact":
+        return await db.scalar(
+            select(func.count()).select_from(Interaction).where(*criteria))
+    if mode == "estimate" and rollup_criteria is not None:
+        return await db.scalar(select(
+            func.coalesce(func.sum(InteractionRollup.total), 0)
+        ).where(*rollup_criteria))
+    return None
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+
+from app.config import DEFAULT_ACCOUNT_ID
+from app.database.connection import get_db
+from app.database.models import ActionQueueItem
+from app.bot.action_queue import ActionQueue, ACTION_TYPES
+
+router = APIRouter()
+
+
+class QueueItemIn(BaseModel):
+    action_type: str
+    account_id: Optional[str] = None
+    target_user_id: Optional[str] = None
+    target_user_username: Optional[str] = None
+    target_media_id: Optional[str] = None
+    target_media_shortcode: Optional[str] = None
+    content: Optional[str] = None
+    priority: int = 0
+    not_before: Optional[datetime] = None
+    max_attempts: int = 3
+    idempotency_key: Optional[str] = None
+
+
+class QueueBulkIn(BaseModel):
+    items: List[QueueItemIn]
+
+
+@router.post("/bulk")
+def submit_bulk(payload: QueueBulkIn):
+    """افزودن گروهی عملیات به صف؛ موارد تکراری نادیده گرفته می‌شوند"""
+    items = []
+    for item in payload.items:
+        if item.action_type not in ACTION_TYPES:
+            raise HTTPException(
+                status_code=400, detail=f"نوع عملیات نامعتبر. گزینه‌های مجاز: {', '.join(ACTION_TYPES)}")
+        if item.action_type in ("like", "comment") and not item.target_media_id:
+            raise HTTPException(
+                status_code=400, detail=f"برای {item.action_type} شناسه پست لازم است")
+        if item.action_type not in ("like", "comment") and not item.target_user_id:
+            raise HTTPException(
+                status_code=400, detail=f"برای {item.action_type} شناسه کاربر لازم است")
+
+        data = item.dict()
+        data["account_id"] = item.account_id or DEFAULT_ACCOUNT_ID
+        data["source"] = "api"
+        items.append(data)
+
+    try:
+        queued = ActionQueue().enqueue_many(items)
+    except Exception:
+        # خطا در enqueue_many لاگ شده است؛ هیچ عملیاتی به صف اضافه نشده
+        raise HTTPException(
+            status_code=503, detail="خطا در دیتابیس؛ عملیات به صف اضافه نشد")
+    return {
+        "submitted": len(items),
+        "queued": queued,
+        "duplicates": len(items) - queued
+    }
+
+
+@router.get("/stats")
+def get_queue_stats(account_id: Optional[str] = None):
+    """تعداد عملیات صف به تفکیک وضعیت و نوع"""
+    queue = ActionQueue(account_id)
+    return {
+        "account_id": account_id,
+        "ready": queue.pending_count(),
+        "by_status": queue.stats()
+    }
+
+
+@router.get("/")
+def list_queue(status: Optional[str] = None, account_id: Optional[str] = None,
+               limit: int = 50, db: Session = Depends(get_db)):
+    """فهرست عملیات صف"""
+    query = db.query(ActionQueueItem)
+    if status:
+        query = query.filter(ActionQueueItem.status == status)
+    if account_id:
+        query = query.filter(ActionQueueItem.account_id == account_id)
+
+    items = query.order_by(
+        ActionQueueItem.priority.desc(),
+        ActionQueueItem.not_before
+    ).limit(limit).all()
+
+    return {
+        "count": len(items),
+        "items": [{
+            "id": item.id,
+            "account_id": item.account_id,
+            "action_type": item.action_type,
+            "target_username": item.target_user_username,
+            "target_media_shortcode": item.target_media_shortcode,
+            "priority": item.priority,
+            "not_before": item.not_before.isoformat() if item.not_before else None,
+            "status": item.status,
+            "attempts": item.attempts,
+            "source": item.source,
+            "last_error": item.last_error,
+            "created_at": item.created_at.isoformat() if item.created_at else None
+        } for item in items]
+    }
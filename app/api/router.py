@@ -1,27 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
-from app.database.connection import get_db
-from app.database.models import Interaction, DailyStats
+from app.database.async_connection import get_async_db
+from app.database.dialect import date_trunc
+from app.database.models import DailyStats, Interaction, InteractionRollup
+from app.database.rollups import TYPE_KEYS, hour_bucket, success_by_type
+from app.api.pagination import keyset_page, count_total
 
 router = APIRouter()
 
 
+async def _daily_rows(db, date_limit, account_id=None):
+    """ردیف‌های آمار روزانه از date_limit به بعد"""
+    query = select(DailyStats).where(DailyStats.date >= date_limit)
+    if account_id:
+        query = query.where(DailyStats.account_id == account_id)
+    return (await db.scalars(query.order_by(DailyStats.date))).all()
+
+
+async def _period_rows(db, unit, date_limit, account_id=None):
+    """جمع تعاملات موفق هر نوع به تفکیک هفته یا ماه در یک کوئری روی interaction_rollups"""
+    period = date_trunc(unit, InteractionRollup.bucket).label("period")
+    day = date_trunc("day", InteractionRollup.bucket)
+    query = select(
+        period,
+        *success_by_type(),
+        func.coalesce(func.sum(InteractionRollup.success), 0).label("total"),
+        func.count(func.distinct(day)).label("days_count")
+    ).where(InteractionRollup.bucket >= hour_bucket(date_limit))
+    if account_id:
+        query = query.where(InteractionRollup.account_id == account_id)
+    return (await db.execute(query.group_by(period).order_by(period))).all()
+
+
+def _period_counts(row):
+    counts = {key: row._mapping[key] for key in TYPE_KEYS.values()}
+    counts["total"] = row.total
+    counts["days_count"] = row.days_count
+    return counts
+
+
 @router.get("/stats/daily")
-def get_daily_stats(days: int = 7, db: Session = Depends(get_db)):
+async def get_daily_stats(days: int = 7, account_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """دریافت آمار روزانه بات"""
     date_limit = datetime.now() - timedelta(days=days)
 
-    stats = db.query(DailyStats).filter(
-        DailyStats.date >= date_limit
-    ).order_by(DailyStats.date).all()
+    stats = await _daily_rows(db, date_limit, account_id)
 
     return {
         "days": days,
         "stats": [
             {
+                "account_id": stat.account_id,
                 "date": stat.date.strftime("%Y-%m-%d"),
                 "likes": stat.likes_count,
                 "comments": stat.comments_count,
@@ -38,51 +71,16 @@ def get_daily_stats(days: int = 7, db: Session = Depends(get_db)):
 
 
 @router.get("/stats/weekly")
-def get_weekly_stats(weeks: int = 4, db: Session = Depends(get_db)):
+async def get_weekly_stats(weeks: int = 4, account_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """دریافت آمار هفتگی بات"""
     date_limit = datetime.now() - timedelta(weeks=weeks)
 
-    # دریافت آمار روزانه
-    daily_stats = db.query(DailyStats).filter(
-        DailyStats.date >= date_limit
-    ).order_by(DailyStats.date).all()
-
-    # تبدیل به آمار هفتگی
-    weekly_stats = {}
-
-    for stat in daily_stats:
+    # یک ردیف تجمعی برای هر هفته از شمارنده‌های ساعتی
+    result = []
+    for row in await _period_rows(db, "week", date_limit, account_id):
         # تعیین شماره هفته و سال
-        year, week, _ = stat.date.isocalendar()
-        week_key = f"{year}-W{week:02d}"
-
-        if week_key not in weekly_stats:
-            weekly_stats[week_key] = {
-                "week": week_key,
-                "likes": 0,
-                "comments": 0,
-                "follows": 0,
-                "unfollows": 0,
-                "story_views": 0,
-                "dms": 0,
-                "total": 0,
-                "days_count": 0
-            }
-
-        # جمع کردن آمار
-        weekly_stats[week_key]["likes"] += stat.likes_count
-        weekly_stats[week_key]["comments"] += stat.comments_count
-        weekly_stats[week_key]["follows"] += stat.follows_count
-        weekly_stats[week_key]["unfollows"] += stat.unfollows_count
-        weekly_stats[week_key]["story_views"] += stat.story_views_count
-        weekly_stats[week_key]["dms"] += stat.dms_count
-        weekly_stats[week_key]["total"] += stat.total_interactions
-        weekly_stats[week_key]["days_count"] += 1
-
-    # تبدیل به لیست
-    result = list(weekly_stats.values())
-
-    # مرتب‌سازی بر اساس هفته
-    result.sort(key=lambda x: x["week"])
+        year, week, _ = row.period.isocalendar()
+        result.append({"week": f"{year}-W{week:02d}", **_period_counts(row)})
 
     return {
         "weeks": weeks,
@@ -91,50 +89,15 @@ def get_weekly_stats(weeks: int = 4, db: Session = Depends(get_db)):
 
 
 @router.get("/stats/monthly")
-def get_monthly_stats(months: int = 6, db: Session = Depends(get_db)):
+async def get_monthly_stats(months: int = 6, account_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """دریافت آمار ماهیانه بات"""
     date_limit = datetime.now() - timedelta(days=30 * months)
 
-    # دریافت آمار روزانه
-    daily_stats = db.query(DailyStats).filter(
-        DailyStats.date >= date_limit
-    ).order_by(DailyStats.date).all()
-
-    # تبدیل به آمار ماهیانه
-    monthly_stats = {}
-
-    for stat in daily_stats:
-        # تعیین ماه و سال
-        month_key = f"{stat.date.year}-{stat.date.month:02d}"
-
-        if month_key not in monthly_stats:
-            monthly_stats[month_key] = {
-                "month": month_key,
-                "likes": 0,
-                "comments": 0,
-                "follows": 0,
-                "unfollows": 0,
-                "story_views": 0,
-                "dms": 0,
-                "total": 0,
-                "days_count": 0
-            }
-
-        # جمع کردن آمار
-        monthly_stats[month_key]["likes"] += stat.likes_count
-        monthly_stats[month_key]["comments"] += stat.comments_count
-        monthly_stats[month_key]["follows"] += stat.follows_count
-        monthly_stats[month_key]["unfollows"] += stat.unfollows_count
-        monthly_stats[month_key]["story_views"] += stat.story_views_count
-        monthly_stats[month_key]["dms"] += stat.dms_count
-        monthly_stats[month_key]["total"] += stat.total_interactions
-        monthly_stats[month_key]["days_count"] += 1
-
-    # تبدیل به لیست
-    result = list(monthly_stats.values())
-
-    # مرتب‌سازی بر اساس ماه
-    result.sort(key=lambda x: x["month"])
+    # یک ردیف تجمعی برای هر ماه از شمارنده‌های ساعتی
+    result = []
+    for row in await _period_rows(db, "month", date_limit, account_id):
+        month_key = f"{row.period.year}-{row.period.month:02d}"
+        result.append({"month": month_key, **_period_counts(row)})
 
     return {
         "months": months,
@@ -143,28 +106,42 @@ def get_monthly_stats(months: int = 6, db: Session = Depends(get_db)):
 
 
 @router.get("/interactions")
-def get_interactions(limit: int = 100, offset: int = 0, type: Optional[str] = None, db: Session = Depends(get_db)):
-    """دریافت تاریخچه تعاملات بات"""
-    query = db.query(Interaction)
+async def get_interactions(limit: int = 100, cursor: Optional[str] = None, type: Optional[str] = None,
+                           account_id: Optional[str] = None, total: str = "estimate",
+                           db: AsyncSession = Depends(get_async_db)):
+    """دریافت تاریخچه تعاملات بات
+
+    صفحه‌بندی با نشانگر (cursor) روی (created_at, id) انجام می‌شود؛ تعداد کل
+    با total=exact دقیق، با total=estimate از شمارنده‌های ساعتی و با
+    total=none محاسبه نمی‌شود.
+    """
+    criteria = []
+    rollup_criteria = []
 
     # فیلتر بر اساس نوع تعامل
     if type:
-        query = query.filter(Interaction.interaction_type == type)
+        criteria.append(Interaction.interaction_type == type)
+        rollup_criteria.append(InteractionRollup.interaction_type == type)
 
-    # مرتب‌سازی بر اساس زمان ایجاد (نزولی)
-    query = query.order_by(Interaction.created_at.desc())
+    # فیلتر بر اساس حساب
+    if account_id:
+        criteria.append(Interaction.account_id == account_id)
+        rollup_criteria.append(InteractionRollup.account_id == account_id)
 
-    # اعمال محدودیت و آفست
-    total = query.count()
-    interactions = query.offset(offset).limit(limit).all()
+    # مرتب‌سازی نزولی بر اساس زمان ایجاد و صفحه‌بندی با نشانگر
+    count = await count_total(db, total, criteria, rollup_criteria)
+    interactions, next_cursor, prev_cursor = await keyset_page(
+        db, criteria, limit, cursor)
 
     return {
-        "total": total,
+        "total": count,
         "limit": limit,
-        "offset": offset,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "interactions": [
             {
                 "id": interaction.id,
+                "account_id": interaction.account_id,
                 "type": interaction.interaction_type,
                 "target_username": interaction.target_user_username,
                 "target_media": interaction.target_media_shortcode,
@@ -179,36 +156,31 @@ def get_interactions(limit: int = 100, offset: int = 0, type: Optional[str] = No
 
 
 @router.get("/interactions/stats")
-def get_interactions_stats(days: int = 30, db: Session = Depends(get_db)):
-    """دریافت آمار تعاملات بات"""
+async def get_interactions_stats(days: int = 30, db: AsyncSession = Depends(get_async_db)):
+    """دریافت آمار تعاملات بات (از شمارنده‌های ساعتی، با دقت یک ساعت)"""
     date_limit = datetime.now() - timedelta(days=days)
 
-    # تعداد کل تعاملات
-    total_count = db.query(Interaction).filter(
-        Interaction.created_at >= date_limit
-    ).count()
+    # تعداد کل و موفق به تفکیک نوع در یک کوئری
+    rows = (await db.execute(select(
+        InteractionRollup.interaction_type,
+        func.sum(InteractionRollup.total).label("total"),
+        func.sum(InteractionRollup.success).label("success")
+    ).where(
+        InteractionRollup.bucket >= hour_bucket(date_limit)
+    ).group_by(InteractionRollup.interaction_type))).all()
+    counts = {row.interaction_type: row for row in rows}
 
-    # تعداد تعاملات موفق
-    success_count = db.query(Interaction).filter(
-        Interaction.created_at >= date_limit,
-        Interaction.success == True
-    ).count()
+    total_count = sum(row.total for row in rows)
+    success_count = sum(row.success for row in rows)
 
     # تعداد بر اساس نوع
     types = ["like", "comment", "follow", "unfollow", "view_story", "dm"]
     type_counts = {}
 
     for interaction_type in types:
-        count = db.query(Interaction).filter(
-            Interaction.created_at >= date_limit,
-            Interaction.interaction_type == interaction_type
-        ).count()
-
-        success_count_type = db.query(Interaction).filter(
-            Interaction.created_at >= date_limit,
-            Interaction.interaction_type == interaction_type,
-            Interaction.success == True
-        ).count()
+        row = counts.get(interaction_type)
+        count = row.total if row else 0
+        success_count_type = row.success if row else 0
 
         type_counts[interaction_type] = {
             "total": count,
@@ -1,26 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from loguru import logger
 from typing import List, Dict, Any, Optional
 
-from app.database.connection import get_db
-from app.database.models import DailyStats
+from app.database.async_connection import get_async_db
+from app.database.models import DailyStats, InteractionRollup
+from app.database.rollups import TYPE_KEYS
 
 router = APIRouter()
 
 
 @router.get("/daily")
-def get_daily_stats(days: int = 7, db: Session = Depends(get_db)):
+async def get_daily_stats(days: int = 7, account_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """دریافت آمار روزانه بات در بازه زمانی مشخص با مدیریت خطای بهبود یافته"""
     try:
         date_limit = datetime.now() - timedelta(days=days)
 
         # بررسی جداول
         try:
-            stats = db.query(DailyStats).filter(
-                DailyStats.date >= date_limit
-            ).order_by(DailyStats.date).all()
+            query = select(DailyStats).where(DailyStats.date >= date_limit)
+            if account_id:
+                query = query.where(DailyStats.account_id == account_id)
+            stats = (await db.scalars(query.order_by(DailyStats.date))).all()
         except Exception as db_error:
             logger.error(f"خطا در دسترسی به جدول آمار روزانه: {db_error}")
             # بازگشت داده خالی به جای خطای 500
@@ -34,6 +37,7 @@ def get_daily_stats(days: int = 7, db: Session = Depends(get_db)):
         result = []
         for stat in stats:
             result.append({
+                "account_id": stat.account_id,
                 "date": stat.date.strftime("%Y-%m-%d"),
                 "likes": stat.likes_count,
                 "comments": stat.comments_count,
@@ -62,85 +66,59 @@ def get_daily_stats(days: int = 7, db: Session = Depends(get_db)):
 
 
 @router.get("/summary")
-def get_stats_summary(db: Session = Depends(get_db)):
+async def get_stats_summary(account_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """دریافت خلاصه آمار بات"""
-    # آمار روز جاری
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-
-    # آمار هفته جاری
     week_start = today - timedelta(days=today.weekday())
-    week_stats = db.query(DailyStats).filter(
-        DailyStats.date >= week_start).all()
-
-    # آمار ماه جاری
     month_start = today.replace(day=1)
-    month_stats = db.query(DailyStats).filter(
-        DailyStats.date >= month_start).all()
-
-    # جمع کردن آمار هفتگی
-    week_totals = {
-        "likes": 0,
-        "comments": 0,
-        "follows": 0,
-        "unfollows": 0,
-        "story_views": 0,
-        "dms": 0,
-        "total": 0
-    }
 
-    for stat in week_stats:
-        week_totals["likes"] += stat.likes_count
-        week_totals["comments"] += stat.comments_count
-        week_totals["follows"] += stat.follows_count
-        week_totals["unfollows"] += stat.unfollows_count
-        week_totals["story_views"] += stat.story_views_count
-        week_totals["dms"] += stat.dms_count
-        week_totals["total"] += stat.total_interactions
-
-    # جمع کردن آمار ماهانه
-    month_totals = {
-        "likes": 0,
-        "comments": 0,
-        "follows": 0,
-        "unfollows": 0,
-        "story_views": 0,
-        "dms": 0,
-        "total": 0
-    }
-
-    for stat in month_stats:
-        month_totals["likes"] += stat.likes_count
-        month_totals["comments"] += stat.comments_count
-        month_totals["follows"] += stat.follows_count
-        month_totals["unfollows"] += stat.unfollows_count
-        month_totals["story_views"] += stat.story_views_count
-        month_totals["dms"] += stat.dms_count
-        month_totals["total"] += stat.total_interactions
+    # آمار روز، هفته و ماه جاری در یک کوئری روی شمارنده‌های ساعتی
+    # (جمع همه حساب‌ها در صورت عدم تعیین حساب)
+    in_today = InteractionRollup.bucket >= today
+    query = select(
+        InteractionRollup.interaction_type,
+        func.sum(InteractionRollup.total).filter(in_today).label("today_total"),
+        func.sum(InteractionRollup.success).filter(in_today).label("today"),
+        func.sum(InteractionRollup.success).filter(
+            InteractionRollup.bucket >= week_start).label("week"),
+        func.sum(InteractionRollup.success).filter(
+            InteractionRollup.bucket >= month_start).label("month")
+    ).where(
+        InteractionRollup.bucket >= min(week_start, month_start)
+    ).group_by(InteractionRollup.interaction_type)
+    if account_id:
+        query = query.where(InteractionRollup.account_id == account_id)
+    rows = {row.interaction_type: row for row in (await db.execute(query)).all()}
+
+    def totals(period):
+        result = {key: (getattr(rows[interaction_type], period) or 0)
+                  if interaction_type in rows else 0
+                  for interaction_type, key in TYPE_KEYS.items()}
+        result["total"] = sum(result.values())
+        return result
+
+    today_totals = totals("today")
+    today_attempts = sum(row.today_total or 0 for row in rows.values())
+    today_stats = {f"{key}_count": value for key, value in today_totals.items()
+                   if key != "total"}
+    today_stats["total_interactions"] = today_totals["total"]
+    today_stats["success_rate"] = (today_totals["total"] / today_attempts * 100
+                                   if today_attempts else 0)
 
     # ساخت خلاصه آمار
     return {
         "today": {
             "date": today.strftime("%Y-%m-%d"),
-            "stats": today_stats.to_dict() if today_stats else {
-                "likes_count": 0,
-                "comments_count": 0,
-                "follows_count": 0,
-                "unfollows_count": 0,
-                "story_views_count": 0,
-                "dms_count": 0,
-                "total_interactions": 0,
-                "success_rate": 0
-            }
+            "stats": today_stats
         },
         "this_week": {
             "start_date": week_start.strftime("%Y-%m-%d"),
             "end_date": today.strftime("%Y-%m-%d"),
-            "stats": week_totals
+            "stats": totals("week")
         },
         "this_month": {
             "start_date": month_start.strftime("%Y-%m-%d"),
             "end_date": today.strftime("%Y-%m-%d"),
-            "stats": month_totals
+            "stats": totals("month")
         }
     }
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import traceback
+from datetime import datetime
+
+from app.config import INSTAGRAM_ACCOUNTS
+
+
+def load_managers():
+    """بارگذاری کلاس‌های مدیرها و بات خودکار
+
+    import این ماژول‌ها (و instagrapi) حدود یک ثانیه طول می‌کشد؛ بنابراین تا
+    اولین راه‌اندازی حساب یا پیش‌بارگذاری پس‌زمینه API به تعویق می‌افتد.
+    """
+    from app.bot.session_manager import SessionManager
+    from app.bot.interaction_manager import InteractionManager
+    from app.bot.follower_manager import FollowerManager
+    from app.bot.comment_manager import CommentManager
+    from app.bot.automated_bot import AutomatedBot
+    return (SessionManager, InteractionManager, FollowerManager,
+            CommentManager, AutomatedBot)
+
+
+class AccountStack:
+    """پشته کامل مدیرها و بات خودکار برای یک حساب اینستاگرام"""
+
+    def __init__(self, username, password, executor):
+        self.account_id = username
+        self.username = username
+        self.password = password
+        self.executor = executor
+        self.session_manager = None
+        self.interaction_manager = None
+        self.follower_manager = None
+        self.comment_manager = None
+        self.automated_bot = None
+        self.starting = False
+
+    @property
+    def logged_in(self):
+        return bool(self.session_manager and self.session_manager.logged_in)
+
+    @property
+    def running(self):
+        return bool(self.automated_bot and self.automated_bot.running)
+
+    async def start(self):
+        """لاگین، ساخت مدیرها و شروع چرخه خودکار این حساب"""
+        if self.starting:
+            logging.info(f"حساب {self.account_id} در حال راه‌اندازی است")
+            return
+
+        self.starting = True
+        try:
+            # import سنگین مدیرها در استخر نخ تا حلقه رویداد مسدود نشود
+            (SessionManager, InteractionManager, FollowerManager,
+             CommentManager, AutomatedBot) = await self.executor.run(load_managers)
+
+            # ایجاد نمونه‌های کلاس اصلی اگر وجود ندارند
+            if not self.session_manager:
+                self.session_manager = SessionManager(
+                    self.username, self.password)
+                logging.info(
+                    f"نمونه SessionManager برای {self.account_id} ایجاد شد")
+
+            if not await self._login():
+                return
+
+            # ثبت شروع سشن در دیتابیس
+            await self.executor.run(self.session_manager.record_session_start)
+
+            # ایجاد نمونه‌های مدیر تعامل، فالو و کامنت
+            if not self.interaction_manager:
+                self.interaction_manager = await self.executor.run(
+                    InteractionManager, self.session_manager)
+
+            if not self.follower_manager:
+                self.follower_manager = FollowerManager(
+                    self.session_manager, self.interaction_manager)
+
+            if not self.comment_manager:
+                self.comment_manager = CommentManager(
+                    self.session_manager, self.interaction_manager)
+
+            # ایجاد و شروع بات خودکار
+            if not self.automated_bot:
+                self.automated_bot = AutomatedBot(
+                    self.session_manager, self.interaction_manager,
+                    self.follower_manager, self.comment_manager, self.executor)
+            await self.automated_bot.start()
+
+            self.session_manager.logger.info(
+                "بات با موفقیت راه‌اندازی شد و در حال کار خودکار است")
+            logging.info(
+                f"بات حساب {self.account_id} راه‌اندازی شد و در حال کار خودکار است")
+        except Exception as e:
+            if self.session_manager:
+                self.session_manager.logger.error(
+                    f"خطای کلی در راه‌اندازی بات: {e}")
+            logging.error(
+                f"خطای کلی در راه‌اندازی بات حساب {self.account_id}: {e}")
+            logging.error(traceback.format_exc())
+        finally:
+            self.starting = False
+
+    async def _login(self):
+        """لاگین به اینستاگرام با سه بار تلاش"""
+        login_attempts = 0
+        max_attempts = 3
+
+        while login_attempts < max_attempts:
+            try:
+                if await self.executor.run(self.session_manager.login):
+                    self.session_manager.logger.info(
+                        "✅ لاگین موفقیت‌آمیز به اینستاگرام")
+                    return True
+
+                login_attempts += 1
+                self.session_manager.logger.error(
+                    f"❌ تلاش {login_attempts}/{max_attempts} لاگین ناموفق بود")
+            except Exception as e:
+                login_attempts += 1
+                self.session_manager.logger.error(
+                    f"❌ خطا در تلاش {login_attempts}/{max_attempts} لاگین: {e}")
+                logging.error(traceback.format_exc())
+
+            if login_attempts < max_attempts:
+                # انتظار بیشتر قبل از تلاش مجدد
+                await asyncio.sleep(60)
+
+        self.session_manager.logger.error("❌ تمام تلاش‌های لاگین ناموفق بودند")
+        return False
+
+    async def stop(self):
+        """توقف چرخه خودکار و ثبت پایان سشن این حساب"""
+        if self.running:
+            await self.automated_bot.stop()
+
+        if not self.session_manager:
+            return False
+
+        # لغو انتظارهای جاری حتی اگر چرخه خودکار فعال نباشد
+        self.session_manager.pacer.token.cancel()
+
+        if self.session_manager.logged_in:
+            await self.executor.run(self.session_manager.record_session_end)
+            self.session_manager.logged_in = False
+        return True
+
+    async def reset(self):
+        """توقف و پاک کردن همه نمونه‌ها برای راه‌اندازی مجدد اجباری"""
+        try:
+            await self.stop()
+        except Exception as e:
+            logging.error(f"خطا در توقف حساب {self.account_id}: {e}")
+
+        self.session_manager = None
+        self.interaction_manager = None
+        self.follower_manager = None
+        self.comment_manager = None
+        self.automated_bot = None
+
+    def status(self):
+        """وضعیت این حساب برای API"""
+        if not self.session_manager:
+            return {
+                "account_id": self.account_id,
+                "status": "starting" if self.starting else "stopped",
+                "auto_mode": "stopped"
+            }
+
+        return {
+            "account_id": self.account_id,
+            "status": "running" if self.logged_in else (
+                "starting" if self.starting else "stopped"),
+            "auto_mode": "running" if self.running else "stopped",
+            "session_id": self.session_manager.session_id,
+            "last_operation": self.session_manager.last_operation,
+            "last_error": self.session_manager.last_error,
+            "pacing": self.session_manager.pacer.status(),
+            "throttle": self.session_manager.throttle.status(),
+            "circuit_breakers": self.session_manager.breakers.status(),
+            "response_cache": self.session_manager.cache.status(),
+            "rate_limits": (self.interaction_manager.rate_limiter.status()
+                            if self.interaction_manager else None),
+            "seen_set": (self.interaction_manager.seen.status()
+                         if self.interaction_manager else None),
+            "follow_back": (self.follower_manager.resolver.status()
+                            if self.follower_manager else None)
+        }
+
+
+class AccountRegistry:
+    """ثبت و زمان‌بندی پشته‌های چند حساب روی یک حلقه رویداد و استخر نخ"""
+
+    remote = False
+
+    def __init__(self, executor, accounts=None):
+        self.executor = executor
+        self.stacks = {}
+        for account in (INSTAGRAM_ACCOUNTS if accounts is None else accounts):
+            self.add(account["username"], account["password"])
+
+    def add(self, username, password):
+        """افزودن یک حساب به رجیستری"""
+        if username not in self.stacks:
+            self.stacks[username] = AccountStack(
+                username, password, self.executor)
+        return self.stacks[username]
+
+    def remove(self, account_id):
+        """حذف یک حساب از رجیستری (بدون توقف آن)"""
+        return self.stacks.pop(account_id, None)
+
+    async def refresh(self):
+        """سازگاری با RemoteAccountRegistry؛ وضعیت پشته‌ها در حافظه است"""
+        return self
+
+    def get(self, account_id):
+        """دریافت پشته یک حساب؛ در صورت نبود KeyError"""
+        return self.stacks[account_id]
+
+    def default(self):
+        """اولین حساب ثبت شده (برای API های تک حسابی)"""
+        return next(iter(self.stacks.values()), None)
+
+    def __iter__(self):
+        return iter(self.stacks.values())
+
+    def __len__(self):
+        return len(self.stacks)
+
+    async def start_all(self):
+        """راه‌اندازی هم‌زمان همه حساب‌ها"""
+        await asyncio.gather(*[stack.start() for stack in self])
+
+    async def stop_all(self):
+        """توقف همه حساب‌ها"""
+        results = await asyncio.gather(
+            *[stack.stop() for stack in self], return_exceptions=True)
+        for stack, result in zip(self, results):
+            if isinstance(result, Exception):
+                logging.error(f"خطا در توقف حساب {stack.account_id}: {result}")
+
+    async def reset_all(self):
+        """پاک کردن همه پشته‌ها برای راه‌اندازی مجدد"""
+        await asyncio.gather(*[stack.reset() for stack in self])
+
+    def status(self):
+        """وضعیت همه حساب‌ها"""
+        return {
+            "time": datetime.now().isoformat(),
+            "accounts": [stack.status() for stack in self]
+        }
@@ -0,0 +1,314 @@
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import func
+
+from app.config import ACTION_IDEMPOTENCY_WINDOW
+from app.database.connection import SessionLocal
+from app.database.dialect import upsert
+from app.database.models import ActionQueueItem
+
+# انواع عملیات قابل صف‌بندی
+ACTION_TYPES = ["like", "comment", "follow", "unfollow", "view_story", "dm"]
+
+# زمان پس از آن یک عملیات در حال اجرا رها شده تلقی می‌شود
+STALE_LOCK_TIMEOUT = timedelta(minutes=30)
+
+# نتیجه عملیاتی که قبلاً روی همین هدف انجام شده است (بدون تلاش مجدد)
+SKIPPED = "skipped"
+# عملیاتی که پیش از درخواست شبکه در SeenSet بررسی می‌شوند
+SEEN_ACTIONS = ("like", "comment", "follow", "dm")
+
+
+def make_idempotency_key(account_id, action_type, target_user_id=None, target_media_id=None,
+                         now=None):
+    """ساخت کلید یکتایی پیش‌فرض: هر حساب هر عملیات را در هر بازه
+    ACTION_IDEMPOTENCY_WINDOW یک بار روی هر هدف صف می‌کند"""
+    target = target_media_id if action_type in ("like", "comment") else target_user_id
+    window = int((now or datetime.now()).timestamp() // ACTION_IDEMPOTENCY_WINDOW)
+    return f"{account_id}:{action_type}:{target}:{window}"
+
+
+class ActionQueue:
+    """صف پایدار عملیات در جدول action_queue
+
+    تولیدکننده‌ها (اسکن هشتگ و فالوورها و API) عملیات را با کلید یکتایی وارد
+    می‌کنند و مصرف‌کننده‌ها با FOR UPDATE SKIP LOCKED آن‌ها را برمی‌دارند، پس
+    چند worker بدون تداخل از یک صف می‌خوانند و عملیات در حال انتظار با
+    راه‌اندازی مجدد از بین نمی‌رود.
+    """
+
+    def __init__(self, account_id=None, worker_id=None):
+        self.account_id = account_id
+        self.worker_id = worker_id
+
+    def _build_row(self, item):
+        account_id = item.get("account_id") or self.account_id
+        action_type = item["action_type"]
+        if action_type not in ACTION_TYPES:
+            raise ValueError(f"نوع عملیات نامعتبر: {action_type}")
+
+        target_user_id = item.get("target_user_id")
+        target_media_id = item.get("target_media_id")
+        return {
+            "account_id": account_id,
+            "action_type": action_type,
+            "target_user_id": str(target_user_id) if target_user_id is not None else None,
+            "target_user_username": item.get("target_user_username"),
+            "target_media_id": str(target_media_id) if target_media_id is not None else None,
+            "target_media_shortcode": item.get("target_media_shortcode"),
+            "content": item.get("content"),
+            "priority": item.get("priority", 0),
+            "not_before": item.get("not_before") or datetime.now(),
+            "max_attempts": item.get("max_attempts", 3),
+            "status": "pending",
+            "attempts": 0,
+            "source": item.get("source"),
+            "created_at": datetime.now(),
+            "idempotency_key": item.get("idempotency_key") or make_idempotency_key(
+                account_id, action_type, target_user_id, target_media_id)
+        }
+
+    def enqueue_many(self, items):
+        """افزودن گروهی عملیات؛ موارد تکراری (بر اساس کلید یکتایی) نادیده گرفته می‌شوند
+
+        خروجی تعداد عملیات اضافه شده است (0 یعنی همه تکراری بودند)؛ خطای
+        دیتابیس به فراخواننده منتقل می‌شود.
+        """
+        rows = [self._build_row(item) for item in items]
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            stmt = upsert(ActionQueueItem).values(rows).on_conflict_do_nothing(
+                index_elements=["idempotency_key"]
+            ).returning(ActionQueueItem.id)
+            inserted = len(db.execute(stmt).fetchall())
+            db.commit()
+            return inserted
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در افزودن عملیات به صف: {e}")
+            raise
+        finally:
+            db.close()
+
+    def enqueue(self, action_type, **item):
+        """افزودن یک عملیات به صف"""
+        item["action_type"] = action_type
+        return self.enqueue_many([item]) == 1
+
+    def dequeue(self, limit=1):
+        """برداشتن عملیات آماده اجرا با FOR UPDATE SKIP LOCKED"""
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            query = db.query(ActionQueueItem).filter(
+                ActionQueueItem.status == "pending",
+                ActionQueueItem.not_before <= now
+            )
+            if self.account_id:
+                query = query.filter(
+                    ActionQueueItem.account_id == self.account_id)
+
+            items = query.order_by(
+                ActionQueueItem.priority.desc(),
+                ActionQueueItem.not_before,
+                ActionQueueItem.id
+            ).limit(limit).with_for_update(skip_locked=True).all()
+
+            claimed = []
+            for item in items:
+                item.status = "running"
+                item.attempts = (item.attempts or 0) + 1
+                item.locked_by = self.worker_id
+                item.locked_at = now
+                claimed.append({
+                    "id": item.id,
+                    "account_id": item.account_id,
+                    "action_type": item.action_type,
+                    "target_user_id": item.target_user_id,
+                    "target_user_username": item.target_user_username,
+                    "target_media_id": item.target_media_id,
+                    "target_media_shortcode": item.target_media_shortcode,
+                    "content": item.content,
+                    "attempts": item.attempts,
+                    "max_attempts": item.max_attempts
+                })
+            db.commit()
+            return claimed
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در برداشتن عملیات از صف: {e}")
+            return []
+        finally:
+            db.close()
+
+    def complete(self, item, success, error=None):
+        """ثبت نتیجه اجرای یک عملیات؛ عملیات ناموفق تا max_attempts دوباره صف می‌شود
+
+        با success برابر SKIPPED عملیات بدون تلاش مجدد با وضعیت skipped بسته می‌شود.
+        """
+        db = SessionLocal()
+        try:
+            row = db.query(ActionQueueItem).filter(
+                ActionQueueItem.id == item["id"]).first()
+            if not row:
+                return
+            row.locked_by = None
+            row.locked_at = None
+            if success == SKIPPED:
+                row.status = SKIPPED
+                row.finished_at = datetime.now()
+            elif success:
+                row.status = "done"
+                row.finished_at = datetime.now()
+            elif row.attempts >= row.max_attempts:
+                row.status = "failed"
+                row.last_error = error
+                row.finished_at = datetime.now()
+            else:
+                # عقب‌نشینی خطی قبل از تلاش مجدد
+                row.status = "pending"
+                row.last_error = error
+                row.not_before = datetime.now() + timedelta(minutes=5 * row.attempts)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در ثبت نتیجه عملیات صف: {e}")
+        finally:
+            db.close()
+
+    def release(self, item, delay_seconds=0):
+        """بازگرداندن عملیات برداشته شده به صف بدون مصرف یک تلاش
+
+        با delay_seconds اجرای دوباره به تعویق می‌افتد (مثلاً به دلیل محدودیت نرخ).
+        """
+        values = {
+            ActionQueueItem.status: "pending",
+            ActionQueueItem.attempts: ActionQueueItem.attempts - 1,
+            ActionQueueItem.locked_by: None,
+            ActionQueueItem.locked_at: None
+        }
+        if delay_seconds:
+            values[ActionQueueItem.not_before] = datetime.now() + \
+                timedelta(seconds=delay_seconds)
+
+        db = SessionLocal()
+        try:
+            db.query(ActionQueueItem).filter(
+                ActionQueueItem.id == item["id"],
+                ActionQueueItem.status == "running"
+            ).update(values, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در بازگرداندن عملیات به صف: {e}")
+        finally:
+            db.close()
+
+    def requeue_stale(self, timeout=STALE_LOCK_TIMEOUT):
+        """بازگرداندن عملیاتی که worker آن‌ها از کار افتاده است"""
+        db = SessionLocal()
+        try:
+            query = db.query(ActionQueueItem).filter(
+                ActionQueueItem.status == "running",
+                ActionQueueItem.locked_at < datetime.now() - timeout
+            )
+            if self.account_id:
+                query = query.filter(
+                    ActionQueueItem.account_id == self.account_id)
+            count = query.update({
+                ActionQueueItem.status: "pending",
+                ActionQueueItem.locked_by: None,
+                ActionQueueItem.locked_at: None
+            }, synchronize_session=False)
+            db.commit()
+            if count:
+                logger.warning(f"{count} عملیات رها شده به صف بازگشت")
+            return count
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در بازگرداندن عملیات رها شده: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def pending_count(self):
+        """تعداد عملیات آماده اجرا"""
+        db = SessionLocal()
+        try:
+            query = db.query(func.count(ActionQueueItem.id)).filter(
+                ActionQueueItem.status == "pending",
+                ActionQueueItem.not_before <= datetime.now()
+            )
+            if self.account_id:
+                query = query.filter(
+                    ActionQueueItem.account_id == self.account_id)
+            return query.scalar() or 0
+        finally:
+            db.close()
+
+    def stats(self):
+        """تعداد عملیات صف به تفکیک وضعیت و نوع"""
+        db = SessionLocal()
+        try:
+            query = db.query(
+                ActionQueueItem.status,
+                ActionQueueItem.action_type,
+                func.count(ActionQueueItem.id)
+            )
+            if self.account_id:
+                query = query.filter(
+                    ActionQueueItem.account_id == self.account_id)
+            rows = query.group_by(
+                ActionQueueItem.status, ActionQueueItem.action_type).all()
+
+            result = {}
+            for status, action_type, count in rows:
+                result.setdefault(status, {})[action_type] = count
+            return result
+        finally:
+            db.close()
+
+
+def execute_action(interaction_manager, item):
+    """اجرای یک عملیات صف از طریق متدهای InteractionManager
+
+    اگر عملیات قبلاً روی همین هدف انجام شده باشد SKIPPED برمی‌گردد.
+    """
+    action_type = item["action_type"]
+    user_id = item.get("target_user_id")
+    username = item.get("target_user_username")
+
+    target = item["target_media_id"] if action_type in ("like", "comment") else user_id
+    if action_type in SEEN_ACTIONS and target and interaction_manager.already_done(
+            action_type, target, item.get("target_media_shortcode") or username):
+        return SKIPPED
+
+    if action_type == "like":
+        return interaction_manager.like_media(
+            media_id=item["target_media_id"],
+            shortcode=item.get("target_media_shortcode"),
+            username=username)
+    if action_type == "comment":
+        interaction_manager.last_recorded = None
+        result = interaction_manager.comment_media(
+            media_id=item["target_media_id"],
+            shortcode=item.get("target_media_shortcode"),
+            username=username,
+            text=item.get("content"))
+        # comment_media حتی با کامنت ناموفق True برمی‌گرداند؛ نتیجه ثبت شده ملاک است
+        recorded = interaction_manager.last_recorded
+        return recorded[0] if recorded is not None else result
+    if action_type == "follow":
+        return interaction_manager.follow_user(user_id=user_id, username=username)
+    if action_type == "unfollow":
+        return interaction_manager.unfollow_user(user_id=user_id, username=username)
+    if action_type == "view_story":
+        return interaction_manager.view_story(user_id=user_id, username=username)
+    if action_type == "dm":
+        return interaction_manager.send_dm(
+            user_id=user_id, username=username, text=item.get("content"))
+    raise ValueError(f"نوع عملیات نامعتبر: {action_type}")
@@ -5,16 +5,36 @@ import random
 from loguru import logger
 from datetime import datetime, time
 
+from app.bot.pacing import PacingCancelled
+from app.bot.action_queue import ActionQueue, execute_action
+from app.bot.circuit_breaker import ACTION_ENDPOINTS
+
+# فاصله استراحت (ثانیه) پس از هر نوع عملیات صف
+QUEUE_ACTION_PAUSES = {
+    "like": (5, 15),
+    "comment": (5, 15),
+    "follow": (15, 30),
+    "unfollow": (15, 30),
+    "view_story": (3, 8),
+    "dm": (60, 120)
+}
+
 
 class AutomatedBot:
     """کلاس مدیریت چرخه کاری خودکار بات"""
 
-    def __init__(self, session_manager, interaction_manager, follower_manager, comment_manager):
+    def __init__(self, session_manager, interaction_manager, follower_manager, comment_manager, executor):
         self.session_manager = session_manager
         self.interaction_manager = interaction_manager
         self.follower_manager = follower_manager
         self.comment_manager = comment_manager
+        # همه فراخوانی‌های مسدودکننده از طریق این اجراکننده انجام می‌شوند
+        self.executor = executor
         self.logger = session_manager.logger
+        self.pacer = session_manager.pacer
+        # صف پایدار عملیات؛ اسکن‌ها تولیدکننده و چرخه مصرف‌کننده آن هستند
+        self.queue = ActionQueue(
+            session_manager.account_id, worker_id=session_manager.session_id)
         self.running = False
         self.task = None
         self.hashtags = self._load_hashtags()
@@ -55,6 +75,7 @@ class AutomatedBot:
             return False
 
         self.running = True
+        self.pacer.token.reset()
         self.logger.info("🤖 شروع چرخه کاری خودکار بات")
         self.task = asyncio.create_task(self._automated_cycle())
         return True
@@ -65,11 +86,13 @@ class AutomatedBot:
             return False
 
         self.running = False
+        # بیدار کردن فوری انتظارهای جاری در نخ‌های کاری و حلقه رویداد
+        self.pacer.token.cancel()
         if self.task:
             self.task.cancel()
             try:
                 await self.task
-            except asyncio.CancelledError:
+            except (asyncio.CancelledError, PacingCancelled):
                 pass
             self.task = None
 
@@ -80,18 +103,12 @@ class AutomatedBot:
         """چرخه اصلی کاری بات"""
         self.logger.info("چرخه کاری خودکار بات شروع شد")
 
-        # شمارنده‌ها برای مدیریت بهتر محدودیت‌ها
-        daily_actions = {
-            "like": 0,
-            "comment": 0,
-            "follow": 0,
-            "unfollow": 0,
-            "dm": 0
-        }
-
         error_count = 0  # شمارنده خطاها
         max_consecutive_errors = 5  # حداکثر خطای پشت سر هم
 
+        # بازگرداندن عملیاتی که اجرای قبلی نیمه‌کاره رها کرده است
+        await self.executor.run(self.queue.requeue_stale)
+
         while self.running:
             try:
                 # کاهش شمارنده خطا در صورت عملیات موفق
@@ -100,21 +117,12 @@ class AutomatedBot:
                 # بررسی ساعت روز برای تنظیم فعالیت
                 current_hour = datetime.now().hour
 
-                # محدودیت‌های روزانه - توقف اگر از حد مجاز گذشته
-                if daily_actions["like"] > 150 or daily_actions["follow"] > 50:
-                    self.logger.warning(
-                        "محدودیت روزانه رسیده، استراحت طولانی...")
-                    await asyncio.sleep(3600)  # استراحت 1 ساعته
-                    # ریست شمارنده‌ها در نیمه شب
-                    if datetime.now().hour == 0:
-                        daily_actions = {key: 0 for key in daily_actions}
-                    continue
-
                 # ساعات شب (1 صبح تا 7 صبح): فعالیت کمتر
                 if 1 <= current_hour < 7:
                     self.logger.info("ساعت استراحت شبانه - فعالیت محدود")
                     await self._night_activities()
-                    await asyncio.sleep(1800)  # استراحت 30 دقیقه در شب
+                    await self._process_action_queue(limit=2)
+                    await self.pacer.asleep(1800, "night_rest")  # استراحت 30 دقیقه در شب
                     continue
 
                 # ساعات پربازدید (9 صبح تا 11 شب): فعالیت معمولی
@@ -135,6 +143,16 @@ class AutomatedBot:
                     (self._send_direct_messages, self.activity_weights.get('dm', 30))
                 ]
 
+                # حذف فعالیت‌هایی که بودجه روزانه آن‌ها تمام شده یا مدار آن‌ها باز است
+                activities = [(func, weight) for func, weight in activities
+                              if self._has_budget(func) and self._endpoints_healthy(func)]
+                if not activities:
+                    wait_time = self._next_available_wait()
+                    self.logger.warning(
+                        f"هیچ فعالیتی قابل اجرا نیست (بودجه یا مدار)، استراحت {wait_time // 60} دقیقه...")
+                    await self.pacer.asleep(wait_time, "no_available_activity")
+                    continue
+
                 # انتخاب 2 تا 3 فعالیت وزن‌دار (کاهش تعداد فعالیت‌ها)
                 selected_activities = self._weighted_sample(
                     activities, k=random.randint(2, 3))
@@ -143,26 +161,17 @@ class AutomatedBot:
                 for activity_func in selected_activities:
                     await activity_func()
                     # افزایش استراحت بین فعالیت‌ها
-                    await asyncio.sleep(random.randint(60, 120))
-
-                    # به‌روزرسانی شمارنده‌ها بر اساس نوع فعالیت
-                    if activity_func == self._interact_with_hashtags:
-                        daily_actions["like"] += 5  # تقریبی
-                    elif activity_func == self._follow_from_hashtags:
-                        daily_actions["follow"] += 3  # تقریبی
-                    elif activity_func == self._auto_unfollow:
-                        daily_actions["unfollow"] += 4  # تقریبی
-                    elif activity_func == self._comment_on_popular_posts:
-                        daily_actions["comment"] += 2  # تقریبی
-                    elif activity_func == self._send_direct_messages:
-                        daily_actions["dm"] += 2  # تقریبی
+                    await self.pacer.asleep(random.randint(60, 120), "between_activities")
+
+                # اجرای عملیات صف شده توسط اسکن‌ها و API
+                await self._process_action_queue()
 
                 # استراحت بین دورها - زمان بیشتری برای استراحت (8 تا 20 دقیقه)
                 wait_time = random.randint(480, 1200)
                 self.logger.info(f"🕒 استراحت به مدت {wait_time // 60} دقیقه")
-                await asyncio.sleep(wait_time)
+                await self.pacer.asleep(wait_time, "cycle_rest")
 
-            except asyncio.CancelledError:
+            except (asyncio.CancelledError, PacingCancelled):
                 self.logger.info("چرخه کاری خودکار لغو شد")
                 break
             except Exception as e:
@@ -173,19 +182,71 @@ class AutomatedBot:
                 if error_count >= max_consecutive_errors:
                     self.logger.error(
                         f"تعداد خطاهای متوالی به {max_consecutive_errors} رسید. استراحت طولانی...")
-                    await asyncio.sleep(1800)  # 30 دقیقه استراحت
+                    await self.pacer.asleep(1800, "error_rest")  # 30 دقیقه استراحت
                     error_count = 0
                 else:
                     # زمان استراحت طولانی‌تر بعد از خطا و ادامه چرخه
                     self.logger.info(
                         "استراحت پس از خطا و تلاش مجدد در 5 دقیقه")
-                    await asyncio.sleep(300)
+                    await self.pacer.asleep(300, "error_rest")
 
                 # بازنشانی شمارنده‌ها
                 self.actions_count = 0
                 from app.bot.utils import get_actions_before_break
                 self.actions_before_break = get_actions_before_break()
 
+    def _activity_actions(self):
+        """انواع عملیاتی که هر فعالیت مصرف می‌کند"""
+        return {
+            self._interact_with_hashtags: ("like", "comment"),
+            self._follow_from_hashtags: ("follow",),
+            self._auto_unfollow: ("unfollow",),
+            self._auto_follow_back: ("follow",),
+            self._comment_on_popular_posts: ("comment",),
+            self._view_stories: ("view_story",),
+            self._send_direct_messages: ("dm",)
+        }
+
+    def _has_budget(self, activity_func):
+        """آیا حداقل یکی از عملیات این فعالیت بودجه ۲۴ ساعته دارد"""
+        limiter = self.interaction_manager.rate_limiter
+        for action_type in self._activity_actions().get(activity_func, ()):
+            remaining = limiter.remaining(action_type)
+            if remaining is None or remaining > 0:
+                return True
+        return False
+
+    def _activity_reads(self):
+        """خانواده endpoint های خواندنی که هر فعالیت برای یافتن هدف لازم دارد"""
+        return {
+            self._interact_with_hashtags: ("hashtag",),
+            self._follow_from_hashtags: ("hashtag",),
+            self._auto_unfollow: ("user",),
+            self._auto_follow_back: ("user",),
+            self._comment_on_popular_posts: ("hashtag",),
+            self._view_stories: ("user",),
+            self._send_direct_messages: ("hashtag",)
+        }
+
+    def _endpoints_healthy(self, activity_func):
+        """مدار endpoint های خواندنی فعالیت بسته و حداقل یکی از عملیات آن در دسترس باشد"""
+        breakers = self.session_manager.breakers
+        if any(breakers.is_open(family)
+               for family in self._activity_reads().get(activity_func, ())):
+            return False
+        actions = self._activity_actions().get(activity_func, ())
+        return not actions or any(
+            not breakers.is_open(ACTION_ENDPOINTS[action_type]) for action_type in actions)
+
+    def _next_available_wait(self):
+        """ثانیه‌های انتظار تا آزاد شدن اولین بودجه یا مدار (حداقل 5 دقیقه)"""
+        limiter = self.interaction_manager.rate_limiter
+        breakers = self.session_manager.breakers
+        waits = [limiter.wait_time(action_type) for action_type in limiter.buckets]
+        waits += [breakers.retry_after(family) for family in breakers.breakers]
+        waits = [wait for wait in waits if wait > 0]
+        return int(max(300, min(waits, default=3600)))
+
     def _weighted_sample(self, weighted_items, k=3):
         """انتخاب تصادفی براساس وزن"""
         # استخراج وزن‌ها
@@ -211,14 +272,15 @@ class AutomatedBot:
             self.logger.error(f"خطا در فعالیت شبانه: {e}")
 
     async def _interact_with_hashtags(self, count=6):
-        """تعامل با پست‌های هشتگ‌های مختلف"""
+        """یافتن پست‌های هشتگ و افزودن لایک و کامنت آن‌ها به صف"""
         try:
             # انتخاب یک هشتگ تصادفی از لیست
             hashtag = random.choice(self.hashtags)
             self.logger.info(f"🔍 شروع تعامل با هشتگ #{hashtag}")
 
             # جستجوی هشتگ
-            medias = self.interaction_manager.search_hashtag(hashtag)
+            medias = await self.executor.run(
+                self.interaction_manager.search_hashtag, hashtag)
 
             if not medias:
                 self.logger.info(f"هیچ پستی با هشتگ #{hashtag} یافت نشد")
@@ -228,19 +290,19 @@ class AutomatedBot:
             if len(medias) > count:
                 medias = random.sample(medias, count)
 
-            likes = 0
-            comments = 0
-
-            # تعامل با پست‌ها
+            items = []
             for media in medias:
+                target = {
+                    "target_media_id": media.id,
+                    "target_media_shortcode": media.code,
+                    "target_user_id": media.user.pk,
+                    "target_user_username": media.user.username,
+                    "source": "hashtag"
+                }
+
                 # لایک کردن (احتمال 90%)
                 if random.random() < 0.9:
-                    if self.interaction_manager.like_media(
-                        media_id=media.id,
-                        shortcode=media.code,
-                        username=media.user.username
-                    ):
-                        likes += 1
+                    items.append(dict(target, action_type="like"))
 
                 # کامنت گذاشتن (احتمال 40% - افزایش یافته)
                 if random.random() < 0.4:
@@ -248,86 +310,151 @@ class AutomatedBot:
                         media, 'caption_text') else ""
                     comment_text = self.comment_manager.get_relevant_comment(
                         caption, media.user.username)
+                    items.append(dict(target, action_type="comment",
+                                      content=comment_text))
 
-                    if self.interaction_manager.comment_media(
-                        media_id=media.id,
-                        shortcode=media.code,
-                        username=media.user.username,
-                        text=comment_text
-                    ):
-                        comments += 1
-
-                # استراحت کوتاه بین تعاملات
-                await asyncio.sleep(random.randint(5, 15))
-
+            queued = await self.executor.run(self.queue.enqueue_many, items)
             self.logger.info(
-                f"✅ تعامل با هشتگ #{hashtag} پایان یافت: {likes} لایک، {comments} کامنت")
+                f"✅ {queued} عملیات از هشتگ #{hashtag} به صف اضافه شد")
 
         except Exception as e:
             self.logger.error(f"❌ خطا در تعامل با هشتگ: {e}")
 
     async def _follow_from_hashtags(self, count=3):
-        """فالو کردن کاربران از هشتگ‌های مختلف"""
+        """یافتن کاربران هشتگ‌ها و افزودن فالو آن‌ها به صف"""
         try:
             # انتخاب یک هشتگ تصادفی از لیست
             hashtag = random.choice(self.hashtags)
             self.logger.info(f"🔍 فالو کردن کاربران از هشتگ #{hashtag}")
 
             # جستجوی هشتگ
-            medias = self.interaction_manager.search_hashtag(hashtag)
+            medias = await self.executor.run(
+                self.interaction_manager.search_hashtag, hashtag)
 
             if not medias:
                 self.logger.info(f"هیچ پستی با هشتگ #{hashtag} یافت نشد")
                 return
 
-            follows = 0
-
-            # فالو کردن کاربران
+            users = {}
             for media in medias:
-                if follows >= count:
+                if len(users) >= count:
                     break
+                users.setdefault(media.user.pk, media.user.username)
 
-                # فالو کردن
-                if self.interaction_manager.follow_user(
-                    user_id=media.user.pk,
-                    username=media.user.username
-                ):
-                    follows += 1
-
-                # استراحت بین فالوها
-                await asyncio.sleep(random.randint(15, 30))
-
+            queued = await self.executor.run(self.queue.enqueue_many, [
+                {"action_type": "follow", "target_user_id": user_id,
+                 "target_user_username": username, "source": "hashtag"}
+                for user_id, username in users.items()
+            ])
             self.logger.info(
-                f"✅ فالو کردن از هشتگ #{hashtag} پایان یافت: {follows} فالو")
+                f"✅ {queued} فالو از هشتگ #{hashtag} به صف اضافه شد")
 
         except Exception as e:
             self.logger.error(f"❌ خطا در فالو کردن از هشتگ: {e}")
 
     async def _auto_unfollow(self, limit=4):
-        """آنفالو خودکار کاربرانی که فالوبک نکرده‌اند"""
+        """افزودن آنفالو کاربرانی که فالوبک نکرده‌اند به صف"""
         try:
             self.logger.info("🔄 شروع آنفالو خودکار کاربران")
 
-            result = self.follower_manager.auto_unfollow(
+            users = await self.executor.run(
+                self.follower_manager.get_followers_to_unfollow,
                 days_limit=7, limit=limit)
 
-            self.logger.info(f"✅ آنفالو خودکار پایان یافت: {result} کاربر")
+            queued = await self.executor.run(self.queue.enqueue_many, [
+                {"action_type": "unfollow", "target_user_id": user["user_id"],
+                 "target_user_username": user["username"], "source": "unfollow"}
+                for user in users
+            ])
+            self.logger.info(f"✅ {queued} آنفالو به صف اضافه شد")
 
         except Exception as e:
             self.logger.error(f"❌ خطا در آنفالو خودکار: {e}")
 
     async def _auto_follow_back(self, limit=5):
-        """فالوبک خودکار فالوورهای جدید"""
+        """افزودن فالوبک فالوورهای جدید به صف"""
         try:
             self.logger.info("🔄 شروع فالوبک خودکار")
 
-            result = self.follower_manager.auto_follow_back(limit=limit)
+            new_followers = await self.executor.run(
+                self.follower_manager.get_new_followers)
 
-            self.logger.info(f"✅ فالوبک خودکار پایان یافت: {result} کاربر")
+            # محدود کردن تعداد فالوبک‌ها
+            if len(new_followers) > limit:
+                new_followers = random.sample(new_followers, limit)
+
+            # فالوبک بر فالو کاربران ناشناس اولویت دارد
+            queued = await self.executor.run(self.queue.enqueue_many, [
+                {"action_type": "follow", "target_user_id": user["user_id"],
+                 "target_user_username": user["username"],
+                 "source": "follow_back", "priority": 1}
+                for user in new_followers
+            ])
+            self.logger.info(f"✅ {queued} فالوبک به صف اضافه شد")
 
         except Exception as e:
             self.logger.error(f"❌ خطا در فالوبک خودکار: {e}")
 
+    async def _release_items(self, items):
+        """بازگرداندن عملیات اجرا نشده به صف بدون مصرف تلاش"""
+        for item in items:
+            await self.executor.run(self.queue.release, item)
+
+    async def _process_action_queue(self, limit=10):
+        """برداشتن و اجرای عملیات صف این حساب"""
+        items = await self.executor.run(self.queue.dequeue, limit)
+        if not items:
+            return 0
+
+        self.logger.info(f"📋 اجرای {len(items)} عملیات از صف")
+        done = 0
+        limiter = self.interaction_manager.rate_limiter
+        for index, item in enumerate(items):
+            # عملیاتی که بودجه ندارد یا مدار آن باز است به تعویق می‌افتد
+            wait = max(limiter.wait_time(item["action_type"]),
+                       self.session_manager.breakers.retry_after(
+                           ACTION_ENDPOINTS[item["action_type"]]))
+            if wait > 0:
+                await self.executor.run(self.queue.release, item, wait)
+                continue
+
+            self.interaction_manager.last_recorded = None
+            try:
+                success = await self.executor.run(
+                    execute_action, self.interaction_manager, item)
+                error = None if success else "action failed"
+            except (asyncio.CancelledError, PacingCancelled):
+                # اگر توقف در استراحت پس از ارسال درخواست رخ داده، همین عملیات
+                # با نتیجه ثبت شده بسته می‌شود و دوباره اجرا نمی‌شود
+                recorded = self.interaction_manager.last_recorded
+                if recorded is not None:
+                    success, error = recorded
+                    await self.executor.run(
+                        self.queue.complete, item, success,
+                        error or (None if success else "action failed"))
+                    index += 1
+                await self._release_items(items[index:])
+                raise
+            except Exception as e:
+                success, error = False, str(e)
+
+            await self.executor.run(self.queue.complete, item, success, error)
+            if success is True:
+                done += 1
+
+            # استراحت متناسب با سرعت فعلی این نوع عملیات
+            low, high = QUEUE_ACTION_PAUSES.get(item["action_type"], (5, 15))
+            pause = random.randint(low, high) * \
+                self.session_manager.throttle.delay_factor(item["action_type"])
+            try:
+                await self.pacer.asleep(pause, "between_queue_actions")
+            except (asyncio.CancelledError, PacingCancelled):
+                await self._release_items(items[index + 1:])
+                raise
+
+        self.logger.info(f"✅ {done}/{len(items)} عملیات صف با موفقیت اجرا شد")
+        return done
+
     # کاهش به 1 کامنت در هر اجرا
     async def _comment_on_popular_posts(self, count=1):
         """کامنت گذاری روی پست‌های محبوب هشتگ‌ها"""
@@ -353,18 +480,18 @@ class AutomatedBot:
 
             # استفاده از متد کامنت گذاری که اصلاح کرده‌ایم
             # حتی اگر کامنت شکست بخورد، فرآیند کلی ادامه پیدا می‌کند
-            result = self.comment_manager.auto_comment_on_hashtag(
-                hashtag, count=count)
+            result = await self.executor.run(
+                self.comment_manager.auto_comment_on_hashtag, hashtag, count=count)
 
             # استراحت طولانی‌تر بعد از کامنت گذاری
-            await asyncio.sleep(random.randint(300, 600))  # 5-10 دقیقه
+            await self.pacer.asleep(random.randint(300, 600), "post_comment")  # 5-10 دقیقه
 
             self.logger.info(f"✅ کامنت گذاری پایان یافت: {result} کامنت")
 
         except Exception as e:
             self.logger.error(f"❌ خطا در کامنت گذاری: {e}")
             # استراحت طولانی در صورت خطا
-            await asyncio.sleep(300)  # 5 دقیقه
+            await self.pacer.asleep(300, "comment_error")  # 5 دقیقه
 
     async def _view_stories(self, limit=8):
         """مشاهده استوری‌های کاربران محبوب"""
@@ -373,7 +500,8 @@ class AutomatedBot:
 
             # دریافت فالویینگ‌های ما
             current_user_id = self.interaction_manager.client.user_id
-            following = self.interaction_manager.get_user_following(
+            following = await self.executor.run(
+                self.interaction_manager.get_user_following,
                 user_id=current_user_id, amount=30)
 
             if not following:
@@ -387,11 +515,12 @@ class AutomatedBot:
             views_count = 0
 
             for user_id, user_info in selected_users:
-                if self.interaction_manager.view_story(user_id=user_id, username=user_info.username):
+                if await self.executor.run(
+                        self.interaction_manager.view_story, user_id=user_id, username=user_info.username):
                     views_count += 1
 
                 # استراحت کوتاه بین مشاهده استوری‌ها
-                await asyncio.sleep(random.randint(3, 8))
+                await self.pacer.asleep(random.randint(3, 8), "between_stories")
 
             self.logger.info(
                 f"✅ مشاهده استوری‌ها پایان یافت: {views_count} استوری")
@@ -406,7 +535,8 @@ class AutomatedBot:
 
             # جستجوی یک هشتگ برای یافتن کاربران
             hashtag = random.choice(self.hashtags)
-            medias = self.interaction_manager.search_hashtag(hashtag)
+            medias = await self.executor.run(
+                self.interaction_manager.search_hashtag, hashtag)
 
             if not medias:
                 self.logger.info(
@@ -441,7 +571,8 @@ class AutomatedBot:
                 message = random.choice(messages)
 
                 # ارسال پیام
-                if self.interaction_manager.send_dm(
+                if await self.executor.run(
+                    self.interaction_manager.send_dm,
                     user_id=media.user.pk,
                     username=media.user.username,
                     text=message
@@ -449,7 +580,7 @@ class AutomatedBot:
                     sent_count += 1
 
                 # استراحت طولانی‌تر بین ارسال پیام‌ها
-                await asyncio.sleep(random.randint(60, 120))
+                await self.pacer.asleep(random.randint(60, 120), "between_dms")
 
             self.logger.info(
                 f"✅ ارسال پیام مستقیم پایان یافت: {sent_count} پیام")
@@ -0,0 +1,225 @@
+import threading
+import time
+
+from app.config import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN_SECONDS,
+    BREAKER_MAX_COOLDOWN_SECONDS
+)
+
+# خانواده endpoint هر متد کلاینت instagrapi که مدیرها استفاده می‌کنند
+ENDPOINT_FAMILIES = {
+    "media_like": "like",
+    "media_comment": "comment",
+    "user_follow": "follow",
+    "user_unfollow": "unfollow",
+    "user_stories": "story",
+    "story_seen": "story",
+    "direct_send": "dm",
+    "hashtag_medias_recent": "hashtag",
+    "user_info": "user",
+    "user_info_by_username": "user",
+    "user_friendship": "user",
+    "user_followers": "user",
+    "user_followers_v1_chunk": "user",
+    "user_following": "user",
+    "user_id_from_username": "user",
+    "user_medias": "user"
+}
+
+# خانواده endpoint هر نوع عملیات
+ACTION_ENDPOINTS = {
+    "like": "like",
+    "comment": "comment",
+    "follow": "follow",
+    "unfollow": "unfollow",
+    "view_story": "story",
+    "dm": "dm"
+}
+
+# خطاهای مربوط به هدف (نه سلامت endpoint) که مدار را باز نمی‌کنند
+TARGET_ERROR_MARKERS = ("NotFound", "Private")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """فراخوانی endpoint در حالی که مدار آن باز است"""
+
+    def __init__(self, family, retry_after):
+        super().__init__(
+            f"مدار {family} باز است؛ {int(retry_after)} ثانیه تا تلاش بعدی")
+        self.family = family
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """قطع‌کننده مدار یک خانواده endpoint با حالت‌های closed/open/half_open
+
+    پس از BREAKER_FAILURE_THRESHOLD خطای پیاپی مدار باز می‌شود و همه
+    فراخوانی‌ها بدون تماس با اینستاگرام رد می‌شوند. پس از پایان زمان
+    cooldown یک فراخوانی آزمایشی مجاز است؛ موفقیت آن مدار را می‌بندد و
+    شکست آن مدار را با cooldown دو برابر دوباره باز می‌کند.
+    """
+
+    def __init__(self, family, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds=BREAKER_COOLDOWN_SECONDS):
+        self.family = family
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown_seconds
+        self.cooldown = cooldown_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now):
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def retry_after(self):
+        """ثانیه‌های باقی‌مانده تا مجاز شدن فراخوانی (0 یعنی همین حالا)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            if self.state == HALF_OPEN:
+                return float(self.cooldown) if self.trial_running else 0.0
+            return self._retry_after(time.monotonic())
+
+    def before_call(self):
+        """بررسی مجاز بودن فراخوانی؛ در غیر این صورت CircuitOpenError"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self._retry_after(now) > 0:
+                    raise CircuitOpenError(self.family, self._retry_after(now))
+                self.state = HALF_OPEN
+                self.trial_running = False
+            # در حالت half_open فقط یک فراخوانی آزمایشی هم‌زمان مجاز است
+            if self.trial_running:
+                raise CircuitOpenError(self.family, self.cooldown)
+            self.trial_running = True
+
+    def on_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_running = False
+            self.cooldown = self.base_cooldown
+
+    def on_failure(self, error):
+        with self._lock:
+            self.last_error = str(error)[:200]
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # شکست فراخوانی آزمایشی: باز شدن دوباره با cooldown طولانی‌تر
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN_SECONDS)
+                self._open()
+            elif self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trial_running = False
+
+    def status(self):
+        with self._lock:
+            retry_after = (self._retry_after(time.monotonic())
+                           if self.state == OPEN else 0.0)
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "cooldown_seconds": self.cooldown,
+                "retry_after_seconds": round(retry_after, 1),
+                "last_error": self.last_error
+            }
+
+
+class BreakerRegistry:
+    """قطع‌کننده‌های مدار همه خانواده‌های endpoint یک حساب"""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.breakers = {family: CircuitBreaker(family)
+                         for family in set(ENDPOINT_FAMILIES.values())}
+
+    def get(self, family):
+        return self.breakers.get(family)
+
+    def is_open(self, family):
+        """آیا فراخوانی این خانواده فعلاً رد می‌شود"""
+        breaker = self.breakers.get(family)
+        return bool(breaker and breaker.retry_after() > 0)
+
+    def retry_after(self, family):
+        breaker = self.breakers.get(family)
+        return breaker.retry_after() if breaker else 0.0
+
+    def call(self, family, func, *args, **kwargs):
+        """اجرای یک فراخوانی کلاینت از طریق قطع‌کننده مدار خانواده آن"""
+        breaker = self.breakers[family]
+        breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if any(marker in type(e).__name__ for marker in TARGET_ERROR_MARKERS):
+                breaker.on_success()
+                raise
+            previous = breaker.state
+            breaker.on_failure(e)
+            if self.logger and breaker.state == OPEN and previous != OPEN:
+                self.logger.warning(
+                    f"🔌 مدار {family} باز شد ({breaker.cooldown} ثانیه): {e}")
+            raise
+        if self.logger and breaker.state != CLOSED:
+            self.logger.info(f"🔌 مدار {family} بسته شد")
+        breaker.on_success()
+        return result
+
+    def status(self):
+        return {family: breaker.status()
+                for family, breaker in sorted(self.breakers.items())}
+
+
+class GuardedClient:
+    """پوشش کلاینت instagrapi که متدهای شناخته شده را از قطع‌کننده مدار عبور می‌دهد
+
+    در صورت داشتن cache، پاسخ متدهای خواندنی از کش داده می‌شود (بدون
+    درخواست شبکه و بدون مصرف قطع‌کننده مدار) و متدهای نوشتنی پس از موفقیت
+    پاسخ‌های مربوط را باطل می‌کنند.
+    """
+
+    def __init__(self, client, breakers, cache=None):
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "_breakers", breakers)
+        object.__setattr__(self, "_cache", cache)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        family = ENDPOINT_FAMILIES.get(name)
+        if family is None or not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            return self._breakers.call(family, attr, *args, **kwargs)
+
+        cache = self._cache
+        if cache is None:
+            return guarded
+        if cache.caches(name):
+            return lambda *args, **kwargs: cache.call(name, guarded, *args, **kwargs)
+
+        def invalidating(*args, **kwargs):
+            result = guarded(*args, **kwargs)
+            cache.invalidate(name, args, kwargs)
+            return result
+        return invalidating
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
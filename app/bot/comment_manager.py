@@ -1,10 +1,9 @@
 import random
-import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import re
 
-from app.bot.utils import load_json_file, random_delay, should_take_break, take_random_break
+from app.bot.utils import load_json_file, should_take_break
 from app.config import COMMENTS_FILE
 
 
@@ -12,13 +11,18 @@ class CommentManager:
     def __init__(self, session_manager, interaction_manager):
         self.session_manager = session_manager
         self.interaction_manager = interaction_manager
-        self.client = session_manager.client
         self.logger = session_manager.logger
+        self.pacer = session_manager.pacer
         self.comments = load_json_file(COMMENTS_FILE)
 
         # دسته‌بندی کامنت‌ها بر اساس کلیدواژه‌ها
         self.categorized_comments = self._categorize_comments()
 
+    @property
+    def client(self):
+        """کلاینت فعلی (پس از چالش توسط SessionManager جایگزین می‌شود)"""
+        return self.session_manager.client
+
     def _categorize_comments(self):
         """دسته‌بندی کامنت‌ها برای استفاده هوشمندانه‌تر"""
         categories = {
@@ -126,7 +130,7 @@ class CommentManager:
 
             for media in medias:
                 # استراحت طولانی‌تر قبل از کامنت
-                time.sleep(random.randint(20, 40))
+                self.pacer.sleep(random.randint(20, 40), "pre_comment")
 
                 try:
                     username = media.user.username
@@ -149,12 +153,12 @@ class CommentManager:
                         comment_count += 1
 
                     # استراحت طولانی بعد از هر تلاش کامنت
-                    time.sleep(random.randint(60, 120))
+                    self.pacer.sleep(random.randint(60, 120), "post_comment")
 
                 except Exception as e:
                     self.logger.error(f"خطا در کامنت روی پست {media.id}: {e}")
                     # استراحت کوتاه و ادامه با پست بعدی
-                    time.sleep(30)
+                    self.pacer.sleep(30, "comment_error")
                     continue
 
             self.logger.info(f"✅ {comment_count} کامنت با موفقیت ارسال شد")
@@ -205,7 +209,7 @@ class CommentManager:
                         )
 
                     if should_take_break():
-                        take_random_break(self.logger)
+                        self.pacer.take_break()
                 except Exception as e:
                     self.logger.error(f"خطا در کامنت روی پست {media.id}: {e}")
                     continue
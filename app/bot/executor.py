@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from loguru import logger
+
+from app.config import EXECUTOR_MAX_WORKERS, EXECUTOR_MAX_THREADS
+
+# اجراکننده‌ای که نخ فعلی برای آن کار می‌کند (برای آزاد کردن ظرفیت در انتظارها)
+_current = threading.local()
+
+
+@contextmanager
+def waiting():
+    """آزاد کردن ظرفیت اجرای نخ فعلی در طول یک انتظار طولانی
+
+    انتظارهای Pacer (تاخیر بین عملیات، استراحت، توقف پس از challenge) داخل
+    فراخوانی‌های مدیرها انجام می‌شوند؛ در این مدت نخ فقط منتظر است و ظرفیت
+    آن به فراخوانی‌های دیگر (حساب‌های دیگر و API) داده می‌شود.
+    """
+    executor = getattr(_current, "executor", None)
+    if executor is None:
+        yield
+        return
+    executor._release()
+    try:
+        yield
+    finally:
+        executor._acquire()
+
+
+class BotExecutor:
+    """اجرای فراخوانی‌های مسدودکننده (instagrapi و مدیرها) خارج از حلقه رویداد
+
+    حداکثر max_workers فراخوانی هم‌زمان فعال هستند. فراخوانی‌هایی که در
+    انتظار Pacer هستند ظرفیت خود را آزاد می‌کنند و فقط یک نخ از استخر
+    بزرگ‌تر max_threads را نگه می‌دارند.
+    """
+
+    def __init__(self, max_workers=EXECUTOR_MAX_WORKERS, max_threads=EXECUTOR_MAX_THREADS):
+        self.max_workers = max_workers
+        self.max_threads = max(max_threads, max_workers)
+        self._slots = threading.Semaphore(max_workers)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_threads, thread_name_prefix="bot-worker")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._waiting = 0
+        self._closed = False
+
+    def _acquire(self):
+        with self._lock:
+            self._waiting -= 1
+        self._slots.acquire()
+
+    def _release(self):
+        with self._lock:
+            self._waiting += 1
+        self._slots.release()
+
+    def _call(self, call):
+        self._slots.acquire()
+        _current.executor = self
+        try:
+            return call()
+        finally:
+            _current.executor = None
+            self._slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        """اجرای یک تابع همگام در استخر نخ و انتظار برای نتیجه آن"""
+        if self._closed:
+            raise RuntimeError("اجراکننده بات بسته شده است")
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        self._pending += 1
+        try:
+            return await loop.run_in_executor(
+                self._pool, functools.partial(self._call, call))
+        finally:
+            self._pending -= 1
+
+    def status(self):
+        """وضعیت فعلی استخر نخ"""
+        return {
+            "max_workers": self.max_workers,
+            "max_threads": self.max_threads,
+            "pending": self._pending,
+            "waiting": self._waiting,
+            "closed": self._closed
+        }
+
+    def shutdown(self, wait=False):
+        """بستن استخر نخ"""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        logger.info("استخر نخ اجراکننده بات بسته شد")
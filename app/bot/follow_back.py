@@ -0,0 +1,120 @@
+import random
+import threading
+from datetime import datetime
+
+from app.config import (
+    FOLLOWER_SET_TTL,
+    FOLLOWER_PAGE_SIZE,
+    FOLLOWER_SET_MAX,
+    FOLLOW_BACK_MAX_PROBES
+)
+
+
+class FollowBackResolver:
+    """تشخیص فالوبک کاربران با مجموعه فالوورهای حساب
+
+    فالوورهای حساب یک بار به صورت صفحه‌ای دریافت و تا FOLLOWER_SET_TTL
+    نگه داشته می‌شوند و وضعیت همه کاربران فالو شده با یک عضویت در مجموعه
+    مشخص می‌شود. فقط موارد نامشخص (مجموعه ناقص یا قدیمی‌تر از فالو) با
+    user_friendship و حداکثر FOLLOW_BACK_MAX_PROBES بار بررسی می‌شوند.
+    """
+
+    def __init__(self, session_manager, ttl=FOLLOWER_SET_TTL,
+                 page_size=FOLLOWER_PAGE_SIZE, max_followers=FOLLOWER_SET_MAX):
+        self.session_manager = session_manager
+        self.logger = session_manager.logger
+        self.pacer = session_manager.pacer
+        self.ttl = ttl
+        self.page_size = page_size
+        self.max_followers = max_followers
+        self._lock = threading.Lock()
+        self._followers = None
+        self._complete = False
+        self._fetched_at = None
+        self.fetches = 0
+        self.probes = 0
+
+    @property
+    def client(self):
+        return self.session_manager.client
+
+    def _fresh(self):
+        return (self._fetched_at is not None and
+                (datetime.now() - self._fetched_at).total_seconds() < self.ttl)
+
+    def followers(self, refresh=False):
+        """فالوورهای حساب {user_id: username} و کامل بودن مجموعه"""
+        with self._lock:
+            if refresh or not self._fresh():
+                self._fetch()
+            return self._followers, self._complete
+
+    def _fetch(self):
+        user_id = self.client.user_id
+        followers = {}
+        cursor = ""
+        while True:
+            users, cursor = self.client.user_followers_v1_chunk(
+                user_id, max_amount=self.page_size, max_id=cursor)
+            for user in users:
+                followers[str(user.pk)] = user.username
+            if not cursor or len(followers) >= self.max_followers:
+                break
+            # فاصله کوتاه بین صفحه‌ها
+            self.pacer.sleep(random.uniform(3, 8), "follower_page")
+
+        self._followers = followers
+        self._complete = not cursor
+        self._fetched_at = datetime.now()
+        self.fetches += 1
+        self.logger.info(
+            f"✅ {len(followers)} فالوور حساب دریافت شد"
+            f"{'' if self._complete else ' (مجموعه ناقص)'}")
+
+    def resolve(self, candidates):
+        """وضعیت فالوبک کاربران فالو شده {user_id: followed_back}
+
+        کاربرانی که وضعیت آن‌ها مشخص نشد (خطا یا پایان سهمیه بررسی) در
+        خروجی نیستند.
+        """
+        try:
+            followers, complete = self.followers()
+        except Exception as e:
+            self.logger.error(f"❌ خطا در دریافت فالوورهای حساب: {e}")
+            followers, complete = {}, False
+
+        results = {}
+        ambiguous = []
+        for follow in candidates:
+            user_id = str(follow.user_id)
+            if user_id in followers:
+                results[user_id] = True
+            elif complete and follow.followed_at <= self._fetched_at:
+                results[user_id] = False
+            else:
+                ambiguous.append(user_id)
+
+        for user_id in ambiguous[:FOLLOW_BACK_MAX_PROBES]:
+            self.pacer.delay()
+            try:
+                results[user_id] = bool(
+                    self.client.user_friendship(user_id).followed_by)
+                self.probes += 1
+            except Exception as e:
+                self.logger.error(f"خطا در بررسی کاربر {user_id}: {e}")
+
+        self.logger.info(
+            f"بررسی فالوبک {len(candidates)} کاربر: {len(results)} مشخص، "
+            f"{min(len(ambiguous), FOLLOW_BACK_MAX_PROBES)} بررسی تکی")
+        return results
+
+    def status(self):
+        """وضعیت مجموعه فالوورها برای API"""
+        with self._lock:
+            return {
+                "followers": len(self._followers or {}),
+                "complete": self._complete,
+                "fetched_at": self._fetched_at.isoformat() if self._fetched_at else None,
+                "fetches": self.fetches,
+                "probes": self.probes
+            }
@@ -2,32 +2,40 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import random
 
-from app.database.connection import get_db
-from app.database.models import Interaction
-from app.bot.utils import random_delay, should_take_break, take_random_break
+from app.config import FOLLOW_BACK_BATCH_SIZE
+from app.bot.follow_back import FollowBackResolver
+from app.bot.utils import should_take_break
 
 
 class FollowerManager:
     def __init__(self, session_manager, interaction_manager):
         self.session_manager = session_manager
         self.interaction_manager = interaction_manager
-        self.client = session_manager.client
         self.logger = session_manager.logger
         self.session_id = session_manager.session_id
-        self.db = next(get_db())
-
-    def get_followers_to_unfollow(self, days_limit=7, limit=50):
-        """یافتن کاربرانی که فالو کرده‌ایم اما ما را بازگشت نکرده‌اند"""
+        self.account_id = session_manager.account_id
+        self.pacer = session_manager.pacer
+        self.relationships = interaction_manager.relationships
+        self.resolver = FollowBackResolver(session_manager)
+
+    @property
+    def client(self):
+        """کلاینت فعلی (پس از چالش توسط SessionManager جایگزین می‌شود)"""
+        return self.session_manager.client
+
+    def get_followers_to_unfollow(self, days_limit=7, limit=50,
+                                  batch_size=FOLLOW_BACK_BATCH_SIZE):
+        """یافتن کاربرانی که فالو کرده‌ایم اما ما را بازگشت نکرده‌اند
+
+        تا batch_size کاربر فالو شده با یک کوئری انتخاب، با مجموعه فالوورهای
+        حساب مقایسه و نتیجه همه با یک UPDATE ثبت می‌شود.
+        """
         try:
             self.logger.info("یافتن کاربران برای آنفالو...")
 
-            # یافتن تمام کاربرانی که فالو کرده‌ایم
-            date_limit = datetime.now() - timedelta(days=days_limit)
-            followed_users = self.db.query(Interaction).filter(
-                Interaction.interaction_type == "follow",
-                Interaction.success == True,
-                Interaction.created_at <= date_limit
-            ).limit(limit).all()
+            # کاربرانی که فالو کرده‌ایم و هنوز آنفالو نشده‌اند یا فالوبک نکرده‌اند
+            followed_users = self.relationships.unfollow_candidates(
+                days_limit, max(limit, batch_size))
 
             if not followed_users:
                 self.logger.info("هیچ کاربری برای بررسی آنفالو یافت نشد")
@@ -36,42 +44,16 @@ class FollowerManager:
             self.logger.info(
                 f"بررسی {len(followed_users)} کاربر برای آنفالو...")
 
-            users_to_unfollow = []
-            user_info = {}
-
-            for follow in followed_users:
-                if not follow.target_user_id:
-                    continue
-
-                # بررسی آیا این کاربر ما را فالو کرده‌است
-                random_delay()
-
-                try:
-                    # دریافت اطلاعات کاربر
-                    if follow.target_user_id not in user_info:
-                        user = self.client.user_info(follow.target_user_id)
-                        user_info[follow.target_user_id] = user
-                    else:
-                        user = user_info[follow.target_user_id]
-
-                    # بررسی وضعیت فالو
-                    friendship = self.client.user_friendship(
-                        follow.target_user_id)
-
-                    # اگر ما را فالو نکرده، اضافه به لیست آنفالو
-                    if not friendship.followed_by:
-                        users_to_unfollow.append({
-                            "user_id": follow.target_user_id,
-                            "username": follow.target_user_username or user.username,
-                            "followed_at": follow.created_at
-                        })
-
-                        if should_take_break():
-                            take_random_break(self.logger)
-                except Exception as e:
-                    self.logger.error(
-                        f"خطا در بررسی کاربر {follow.target_user_id}: {e}")
-                    continue
+            followed_back = self.resolver.resolve(followed_users)
+            self.relationships.mark_checked_many(followed_back)
+
+            # کاربرانی که قطعاً ما را فالو نکرده‌اند، به ترتیب قدیمی‌ترین بررسی
+            users_to_unfollow = [{
+                "user_id": follow.user_id,
+                "username": follow.username,
+                "followed_at": follow.followed_at
+            } for follow in followed_users
+                if followed_back.get(str(follow.user_id)) is False][:limit]
 
             self.logger.info(
                 f"✅ {len(users_to_unfollow)} کاربر برای آنفالو یافت شد")
@@ -97,7 +79,7 @@ class FollowerManager:
                 unfollow_count += 1
 
             if should_take_break():
-                take_random_break(self.logger)
+                self.pacer.take_break()
 
         self.logger.info(f"✅ {unfollow_count} کاربر با موفقیت آنفالو شدند")
         return unfollow_count
@@ -107,34 +89,24 @@ class FollowerManager:
         try:
             self.logger.info("یافتن فالوورهای جدید برای فالوبک...")
 
-            # دریافت لیست فالوورهای فعلی
-            current_user_id = self.client.user_id
-            followers = self.client.user_followers(current_user_id)
+            # دریافت لیست فالوورهای فعلی (مشترک با تشخیص فالوبک)
+            followers, _ = self.resolver.followers()
 
             if not followers:
                 self.logger.info("هیچ فالووری یافت نشد")
                 return []
 
-            # دریافت لیست کاربرانی که قبلاً فالو کرده‌ایم
-            date_limit = datetime.now() - timedelta(days=days_limit)
-            followed_users = self.db.query(Interaction).filter(
-                Interaction.interaction_type == "follow",
-                Interaction.success == True
-            ).all()
-
-            followed_ids = set()
-            for follow in followed_users:
-                if follow.target_user_id:
-                    followed_ids.add(follow.target_user_id)
+            # فالوورهایی که قبلاً فالو کرده‌ایم (یک کوئری روی relationships)
+            followed_ids = self.relationships.followed_ids(followers.keys())
 
             # یافتن فالوورهایی که هنوز فالو نکرده‌ایم
             new_followers = []
 
-            for user_id, user in followers.items():
+            for user_id, username in followers.items():
                 if user_id not in followed_ids:
                     new_followers.append({
                         "user_id": user_id,
-                        "username": user.username
+                        "username": username
                     })
 
             self.logger.info(
@@ -165,7 +137,7 @@ class FollowerManager:
                 follow_count += 1
 
             if should_take_break():
-                take_random_break(self.logger)
+                self.pacer.take_break()
 
         self.logger.info(f"✅ {follow_count} کاربر با موفقیت فالوبک شدند")
         return follow_count
@@ -1,14 +1,17 @@
-import time
 import random
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from instagrapi.exceptions import ClientError
 
-from app.database.connection import get_db
-from app.database.models import Interaction, DailyStats
+from app.database.connection import session_scope
+from app.database.interaction_writer import interaction_writer
+from app.database.relationships import RelationshipStore
+from app.bot.rate_limiter import RateLimiter
+from app.bot.seen_set import SeenSet
+from app.bot.throttle import classify_error
+from app.bot.circuit_breaker import ACTION_ENDPOINTS
 from app.bot.utils import (
-    random_delay, should_take_break, take_random_break,
-    get_actions_before_break, load_json_file
+    should_take_break, get_actions_before_break, load_json_file
 )
 from app.config import COMMENTS_FILE, HASHTAGS_FILE
 
@@ -16,103 +19,77 @@ from app.config import COMMENTS_FILE, HASHTAGS_FILE
 class InteractionManager:
     def __init__(self, session_manager):
         self.session_manager = session_manager
-        self.client = session_manager.client
         self.logger = session_manager.logger
         self.session_id = session_manager.session_id
-        self.db = next(get_db())
+        self.account_id = session_manager.account_id
+        self.pacer = session_manager.pacer
+        self.throttle = session_manager.throttle
         self.comments = load_json_file(COMMENTS_FILE)
         self.hashtags = load_json_file(HASHTAGS_FILE)
         self.actions_count = 0
         self.actions_before_break = get_actions_before_break()
-
-        # آمار امروز
-        self.today_stats = self._get_or_create_daily_stats()
-
-    def _get_or_create_daily_stats(self):
-        """دریافت یا ساخت رکورد آمار روزانه با مدیریت خطا"""
+        # نتیجه آخرین تعامل ثبت شده (success, error)؛ صف عملیات با آن تشخیص
+        # می‌دهد که درخواست پیش از توقف در استراحت پس از آن ارسال شده است
+        self.last_recorded = None
+
+        # بودجه روزانه هر نوع عملیات
+        self.rate_limiter = RateLimiter(self.account_id, logger=self.logger)
+        # وضعیت کاربران فالو شده برای انتخاب آنفالو و فالوبک
+        self.relationships = RelationshipStore(self.account_id)
+        # عملیات انجام شده برای جلوگیری از تکرار روی یک هدف
+        self.seen = SeenSet(self.account_id, logger=self.logger)
         try:
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-
-            try:
-                stats = self.db.query(DailyStats).filter(
-                    DailyStats.date == today).first()
-            except Exception as query_error:
-                self.logger.error(f"خطا در جستجوی آمار روزانه: {query_error}")
-                # تلاش برای ریست جلسه دیتابیس
-                self.db = next(get_db())
-                stats = None
-
-            if not stats:
-                try:
-                    stats = DailyStats(
-                        date=today,
-                        likes_count=0,
-                        comments_count=0,
-                        follows_count=0,
-                        unfollows_count=0,
-                        story_views_count=0,
-                        dms_count=0,
-                        total_interactions=0,
-                        success_rate=100.0
-                    )
-                    self.db.add(stats)
-                    self.db.commit()
-                    self.db.refresh(stats)
-                    self.logger.info(
-                        f"رکورد آمار روزانه جدید ایجاد شد: {today.strftime('%Y-%m-%d')}")
-                except Exception as create_error:
-                    self.logger.error(
-                        f"خطا در ایجاد آمار روزانه: {create_error}")
-                    self.db.rollback()
-                    # ایجاد یک آبجکت موقت بدون ذخیره در دیتابیس
-                    stats = DailyStats(
-                        date=today,
-                        likes_count=0,
-                        comments_count=0,
-                        follows_count=0,
-                        unfollows_count=0,
-                        story_views_count=0,
-                        dms_count=0,
-                        total_interactions=0,
-                        success_rate=100.0
-                    )
-                    self.logger.warning(
-                        "از آبجکت آمار موقت استفاده می‌شود (بدون ذخیره در دیتابیس)")
-
-            return stats
+            with session_scope() as db:
+                self.rate_limiter.seed(db)
+                self.seen.seed(db)
         except Exception as e:
-            self.logger.error(f"خطا در دریافت/ساخت آمار روزانه: {e}")
-            # بازگرداندن یک آبجکت موقت
-            return DailyStats(
-                date=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
-                likes_count=0,
-                comments_count=0,
-                follows_count=0,
-                unfollows_count=0,
-                story_views_count=0,
-                dms_count=0,
-                total_interactions=0,
-                success_rate=100.0
-            )
+            self.logger.error(f"خطا در مقداردهی محدودکننده نرخ: {e}")
+
+    @property
+    def client(self):
+        """کلاینت فعلی (پس از چالش توسط SessionManager جایگزین می‌شود)"""
+        return self.session_manager.client
+
+    def _can_perform(self, interaction_type):
+        """بررسی مدار endpoint و مصرف بودجه عملیات پیش از ارسال درخواست به اینستاگرام"""
+        family = ACTION_ENDPOINTS.get(interaction_type)
+        retry_after = self.session_manager.breakers.retry_after(family)
+        if retry_after > 0:
+            self.logger.warning(
+                f"مدار {family} باز است؛ {int(retry_after)} ثانیه تا تلاش بعدی")
+            return False
+
+        if self.rate_limiter.acquire(interaction_type):
+            return True
+        wait = self.rate_limiter.wait_time(interaction_type)
+        self.logger.warning(
+            f"محدودیت نرخ {interaction_type} رسیده است؛ {int(wait)} ثانیه تا عملیات بعدی")
+        return False
+
+    def already_done(self, interaction_type, target, label=None):
+        """بررسی انجام قبلی عملیات روی همین هدف پیش از درخواست شبکه"""
+        if self.seen.seen(interaction_type, target):
+            self.logger.info(
+                f"⏭️ {interaction_type} روی {label or target} قبلاً انجام شده است")
+            return True
+        return False
 
     # بخش _record_interaction در فایل app/bot/interaction_manager.py
     def _record_interaction(self, interaction_type, target_user_id=None, target_user_username=None,
                             target_media_id=None, target_media_shortcode=None, content=None, success=True, error=None):
         """ثبت یک تعامل در دیتابیس با مدیریت خطای بهبود یافته"""
         try:
-            # ابتدا بررسی کنیم که دیتابیس و جداول وجود دارند
-            try:
-                # یک کوئری ساده برای بررسی وجود جدول
-                interaction_count = self.db.query(Interaction).count()
-                self.logger.debug(
-                    f"تعداد کل تعاملات قبلی: {interaction_count}")
-            except Exception as check_error:
-                self.logger.error(f"خطا در بررسی دیتابیس: {check_error}")
-                # ادامه اجرا - ممکن است جلوتر مشکل حل شود
-
-            # ایجاد رکورد جدید
-            interaction = Interaction(
+            # تنظیم سرعت تطبیقی بر اساس نتیجه این عملیات
+            self.throttle.record(interaction_type, success, error)
+
+            if success:
+                self.seen.add(interaction_type, target_media_id if interaction_type in (
+                    "like", "comment", "view_story") else target_user_id)
+
+            # رکورد و شمارنده‌های آمار روزانه به صورت گروهی در پس‌زمینه نوشته می‌شوند
+            interaction_writer.add(
                 session_id=self.session_id,
+                account_id=self.account_id,
                 interaction_type=interaction_type,
                 target_user_id=target_user_id,
                 target_user_username=target_user_username,
@@ -123,53 +100,19 @@ class InteractionManager:
                 error=error
             )
 
-            try:
-                self.db.add(interaction)
-                self.db.commit()
-
-                # به‌روزرسانی آمار روزانه
-                if success:
-                    if not hasattr(self, 'today_stats') or self.today_stats is None:
-                        # اگر today_stats وجود ندارد، آن را دوباره ایجاد کنیم
-                        self.today_stats = self._get_or_create_daily_stats()
-
-                    if interaction_type == "like":
-                        self.today_stats.likes_count += 1
-                    elif interaction_type == "comment":
-                        self.today_stats.comments_count += 1
-                    elif interaction_type == "follow":
-                        self.today_stats.follows_count += 1
-                    elif interaction_type == "unfollow":
-                        self.today_stats.unfollows_count += 1
-                    elif interaction_type == "view_story":
-                        self.today_stats.story_views_count += 1
-                    elif interaction_type == "dm":
-                        self.today_stats.dms_count += 1
-
-                    self.today_stats.total_interactions += 1
-                    try:
-                        self.db.commit()
-                    except Exception as stats_error:
-                        self.logger.error(
-                            f"خطا در به‌روزرسانی آمار روزانه: {stats_error}")
-                        self.db.rollback()
-                        # ادامه کار بدون توقف
-            except Exception as db_error:
-                self.logger.error(f"خطا در ثبت تعامل در دیتابیس: {db_error}")
-                self.db.rollback()
-                # ادامه کار بدون توقف
+            self.last_recorded = (success, error)
 
             # افزایش شمارنده اقدامات
             self.actions_count += 1
 
             # بررسی نیاز به استراحت
             if self.actions_count >= self.actions_before_break:
-                take_random_break(self.logger)
                 self.actions_count = 0
                 self.actions_before_break = get_actions_before_break()
+                self.pacer.take_break()
             elif should_take_break():
                 self.logger.info("استراحت تصادفی...")
-                take_random_break(self.logger)
+                self.pacer.take_break()
 
             return True
         except Exception as e:
@@ -179,18 +122,26 @@ class InteractionManager:
     def like_media(self, media_id, shortcode=None, username=None):
         """لایک کردن یک پست"""
         try:
+            if self.already_done("like", media_id, shortcode):
+                return False
+
+            if not self._can_perform("like"):
+                return False
+
             self.logger.info(
                 f"لایک کردن پست {shortcode or media_id} از {username or 'کاربر ناشناس'}")
-            random_delay()
+            self.pacer.delay("like")
 
+            error_msg = None
             try:
                 result = self.client.media_like(media_id)
                 success = result is True
             except Exception as e:
-                if "challenge_required" in str(e):
+                if classify_error(e) == "challenge":
                     self.logger.error(
                         f"❌ خطا در لایک کردن: challenge_required")
-                    self.session_manager.handle_challenge(e)
+                    error_msg = str(e)
+                    self.session_manager.handle_challenge(e, "like")
                     success = False
                 else:
                     raise e
@@ -206,7 +157,8 @@ class InteractionManager:
                 target_user_username=username,
                 target_media_id=media_id,
                 target_media_shortcode=shortcode,
-                success=success
+                success=success,
+                error=error_msg
             )
 
             return success
@@ -234,17 +186,18 @@ class InteractionManager:
                 self.logger.warning("هیچ متن کامنتی برای ارسال وجود ندارد")
                 return False
 
+            if self.already_done("comment", media_id, shortcode):
+                return False
+
+            # بررسی محدودیت روزانه کامنت
+            if not self._can_perform("comment"):
+                return False
+
             self.logger.info(
                 f"کامنت گذاشتن روی پست {shortcode or media_id} از {username or 'کاربر ناشناس'}")
 
             # تاخیر طولانی‌تر قبل از کامنت گذاشتن
-            random_delay()
-
-            # بررسی محدودیت روزانه کامنت
-            # کاهش محدودیت روزانه کامنت به 10
-            if hasattr(self, 'today_stats') and self.today_stats.comments_count >= 10:
-                self.logger.warning("محدودیت روزانه کامنت رسیده است")
-                return False
+            self.pacer.delay("comment")
 
             # کوتاه‌سازی متن کامنت - کامنت‌های کوتاه‌تر احتمال کمتری برای خطای challenge دارند
             if len(text) > 30:
@@ -259,15 +212,16 @@ class InteractionManager:
                 success = result is not None
             except Exception as e:
                 error_msg = str(e).lower()
-                if "challenge_required" in error_msg:
+                error_kind = classify_error(error_msg)
+                if error_kind == "challenge":
                     self.logger.error(
                         f"❌ خطا در کامنت گذاشتن: challenge_required")
                     # فقط لاگ می‌کنیم و ادامه می‌دهیم - بدون فراخوانی handle_challenge
                     success = False
-                elif "spam" in error_msg:
+                elif error_kind == "spam":
                     self.logger.error(f"❌ خطای اسپم در کامنت گذاشتن: {e}")
-                    # استراحت کوتاه بدون فراخوانی handle_challenge
-                    time.sleep(10)
+                    # استراحت کوتاه (متناسب با سرعت فعلی) بدون فراخوانی handle_challenge
+                    self.pacer.backoff(10, "comment", "spam_backoff")
                     success = False
                 else:
                     self.logger.error(f"❌ خطای عمومی در کامنت گذاشتن: {e}")
@@ -321,23 +275,32 @@ class InteractionManager:
                     "برای فالو کردن باید آیدی یا نام کاربری مشخص باشد")
                 return False
 
+            if self.already_done("follow", user_id, username):
+                return False
+
+            if not self._can_perform("follow"):
+                return False
+
             self.logger.info(f"فالو کردن کاربر {username or user_id}")
-            random_delay()
+            self.pacer.delay("follow")
 
+            error_msg = None
             try:
                 result = self.client.user_follow(user_id)
                 success = result is True
             except Exception as e:
-                if "challenge_required" in str(e):
+                if classify_error(e) == "challenge":
                     self.logger.error(
                         f"❌ خطا در فالو کردن: challenge_required")
-                    self.session_manager.handle_challenge(e)
+                    error_msg = str(e)
+                    self.session_manager.handle_challenge(e, "follow")
                     success = False
                 else:
                     raise e
 
             if success:
                 self.logger.info(f"✅ فالو موفق: {username or user_id}")
+                self.relationships.record_follow(user_id, username)
             else:
                 self.logger.warning(f"⚠️ فالو ناموفق: {username or user_id}")
 
@@ -345,7 +308,8 @@ class InteractionManager:
                 interaction_type="follow",
                 target_user_id=user_id,
                 target_user_username=username,
-                success=success
+                success=success,
+                error=error_msg
             )
 
             return success
@@ -373,14 +337,18 @@ class InteractionManager:
                     "برای آنفالو کردن باید آیدی یا نام کاربری مشخص باشد")
                 return False
 
+            if not self._can_perform("unfollow"):
+                return False
+
             self.logger.info(f"آنفالو کردن کاربر {username or user_id}")
-            random_delay()
+            self.pacer.delay("unfollow")
 
             result = self.client.user_unfollow(user_id)
             success = result is True
 
             if success:
                 self.logger.info(f"✅ آنفالو موفق: {username or user_id}")
+                self.relationships.record_unfollow(user_id, username)
             else:
                 self.logger.warning(f"⚠️ آنفالو ناموفق: {username or user_id}")
 
@@ -416,8 +384,11 @@ class InteractionManager:
                     "برای مشاهده استوری باید آیدی یا نام کاربری مشخص باشد")
                 return False
 
+            if not self._can_perform("view_story"):
+                return False
+
             self.logger.info(f"مشاهده استوری کاربر {username or user_id}")
-            random_delay()
+            self.pacer.delay("view_story")
 
             stories = self.client.user_stories(user_id)
 
@@ -425,8 +396,13 @@ class InteractionManager:
                 self.logger.info(f"کاربر {username or user_id} استوری ندارد")
                 return False
 
-            # مشاهده اولین استوری
-            story = stories[0]
+            # مشاهده اولین استوری که قبلاً دیده نشده است
+            story = next((story for story in stories
+                          if not self.seen.seen("view_story", story.pk)), None)
+            if not story:
+                self.logger.info(
+                    f"استوری‌های کاربر {username or user_id} قبلاً مشاهده شده‌اند")
+                return False
             result = self.client.story_seen([story.pk])
             success = result is not None
 
@@ -474,17 +450,25 @@ class InteractionManager:
                 self.logger.warning("متن پیام مشخص نشده است")
                 return False
 
+            if self.already_done("dm", user_id, username):
+                return False
+
+            if not self._can_perform("dm"):
+                return False
+
             self.logger.info(f"ارسال پیام به کاربر {username or user_id}")
-            random_delay()
+            self.pacer.delay("dm")
 
+            error_msg = None
             try:
                 result = self.client.direct_send(text, [user_id])
                 success = result is not None
             except Exception as e:
-                if "challenge_required" in str(e):
+                if classify_error(e) == "challenge":
                     self.logger.error(
                         f"❌ خطا در ارسال پیام: challenge_required")
-                    self.session_manager.handle_challenge(e)
+                    error_msg = str(e)
+                    self.session_manager.handle_challenge(e, "dm")
                     success = False
                 else:
                     raise e
@@ -500,7 +484,8 @@ class InteractionManager:
                 target_user_id=user_id,
                 target_user_username=username,
                 content=text,
-                success=success
+                success=success,
+                error=error_msg
             )
 
             return success
@@ -520,7 +505,7 @@ class InteractionManager:
         """جستجوی پست‌ها با هشتگ"""
         try:
             self.logger.info(f"جستجوی هشتگ #{hashtag}")
-            random_delay()
+            self.pacer.delay()
 
             medias = self.client.hashtag_medias_recent(hashtag, amount=10)
 
@@ -548,7 +533,7 @@ class InteractionManager:
                 return []
 
             self.logger.info(f"دریافت فالوورهای کاربر {username or user_id}")
-            random_delay()
+            self.pacer.delay()
 
             followers = self.client.user_followers(user_id, amount=amount)
 
@@ -578,7 +563,10 @@ class InteractionManager:
 
             self.logger.info(
                 f"دریافت فالویینگ‌های کاربر {username or user_id}")
-            random_delay()
+            # پاسخ کش شده درخواست شبکه‌ای ندارد و تاخیر لازم نیست
+            if not self.session_manager.cache.contains(
+                    "user_following", user_id, amount=amount):
+                self.pacer.delay()
 
             following = self.client.user_following(user_id, amount=amount)
 
@@ -0,0 +1,178 @@
+import asyncio
+import random
+import threading
+import time
+
+from app.config import (
+    MIN_ACTION_DELAY,
+    MAX_ACTION_DELAY,
+    MIN_BREAK_TIME,
+    MAX_BREAK_TIME
+)
+from app.bot.executor import waiting
+
+
+class PacingCancelled(BaseException):
+    """لغو انتظار به دلیل توقف بات
+
+    مانند asyncio.CancelledError از BaseException ارث می‌برد تا بلوک‌های
+    `except Exception` داخل مدیرها آن را به عنوان خطای عملیات ثبت نکنند.
+    """
+
+
+class CancellationToken:
+    """توکن لغو مشترک بین نخ‌های کاری و حلقه رویداد"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """لغو همه انتظارهای جاری و آینده"""
+        with self._lock:
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def reset(self):
+        """آماده‌سازی دوباره توکن برای شروع مجدد"""
+        self._event.clear()
+
+    def wait(self, timeout):
+        """انتظار تا پایان زمان یا لغو؛ در صورت لغو True برمی‌گرداند"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class Pacer:
+    """موتور زمان‌بندی تاخیرها و استراحت‌ها با قابلیت لغو
+
+    جایگزین time.sleep در مدیرها؛ انتظارهای همگام در نخ‌های کاری و انتظارهای
+    ناهمگام در حلقه رویداد هر دو با یک توکن لغو می‌شوند و زمان باقی‌مانده
+    هر انتظار از طریق status قابل گزارش است.
+    """
+
+    def __init__(self, token=None, logger=None, throttle=None):
+        self.token = token or CancellationToken()
+        self.logger = logger
+        # کنترل سرعت تطبیقی؛ تاخیر هر عملیات با ضریب آن بزرگ می‌شود
+        self.throttle = throttle
+        self._waits = {}
+        self._lock = threading.Lock()
+        self._next_wait_id = 0
+
+    def _begin_wait(self, seconds, reason):
+        now = time.time()
+        with self._lock:
+            self._next_wait_id += 1
+            wait_id = self._next_wait_id
+            self._waits[wait_id] = {
+                "reason": reason,
+                "started_at": now,
+                "ends_at": now + seconds
+            }
+        return wait_id
+
+    def _end_wait(self, wait_id):
+        with self._lock:
+            self._waits.pop(wait_id, None)
+
+    def sleep(self, seconds, reason="delay"):
+        """انتظار همگام و قابل لغو (برای نخ‌های کاری، بدون اشغال ظرفیت اجراکننده)"""
+        if self.token.cancelled:
+            raise PacingCancelled(reason)
+
+        wait_id = self._begin_wait(seconds, reason)
+        try:
+            # ظرفیت اجراکننده در طول انتظار به فراخوانی‌های دیگر داده می‌شود
+            with waiting():
+                cancelled = self.token.wait(seconds)
+            if cancelled:
+                raise PacingCancelled(reason)
+        finally:
+            self._end_wait(wait_id)
+        return seconds
+
+    async def asleep(self, seconds, reason="delay"):
+        """انتظار ناهمگام و قابل لغو (برای حلقه رویداد)"""
+        if self.token.cancelled:
+            raise PacingCancelled(reason)
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(
+                lambda: waiter.done() or waiter.set_result(True))
+
+        timer = loop.call_later(
+            seconds, lambda: waiter.done() or waiter.set_result(False))
+        self.token.add_callback(wake)
+        wait_id = self._begin_wait(seconds, reason)
+        try:
+            if await waiter:
+                raise PacingCancelled(reason)
+        finally:
+            timer.cancel()
+            self.token.remove_callback(wake)
+            self._end_wait(wait_id)
+        return seconds
+
+    def delay(self, action_type=None):
+        """تاخیر تصادفی بین عملیات‌ها، متناسب با سرعت فعلی این نوع عملیات"""
+        delay = random.uniform(MIN_ACTION_DELAY, MAX_ACTION_DELAY)
+        if self.throttle:
+            delay *= self.throttle.delay_factor(action_type)
+        return self.sleep(delay, "action_delay")
+
+    def backoff(self, seconds, action_type=None, reason="backoff"):
+        """انتظار پس از خطا، بزرگ شده با ضریب تاخیر فعلی"""
+        if self.throttle:
+            seconds *= self.throttle.delay_factor(action_type)
+        return self.sleep(seconds, reason)
+
+    def take_break(self):
+        """استراحت تصادفی طولانی"""
+        break_time = random.randint(MIN_BREAK_TIME * 60, MAX_BREAK_TIME * 60)
+        if self.logger:
+            self.logger.info(f"در حال استراحت به مدت {break_time // 60} دقیقه...")
+        return self.sleep(break_time, "break")
+
+    def remaining(self):
+        """بیشترین زمان باقی‌مانده از انتظارهای جاری (ثانیه)"""
+        now = time.time()
+        with self._lock:
+            ends = [wait["ends_at"] for wait in self._waits.values()]
+        return max([end - now for end in ends], default=0.0)
+
+    def status(self):
+        """وضعیت انتظارهای جاری برای گزارش در API"""
+        now = time.time()
+        with self._lock:
+            waits = list(self._waits.values())
+        return {
+            "cancelled": self.token.cancelled,
+            "remaining_seconds": round(self.remaining(), 1),
+            "waits": [
+                {
+                    "reason": wait["reason"],
+                    "elapsed_seconds": round(now - wait["started_at"], 1),
+                    "remaining_seconds": round(max(wait["ends_at"] - now, 0), 1)
+                }
+                for wait in waits
+            ]
+        }
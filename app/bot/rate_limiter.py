@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from app.config import (
+    DAILY_LIKE_LIMIT,
+    DAILY_COMMENT_LIMIT,
+    DAILY_FOLLOW_LIMIT,
+    DAILY_UNFOLLOW_LIMIT,
+    DAILY_DM_LIMIT,
+    RATE_LIMIT_BURST_FRACTION
+)
+from app.database.models import Interaction
+
+# بودجه روزانه هر نوع عملیات؛ انواع بدون محدودیت در این لیست نیستند
+DAILY_LIMITS = {
+    "like": DAILY_LIKE_LIMIT,
+    "comment": DAILY_COMMENT_LIMIT,
+    "follow": DAILY_FOLLOW_LIMIT,
+    "unfollow": DAILY_UNFOLLOW_LIMIT,
+    "dm": DAILY_DM_LIMIT
+}
+
+WINDOW_SECONDS = 24 * 3600
+
+
+class _Bucket:
+    """سطل توکن با پنجره لغزان ۲۴ ساعته برای یک نوع عملیات"""
+
+    def __init__(self, daily_limit, burst_fraction):
+        self.daily_limit = daily_limit
+        self.capacity = max(1, math.ceil(daily_limit * burst_fraction))
+        # پر شدن یکنواخت در طول روز
+        self.rate = daily_limit / WINDOW_SECONDS
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        # زمان عملیات ۲۴ ساعت اخیر (epoch) برای سقف سخت روزانه
+        self.history = deque()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def _expire(self, wall):
+        while self.history and self.history[0] <= wall - WINDOW_SECONDS:
+            self.history.popleft()
+
+    def used(self, wall):
+        self._expire(wall)
+        return len(self.history)
+
+    def wait_time(self, now, wall):
+        """ثانیه‌های لازم تا آزاد شدن یک عملیات"""
+        if self.daily_limit <= 0:
+            # عملیات غیرفعال (DAILY_*_LIMIT=0): هرگز آزاد نمی‌شود
+            return float(WINDOW_SECONDS)
+        self._refill(now)
+        waits = [0.0]
+        if self.used(wall) >= self.daily_limit:
+            waits.append(self.history[0] + WINDOW_SECONDS - wall)
+        if self.tokens < 1:
+            waits.append((1 - self.tokens) / self.rate)
+        return max(waits)
+
+    def consume(self, wall):
+        self.tokens -= 1
+        self.history.append(wall)
+
+
+class RateLimiter:
+    """محدودکننده نرخ هر حساب بر اساس تنظیمات DAILY_*_LIMIT
+
+    هر نوع عملیات یک سطل توکن دارد که در طول روز به طور یکنواخت پر می‌شود
+    (حداکثر RATE_LIMIT_BURST_FRACTION از بودجه پشت سر هم) و یک پنجره لغزان
+    ۲۴ ساعته که از سقف روزانه عبور نمی‌کند. پنجره از جدول interactions
+    مقداردهی می‌شود تا راه‌اندازی مجدد بودجه را ریست نکند.
+    """
+
+    def __init__(self, account_id, limits=None, burst_fraction=RATE_LIMIT_BURST_FRACTION, logger=None):
+        self.account_id = account_id
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.buckets = {
+            action_type: _Bucket(limit, burst_fraction)
+            for action_type, limit in (limits or DAILY_LIMITS).items()
+        }
+
+    def seed(self, db):
+        """بارگذاری عملیات ۲۴ ساعت اخیر این حساب از جدول interactions"""
+        since = datetime.now() - timedelta(seconds=WINDOW_SECONDS)
+        rows = db.query(Interaction.interaction_type, Interaction.created_at).filter(
+            Interaction.account_id == self.account_id,
+            Interaction.interaction_type.in_(list(self.buckets)),
+            Interaction.created_at >= since
+        ).order_by(Interaction.created_at).all()
+
+        with self._lock:
+            for action_type, created_at in rows:
+                bucket = self.buckets[action_type]
+                bucket.history.append(created_at.timestamp())
+
+            wall = time.time()
+            for bucket in self.buckets.values():
+                # توکن‌های اولیه بیشتر از بودجه باقی‌مانده روز نیست
+                remaining = bucket.daily_limit - bucket.used(wall)
+                bucket.tokens = float(max(0, min(bucket.capacity, remaining)))
+
+        if self.logger:
+            self.logger.info(
+                f"محدودکننده نرخ از {len(rows)} تعامل ۲۴ ساعت اخیر مقداردهی شد")
+
+    def wait_time(self, action_type):
+        """ثانیه‌های انتظار تا مجاز شدن عملیات (0 یعنی همین حالا)"""
+        bucket = self.buckets.get(action_type)
+        if not bucket:
+            return 0.0
+        with self._lock:
+            return bucket.wait_time(time.monotonic(), time.time())
+
+    def acquire(self, action_type):
+        """مصرف یک توکن در صورت موجود بودن؛ خروجی False یعنی محدودیت رسیده"""
+        bucket = self.buckets.get(action_type)
+        if not bucket:
+            return True
+        with self._lock:
+            wall = time.time()
+            if bucket.wait_time(time.monotonic(), wall) > 0:
+                return False
+            bucket.consume(wall)
+            return True
+
+    def remaining(self, action_type):
+        """بودجه باقی‌مانده در پنجره ۲۴ ساعته (None برای عملیات بدون محدودیت)"""
+        bucket = self.buckets.get(action_type)
+        if not bucket:
+            return None
+        with self._lock:
+            return max(0, bucket.daily_limit - bucket.used(time.time()))
+
+    def status(self):
+        """وضعیت بودجه همه انواع عملیات برای API"""
+        result = {}
+        with self._lock:
+            now, wall = time.monotonic(), time.time()
+            for action_type, bucket in self.buckets.items():
+                used = bucket.used(wall)
+                result[action_type] = {
+                    "daily_limit": bucket.daily_limit,
+                    "used_24h": used,
+                    "remaining_24h": max(0, bucket.daily_limit - used),
+                    "tokens": round(bucket.tokens, 2),
+                    "burst": bucket.capacity,
+                    "next_available_seconds": round(bucket.wait_time(now, wall), 1)
+                }
+        return result
@@ -0,0 +1,139 @@
+from datetime import datetime
+
+from loguru import logger
+
+from app.config import INSTAGRAM_ACCOUNTS
+from app.database.leases import LeaseManager
+
+
+class RemoteAccount:
+    """نمای فقط خواندنی یک حساب که در یک پروسه worker اجرا می‌شود"""
+
+    def __init__(self, lease, lease_manager, executor):
+        self.account_id = lease.account_id
+        self.lease_manager = lease_manager
+        self.executor = executor
+        self.worker_id = lease.worker_id
+        self.desired_state = lease.desired_state
+        self.reported_status = lease.status
+        self.details = lease.status_details or {}
+        self.heartbeat_at = lease.heartbeat_at
+        self.alive = bool(lease.worker_id and lease.lease_expires_at
+                          and lease.lease_expires_at > datetime.now())
+        # سازگاری با رابط AccountStack در main.py
+        self.session_manager = None
+        self.automated_bot = None
+
+    @property
+    def logged_in(self):
+        return self.alive and self.reported_status == "running"
+
+    @property
+    def running(self):
+        return self.logged_in and self.details.get("auto_mode") == "running"
+
+    @property
+    def starting(self):
+        return self.desired_state != "stopped" and not self.logged_in
+
+    async def _set_desired_state(self, desired_state):
+        await self.executor.run(
+            self.lease_manager.set_desired_state, [self.account_id], desired_state)
+        self.desired_state = desired_state
+
+    async def start(self):
+        await self._set_desired_state("running")
+
+    async def stop(self):
+        await self._set_desired_state("stopped")
+        return True
+
+    async def reset(self):
+        await self._set_desired_state("restart")
+
+    def status(self):
+        status = dict(self.details)
+        status.update({
+            "account_id": self.account_id,
+            "status": self.reported_status if self.alive else "unassigned",
+            "desired_state": self.desired_state,
+            "worker_id": self.worker_id if self.alive else None,
+            "heartbeat_at": self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        })
+        return status
+
+
+class RemoteAccountRegistry:
+    """رجیستری حساب‌ها در حالت control؛ وضعیت از جدول account_leases خوانده می‌شود
+
+    فراخوانی‌های دیتابیس در اجراکننده انجام می‌شوند. هر درخواست API یک بار
+    refresh را صدا می‌زند و بقیه متدها از همان تصویر (snapshot) می‌خوانند.
+    ثبت حساب‌ها در جدول اجاره پس از آماده شدن دیتابیس (seed) انجام می‌شود.
+    """
+
+    remote = True
+
+    def __init__(self, executor, lease_manager=None):
+        self.executor = executor
+        self.lease_manager = lease_manager or LeaseManager()
+        self.seeded = False
+        self._accounts = []
+
+    async def seed(self):
+        """ثبت حساب‌های تعریف شده در جدول اجاره (پس از آماده‌سازی دیتابیس)"""
+        await self.executor.run(
+            self.lease_manager.seed_accounts,
+            [account["username"] for account in INSTAGRAM_ACCOUNTS])
+        self.seeded = True
+
+    def _load(self):
+        try:
+            return self.lease_manager.list_leases()
+        except Exception as e:
+            logger.error(f"خطا در خواندن اجاره حساب‌ها: {e}")
+            return None
+
+    async def refresh(self):
+        """خواندن تصویر جدید اجاره‌ها (پیش از آماده شدن دیتابیس فهرست خالی)"""
+        if self.seeded:
+            leases = await self.executor.run(self._load)
+            if leases is not None:
+                self._accounts = [
+                    RemoteAccount(lease, self.lease_manager, self.executor)
+                    for lease in leases]
+        return self
+
+    def get(self, account_id):
+        """دریافت حساب؛ در صورت نبود KeyError"""
+        for account in self._accounts:
+            if account.account_id == account_id:
+                return account
+        raise KeyError(account_id)
+
+    def default(self):
+        return next(iter(self._accounts), None)
+
+    def __iter__(self):
+        return iter(self._accounts)
+
+    def __len__(self):
+        return len(self._accounts)
+
+    async def _set_desired_state(self, desired_state):
+        await self.executor.run(
+            self.lease_manager.set_desired_state, None, desired_state)
+
+    async def start_all(self):
+        await self._set_desired_state("running")
+
+    async def stop_all(self):
+        await self._set_desired_state("stopped")
+
+    async def reset_all(self):
+        await self._set_desired_state("restart")
+
+    def status(self):
+        return {
+            "time": datetime.now().isoformat(),
+            "accounts": [account.status() for account in self._accounts]
+        }
@@ -0,0 +1,128 @@
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import RESPONSE_CACHE_TTLS, RESPONSE_CACHE_MAX_BYTES
+
+# متدهای نوشتنی و متدهای خواندنی که پاسخ آن‌ها را برای همان کاربر باطل می‌کنند
+# (فهرست فالویینگ‌ها بدون توجه به کاربر باطل می‌شود)
+WRITE_INVALIDATES = {
+    "user_follow": ("user_info", "user_friendship"),
+    "user_unfollow": ("user_info", "user_friendship")
+}
+INVALIDATE_ALL = {
+    "user_follow": ("user_following",),
+    "user_unfollow": ("user_following",)
+}
+
+
+def _estimate_size(value):
+    """تخمین حجم یک پاسخ در حافظه (حجم pickle شده آن)"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class ResponseCache:
+    """کش TTL + LRU پاسخ متدهای خواندنی کلاینت instagrapi یک حساب
+
+    هر متد TTL جداگانه دارد (RESPONSE_CACHE_TTLS). با عبور حجم تخمینی
+    پاسخ‌ها از max_bytes قدیمی‌ترین استفاده‌ها حذف می‌شوند. متدهای نوشتنی
+    (فالو و آنفالو) پاسخ‌های مربوط به کاربر هدف را باطل می‌کنند.
+    """
+
+    def __init__(self, ttls=RESPONSE_CACHE_TTLS, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.ttls = dict(ttls)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # کلید -> (زمان انقضا، حجم، پاسخ)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.invalidations = 0
+
+    def caches(self, method):
+        return self.ttls.get(method, 0) > 0
+
+    @staticmethod
+    def _key(method, args, kwargs):
+        # شناسه‌ها گاهی int و گاهی str هستند
+        return (method, tuple(str(arg) for arg in args),
+                tuple(sorted((name, str(value)) for name, value in kwargs.items())))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def contains(self, method, *args, **kwargs):
+        """آیا پاسخ معتبری برای این فراخوانی در کش هست (بدون ثبت hit یا miss)"""
+        entry = self._entries.get(self._key(method, args, kwargs))
+        return bool(entry and entry[0] > time.monotonic())
+
+    def call(self, method, func, *args, **kwargs):
+        """پاسخ کش شده در صورت وجود؛ در غیر این صورت فراخوانی و ذخیره"""
+        key = self._key(method, args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits[method] = self.hits.get(method, 0) + 1
+                return entry[2]
+            if entry:
+                self._remove(key)
+            self.misses[method] = self.misses.get(method, 0) + 1
+
+        value = func(*args, **kwargs)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttls[method], size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def invalidate(self, method, args=(), kwargs=None):
+        """باطل کردن پاسخ‌هایی که یک متد نوشتنی آن‌ها را تغییر داده است"""
+        targets = WRITE_INVALIDATES.get(method, ())
+        wipe = INVALIDATE_ALL.get(method, ())
+        if not targets and not wipe:
+            return
+        target = str(args[0] if args else (kwargs or {}).get("user_id"))
+        with self._lock:
+            for key in list(self._entries):
+                read, read_args, _ = key
+                if read in wipe or (read in targets and read_args[:1] == (target,)):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def status(self):
+        """آمار کش برای API"""
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "by_method": {
+                    method: {"hits": self.hits.get(method, 0),
+                             "misses": self.misses.get(method, 0)}
+                    for method in sorted(set(self.hits) | set(self.misses))
+                }
+            }
@@ -0,0 +1,153 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import case, exists
+
+from app.config import SEEN_SET_CAPACITY, SEEN_SET_ERROR_RATE
+from app.database.connection import session_scope
+from app.database.models import Interaction
+
+# ستون هدف هر نوع عملیاتی که نباید دو بار روی یک هدف انجام شود
+# (آنفالو با جدول relationships کنترل می‌شود)
+TARGET_COLUMNS = {
+    "like": Interaction.target_media_id,
+    "comment": Interaction.target_media_id,
+    "follow": Interaction.target_user_id,
+    "view_story": Interaction.target_media_id,
+    "dm": Interaction.target_user_id
+}
+
+# کلیدهای ثبت شده‌ای که ممکن است هنوز توسط interaction_writer نوشته نشده باشند
+RECENT_KEYS = 1024
+
+
+class BloomFilter:
+    """فیلتر بلوم با حافظه ثابت؛ پاسخ منفی قطعی و پاسخ مثبت احتمالی است"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # دو هش مستقل از یک digest و ترکیب خطی آن‌ها (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class SeenSet:
+    """مجموعه (نوع عملیات، هدف) های انجام شده یک حساب برای جلوگیری از عملیات تکراری
+
+    فیلتر بلوم هنگام راه‌اندازی از عملیات موفق جدول interactions پر می‌شود و
+    پیش از هر درخواست شبکه با هزینه O(1) بررسی می‌شود. پاسخ مثبت فیلتر ممکن
+    است اشتباه باشد، بنابراین با یک کوئری روی interactions تأیید می‌شود.
+    """
+
+    def __init__(self, account_id, capacity=SEEN_SET_CAPACITY, error_rate=SEEN_SET_ERROR_RATE, logger=None):
+        self.account_id = account_id
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.capacity = capacity
+        self.recent = OrderedDict()
+        self.skipped = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _key(action_type, target):
+        return f"{action_type}:{target}"
+
+    def seed(self, db):
+        """بارگذاری جدیدترین عملیات موفق این حساب (حداکثر به اندازه ظرفیت فیلتر)"""
+        target = case(
+            *[(Interaction.interaction_type == action_type, column)
+              for action_type, column in TARGET_COLUMNS.items()])
+        rows = db.query(Interaction.interaction_type, target).filter(
+            Interaction.account_id == self.account_id,
+            Interaction.interaction_type.in_(list(TARGET_COLUMNS)),
+            Interaction.success == True,
+            target != None
+        ).order_by(Interaction.created_at.desc()).limit(
+            self.capacity).execution_options(yield_per=10000)
+
+        loaded = 0
+        with self._lock:
+            for action_type, value in rows:
+                self.bloom.add(self._key(action_type, value))
+                loaded += 1
+
+        if self.logger:
+            self.logger.info(f"مجموعه عملیات انجام شده از {loaded} تعامل مقداردهی شد")
+
+    def add(self, action_type, target):
+        """ثبت عملیات موفق روی یک هدف"""
+        if action_type not in TARGET_COLUMNS or not target:
+            return
+        key = self._key(action_type, target)
+        with self._lock:
+            self.bloom.add(key)
+            self.recent[key] = True
+            if len(self.recent) > RECENT_KEYS:
+                self.recent.popitem(last=False)
+
+    def seen(self, action_type, target):
+        """آیا این عملیات قبلاً با موفقیت روی این هدف انجام شده است؟"""
+        if action_type not in TARGET_COLUMNS or not target:
+            return False
+        key = self._key(action_type, target)
+        with self._lock:
+            if key not in self.bloom:
+                return False
+            if key in self.recent:
+                self.skipped += 1
+                return True
+
+        # پاسخ مثبت احتمالی: تأیید از دیتابیس
+        column = TARGET_COLUMNS[action_type]
+        try:
+            with session_scope() as db:
+                found = db.query(exists().where(
+                    Interaction.account_id == self.account_id,
+                    Interaction.interaction_type == action_type,
+                    Interaction.success == True,
+                    column == str(target)
+                )).scalar()
+        except Exception as e:
+            # در نبود دیتابیس رفتار قبلی (انجام عملیات) حفظ می‌شود
+            if self.logger:
+                self.logger.warning(f"خطا در بررسی عملیات تکراری {key}: {e}")
+            return False
+
+        with self._lock:
+            if found:
+                self.skipped += 1
+            else:
+                self.false_positives += 1
+        return found
+
+    def status(self):
+        """وضعیت فیلتر برای API"""
+        with self._lock:
+            return {
+                "entries": self.bloom.count,
+                "capacity": self.capacity,
+                "memory_bytes": len(self.bloom.bits),
+                "hashes": self.bloom.hashes,
+                "skipped": self.skipped,
+                "false_positives": self.false_positives
+            }
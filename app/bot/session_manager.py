@@ -11,23 +11,35 @@ import pickle
 from loguru import logger
 from pathlib import Path
 
-from app.config import INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD
-from app.database.connection import get_db
+from app.config import INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD, DEFAULT_ACCOUNT_ID, SESSIONS_DIR
+from app.database.connection import session_scope
 from app.database.models import BotSession
 from app.bot.utils import setup_logger, generate_session_id
+from app.bot.pacing import Pacer
+from app.bot.throttle import AdaptiveThrottle
+from app.bot.circuit_breaker import BreakerRegistry, GuardedClient
+from app.bot.response_cache import ResponseCache
 
 
 class SessionManager:
-    def __init__(self):
-        self.client = Client()
-        self.username = INSTAGRAM_USERNAME
-        self.password = INSTAGRAM_PASSWORD
-        self.db = next(get_db())
-        self.logger = setup_logger()
+    def __init__(self, username=None, password=None):
+        self.username = username or INSTAGRAM_USERNAME
+        self.password = password if username else INSTAGRAM_PASSWORD
+        # شناسه حساب برای برچسب‌گذاری رکوردهای دیتابیس
+        self.account_id = self.username or DEFAULT_ACCOUNT_ID
+        self.logger = setup_logger().bind(account_id=self.account_id)
+        # قطع‌کننده مدار هر خانواده endpoint؛ با بازنشانی کلاینت حفظ می‌شود
+        self.breakers = BreakerRegistry(logger=self.logger)
+        # کش پاسخ‌های خواندنی؛ مانند قطع‌کننده‌ها با بازنشانی کلاینت حفظ می‌شود
+        self.cache = ResponseCache()
+        self.client = self._new_client()
         self.session_id = generate_session_id()
         self.logged_in = False
         self.last_error = None
         self.last_operation = "راه‌اندازی"
+        # کنترل سرعت تطبیقی و زمان‌بندی تاخیرها، مشترک بین همه مدیرها
+        self.throttle = AdaptiveThrottle(logger=self.logger)
+        self.pacer = Pacer(logger=self.logger, throttle=self.throttle)
 
     def login(self) -> bool:
         """لاگین ساده به اینستاگرام"""
@@ -39,7 +51,7 @@ class SessionManager:
             self.last_operation = "لاگین به اینستاگرام"
 
             # بررسی وجود سشن قبلی
-            session_path = Path("data/session.json")
+            session_path = self._session_path()
             if session_path.exists():
                 try:
                     self.logger.info("تلاش برای استفاده از سشن ذخیره شده...")
@@ -67,7 +79,7 @@ class SessionManager:
 
             if login_result:
                 # ذخیره سشن برای استفاده آینده
-                session_path.parent.mkdir(exist_ok=True)
+                session_path.parent.mkdir(parents=True, exist_ok=True)
                 with open(session_path, "w") as f:
                     json.dump(self.client.get_settings(), f)
 
@@ -86,18 +98,31 @@ class SessionManager:
             traceback.print_exc()  # چاپ کامل خطا برای دیباگ
             return False
 
+    def _new_client(self):
+        """ساخت کلاینت instagrapi پوشیده با قطع‌کننده‌های مدار و کش پاسخ"""
+        return GuardedClient(Client(), self.breakers, self.cache)
+
+    def _session_path(self):
+        """مسیر فایل سشن این حساب"""
+        session_path = Path(SESSIONS_DIR) / f"{self.account_id}.json"
+        # سازگاری با فایل سشن نسخه تک حسابی
+        legacy_path = Path("data/session.json")
+        if (not session_path.exists() and legacy_path.exists()
+                and self.account_id == DEFAULT_ACCOUNT_ID):
+            return legacy_path
+        return session_path
+
     def record_session_start(self):
         """ثبت شروع سشن در دیتابیس"""
         try:
-            session = BotSession(
-                session_id=self.session_id,
-                started_at=datetime.now(),
-                user_agent="instagrapi-client",
-                is_active=True
-            )
-
-            self.db.add(session)
-            self.db.commit()
+            with session_scope() as db:
+                db.add(BotSession(
+                    session_id=self.session_id,
+                    account_id=self.account_id,
+                    started_at=datetime.now(),
+                    user_agent="instagrapi-client",
+                    is_active=True
+                ))
             self.logger.info(
                 f"Recorded session start with ID: {self.session_id}")
             return True
@@ -110,21 +135,21 @@ class SessionManager:
     def record_session_end(self):
         """ثبت پایان سشن در دیتابیس"""
         try:
-            session = self.db.query(BotSession).filter(
-                BotSession.session_id == self.session_id).first()
-            if session:
+            with session_scope() as db:
+                session = db.query(BotSession).filter(
+                    BotSession.session_id == self.session_id).first()
+                if not session:
+                    return False
                 session.ended_at = datetime.now()
                 session.is_active = False
-                self.db.commit()
-                self.logger.info(
-                    f"Recorded session end with ID: {self.session_id}")
-                return True
-            return False
+            self.logger.info(
+                f"Recorded session end with ID: {self.session_id}")
+            return True
         except Exception as e:
             self.logger.error(f"خطا در ثبت پایان جلسه: {e}")
             return False
 
-    def handle_challenge(self, e):
+    def handle_challenge(self, e, action_type=None):
         """مدیریت چالش‌های اینستاگرام"""
         self.logger.warning(f"⚠️ چالش اینستاگرام تشخیص داده شد: {e}")
 
@@ -133,21 +158,21 @@ class SessionManager:
         self.logged_in = False
 
         # بازنشانی سشن
-        self.client = Client()
+        self.client = self._new_client()
 
-        # افزایش زمان انتظار
-        pause_time = 180  # 3 دقیقه
+        # توقف 3 دقیقه‌ای، طولانی‌تر وقتی سرعت عملیات پایین آمده است
+        pause_time = int(180 * self.throttle.delay_factor(action_type))
         self.logger.info(f"توقف فعالیت به مدت {pause_time} ثانیه...")
-        time.sleep(pause_time)
+        self.pacer.sleep(pause_time, "challenge")
 
         # تلاش برای لاگین مجدد
         self.logger.info("تلاش مجدد برای لاگین پس از چالش...")
         login_result = self.login()
 
         if login_result:
+            # کاهش سرعت پس از چالش توسط throttle انجام می‌شود و با
+            # عملیات موفق بعدی به تدریج برمی‌گردد
             self.logger.info("لاگین مجدد پس از چالش موفقیت‌آمیز بود")
-            # کاهش سرعت عملیات پس از چالش
-            self.client.delay_range = [10, 15]  # افزایش تاخیر
             return True
         else:
             self.logger.error("لاگین مجدد پس از چالش ناموفق بود")
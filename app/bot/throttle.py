@@ -0,0 +1,131 @@
+import threading
+from collections import deque
+from datetime import datetime
+
+from app.config import (
+    THROTTLE_MIN_RATE,
+    THROTTLE_MAX_RATE,
+    THROTTLE_INCREASE_STEP,
+    THROTTLE_INCREASE_EVERY,
+    THROTTLE_DECREASE_FACTOR,
+    THROTTLE_WINDOW,
+    THROTTLE_ERROR_THRESHOLD
+)
+
+# خطاهایی که نشانه محدودیت حساب از سوی اینستاگرام هستند
+BLOCK_ERROR_MARKERS = {
+    "challenge": ("challenge_required", "checkpoint"),
+    "spam": ("spam", "feedback_required", "please wait", "rate limit", "too many")
+}
+
+
+def classify_error(error):
+    """دسته‌بندی خطا: challenge، spam، other یا None برای بدون خطا"""
+    if not error:
+        return None
+    text = str(error).lower()
+    for kind, markers in BLOCK_ERROR_MARKERS.items():
+        if any(marker in text for marker in markers):
+            return kind
+    return "other"
+
+
+class _ActionRate:
+    """ضریب سرعت و نتایج اخیر یک نوع عملیات"""
+
+    def __init__(self):
+        self.rate = 1.0
+        self.outcomes = deque(maxlen=THROTTLE_WINDOW)
+        self.successes_in_row = 0
+        self.last_change = None
+        self.last_error = None
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+
+class AdaptiveThrottle:
+    """کنترل سرعت تطبیقی AIMD برای هر نوع عملیات
+
+    تا وقتی حساب سالم است ضریب سرعت با هر چند عملیات موفق به صورت جمعی
+    بالا می‌رود و با خطای challenge/اسپم (یا نرخ خطای بالا در پنجره اخیر)
+    به صورت ضربی پایین می‌آید. تاخیر عملیات بر ضریب سرعت تقسیم می‌شود.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._actions = {}
+
+    def _get(self, action_type):
+        if action_type not in self._actions:
+            self._actions[action_type] = _ActionRate()
+        return self._actions[action_type]
+
+    def record(self, action_type, success, error=None):
+        """ثبت نتیجه یک عملیات و تنظیم ضریب سرعت"""
+        kind = None if success else classify_error(error) or "other"
+        with self._lock:
+            state = self._get(action_type)
+            state.outcomes.append(bool(success))
+            old_rate = state.rate
+
+            if kind in ("challenge", "spam"):
+                state.rate = max(THROTTLE_MIN_RATE,
+                                 state.rate * THROTTLE_DECREASE_FACTOR)
+                state.successes_in_row = 0
+                state.last_error = kind
+            elif not success:
+                state.successes_in_row = 0
+                # خطاهای عادی فقط وقتی نرخ خطای پنجره بالا باشد سرعت را کم می‌کنند
+                if (len(state.outcomes) >= THROTTLE_INCREASE_EVERY
+                        and state.error_rate() > THROTTLE_ERROR_THRESHOLD):
+                    state.rate = max(THROTTLE_MIN_RATE,
+                                     state.rate * THROTTLE_DECREASE_FACTOR)
+                    # پنجره پاک می‌شود تا همان خطاها دوباره شمرده نشوند
+                    state.outcomes.clear()
+            else:
+                state.successes_in_row += 1
+                if state.successes_in_row >= THROTTLE_INCREASE_EVERY:
+                    state.successes_in_row = 0
+                    state.rate = min(THROTTLE_MAX_RATE,
+                                     state.rate + THROTTLE_INCREASE_STEP)
+
+            changed = state.rate != old_rate
+            if changed:
+                state.last_change = datetime.now()
+
+        if changed and self.logger:
+            direction = "⬆️ افزایش" if state.rate > old_rate else "⬇️ کاهش"
+            self.logger.info(
+                f"{direction} سرعت {action_type}: {old_rate:.2f} → {state.rate:.2f}")
+        return kind
+
+    def rate(self, action_type=None):
+        """ضریب سرعت یک عملیات؛ بدون نوع، کندترین ضریب حساب"""
+        with self._lock:
+            if action_type is None:
+                return min((state.rate for state in self._actions.values()), default=1.0)
+            state = self._actions.get(action_type)
+            return state.rate if state else 1.0
+
+    def delay_factor(self, action_type=None):
+        """ضریب تاخیر (معکوس ضریب سرعت)"""
+        return 1.0 / self.rate(action_type)
+
+    def status(self):
+        """وضعیت سرعت همه انواع عملیات برای API"""
+        with self._lock:
+            return {
+                action_type: {
+                    "rate": round(state.rate, 2),
+                    "delay_factor": round(1.0 / state.rate, 2),
+                    "error_rate": round(state.error_rate(), 2),
+                    "window": len(state.outcomes),
+                    "last_block_error": state.last_error,
+                    "last_change": state.last_change.isoformat() if state.last_change else None
+                }
+                for action_type, state in self._actions.items()
+            }
@@ -1,4 +1,3 @@
-import time
 import random
 import uuid
 import json
@@ -8,21 +7,27 @@ import os
 import sys
 from pathlib import Path
 from app.config import (
-    MIN_ACTION_DELAY,
-    MAX_ACTION_DELAY,
-    MIN_BREAK_TIME,
-    MAX_BREAK_TIME,
     LONG_BREAK_PROBABILITY,
     MIN_ACTIONS_BEFORE_BREAK,
     MAX_ACTIONS_BEFORE_BREAK
 )
 
 
+_logger_configured = False
+
+
 def setup_logger():
-    """تنظیم لاگر"""
+    """تنظیم لاگر (فقط یک بار برای همه حساب‌ها)"""
+    global _logger_configured
+    if _logger_configured:
+        return logger
+
     # حذف همه هندلرهای فعلی
     logger.remove()
 
+    # شناسه حساب پیش‌فرض برای لاگ‌هایی که به حساب خاصی تعلق ندارند
+    logger.configure(extra={"account_id": "-"})
+
     # مطمئن شوید پوشه data وجود دارد
     Path("data").mkdir(exist_ok=True)
 
@@ -31,7 +36,7 @@ def setup_logger():
         "data/bot.log",
         rotation="500 MB",  # افزایش سایز فایل لاگ
         retention="7 days",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {extra[account_id]} | {message}",
         level="DEBUG",
         backtrace=True,  # نمایش traceback کامل
         diagnose=True,   # اطلاعات تشخیصی بیشتر
@@ -41,7 +46,7 @@ def setup_logger():
     logger.add(
         sys.stdout,
         colorize=True,
-        format="{time:HH:mm:ss} | <level>{level}</level> | {message}",
+        format="{time:HH:mm:ss} | <level>{level}</level> | {extra[account_id]} | {message}",
         level="INFO",
         backtrace=True,
         diagnose=True,
@@ -49,6 +54,7 @@ def setup_logger():
 
     # آزمایش لاگر
     logger.info("Logger initialized successfully")
+    _logger_configured = True
 
     return logger
 
@@ -58,27 +64,11 @@ def generate_session_id():
     return str(uuid.uuid4())
 
 
-def random_delay():
-    """ایجاد تاخیر تصادفی بین عملیات‌ها"""
-    delay = random.uniform(MIN_ACTION_DELAY, MAX_ACTION_DELAY)
-    time.sleep(delay)
-    return delay
-
-
 def should_take_break():
     """تصمیم‌گیری برای استراحت طولانی تصادفی"""
     return random.random() < LONG_BREAK_PROBABILITY
 
 
-def take_random_break(logger=None):
-    """اعمال استراحت تصادفی طولانی"""
-    break_time = random.randint(MIN_BREAK_TIME * 60, MAX_BREAK_TIME * 60)
-    if logger:
-        logger.info(f"در حال استراحت به مدت {break_time // 60} دقیقه...")
-    time.sleep(break_time)
-    return break_time
-
-
 def get_actions_before_break():
     """تعیین تعداد عملیات قبل از استراحت اجباری"""
     return random.randint(MIN_ACTIONS_BEFORE_BREAK, MAX_ACTIONS_BEFORE_BREAK)
@@ -9,9 +9,69 @@ load_dotenv()
 INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME")
 INSTAGRAM_PASSWORD = os.getenv("INSTAGRAM_PASSWORD")
 
+
+def _parse_accounts(raw):
+    """خواندن لیست حساب‌ها با قالب user1:pass1,user2:pass2"""
+    accounts = []
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item or ":" not in item:
+            continue
+        username, password = item.split(":", 1)
+        accounts.append({"username": username.strip(), "password": password})
+    return accounts
+
+
+# حساب‌های اینستاگرام برای اجرای چند حسابی در یک پروسه
+# در صورت خالی بودن INSTAGRAM_ACCOUNTS از حساب تکی بالا استفاده می‌شود
+INSTAGRAM_ACCOUNTS = _parse_accounts(os.getenv("INSTAGRAM_ACCOUNTS"))
+if not INSTAGRAM_ACCOUNTS and INSTAGRAM_USERNAME:
+    INSTAGRAM_ACCOUNTS = [
+        {"username": INSTAGRAM_USERNAME, "password": INSTAGRAM_PASSWORD}]
+
+# شناسه حساب پیش‌فرض (برای رکوردهای قدیمی و API های تک حسابی)
+DEFAULT_ACCOUNT_ID = (INSTAGRAM_ACCOUNTS[0]["username"]
+                      if INSTAGRAM_ACCOUNTS else "default")
+
+# مسیر ذخیره سشن هر حساب
+SESSIONS_DIR = "data/sessions"
+
 # تنظیمات دیتابیس
 DATABASE_URL = os.getenv(
     "DATABASE_URL", "postgresql://postgres:postgres@db:5432/instagram_bot")
+# نوع دیتابیس از روی DATABASE_URL: postgresql یا sqlite (مثلاً sqlite:///data/bot.db)
+# SQLite برای اجرای تک‌نودی، CI و بنچمارک بدون کانتینر دیتابیس مناسب است
+DB_BACKEND = "sqlite" if DATABASE_URL.startswith("sqlite") else "postgresql"
+# تنظیمات SQLite در حالت WAL (هر اتصال)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "15000"))  # میلی‌ثانیه
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# استخر اتصال‌های دیتابیس (هر پروسه)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# استخر اتصال‌های موتور غیرهمزمان (asyncpg) برای endpoint های API
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+
+# بافر نوشتن تعاملات: ارسال گروهی به دیتابیس بر اساس تعداد یا زمان
+INTERACTION_FLUSH_SIZE = int(os.getenv("INTERACTION_FLUSH_SIZE", "50"))
+INTERACTION_FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", "5"))
+INTERACTION_BUFFER_MAX = int(os.getenv("INTERACTION_BUFFER_MAX", "10000"))
+# ژورنال محلی تعاملات در زمان در دسترس نبودن دیتابیس (بازپخش پس از اتصال مجدد)
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+JOURNAL_SEGMENT_BYTES = int(
+    os.getenv("JOURNAL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+
+# پارتیشن‌بندی ماهانه جدول interactions و سیاست نگهداری
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# پارتیشن‌های قدیمی‌تر از این تعداد ماه بایگانی و حذف می‌شوند (0 = نگهداری دائمی)
+INTERACTIONS_RETENTION_MONTHS = int(
+    os.getenv("INTERACTIONS_RETENTION_MONTHS", "12"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+PARTITION_MAINTENANCE_INTERVAL = int(
+    os.getenv("PARTITION_MAINTENANCE_INTERVAL", str(6 * 3600)))
 
 # تنظیمات رفتار انسانی ساده
 # تاخیر بین عملیات‌ها (ثانیه)
@@ -36,6 +96,55 @@ DAILY_FOLLOW_LIMIT = 50
 DAILY_UNFOLLOW_LIMIT = 40
 DAILY_DM_LIMIT = 15
 
+# حداکثر سهم بودجه روزانه که می‌تواند پشت سر هم مصرف شود (0 تا 1)
+RATE_LIMIT_BURST_FRACTION = 0.1
+
+# فیلتر بلوم عملیات انجام شده (جلوگیری از لایک، فالو و ... تکراری)
+# حافظه تقریبی: ظرفیت × 1.2 بایت برای نرخ خطای 1٪
+SEEN_SET_CAPACITY = int(os.getenv("SEEN_SET_CAPACITY", "500000"))
+SEEN_SET_ERROR_RATE = float(os.getenv("SEEN_SET_ERROR_RATE", "0.01"))
+
+# بازه اعتبار کلید یکتایی پیش‌فرض صف عملیات (ثانیه)؛ پس از آن همان عملیات
+# روی همان هدف (مثلاً آنفالو ناموفق) دوباره قابل صف‌بندی است
+ACTION_IDEMPOTENCY_WINDOW = int(os.getenv("ACTION_IDEMPOTENCY_WINDOW", "86400"))
+
+# کنترل تطبیقی سرعت (AIMD) بر اساس خطاهای challenge و اسپم
+# ضریب سرعت هر نوع عملیات نسبت به سرعت عادی (1 یعنی تاخیر عادی)
+THROTTLE_MIN_RATE = 0.1
+THROTTLE_MAX_RATE = 1.5
+THROTTLE_INCREASE_STEP = 0.1      # افزایش جمعی پس از هر چند عملیات موفق
+THROTTLE_INCREASE_EVERY = 5       # تعداد عملیات موفق پیاپی برای هر افزایش
+THROTTLE_DECREASE_FACTOR = 0.5    # کاهش ضربی پس از خطا
+THROTTLE_WINDOW = 20              # تعداد نتایج اخیر برای محاسبه نرخ خطا
+THROTTLE_ERROR_THRESHOLD = 0.3    # نرخ خطای عادی که باعث کاهش سرعت می‌شود
+
+# قطع‌کننده مدار برای هر خانواده endpoint اینستاگرام
+BREAKER_FAILURE_THRESHOLD = 5     # تعداد خطای پیاپی برای باز شدن مدار
+BREAKER_COOLDOWN_SECONDS = 600    # مدت باز ماندن مدار پیش از تلاش آزمایشی
+BREAKER_MAX_COOLDOWN_SECONDS = 6 * 3600
+
+# کش پاسخ متدهای خواندنی instagrapi: مدت اعتبار هر متد (ثانیه، 0 = بدون کش)
+RESPONSE_CACHE_TTLS = {
+    "user_info": 6 * 3600,
+    "user_info_by_username": 6 * 3600,
+    "user_friendship": 3600,
+    "user_following": 3600,
+    "user_stories": 600,
+    "hashtag_medias_recent": 300
+}
+# سقف حجم تخمینی پاسخ‌های کش شده هر حساب (بایت)
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# تشخیص فالوبک با مجموعه فالوورهای حساب (به جای بررسی تک‌تک کاربران)
+FOLLOWER_SET_TTL = int(os.getenv("FOLLOWER_SET_TTL", "1800"))  # ثانیه
+FOLLOWER_PAGE_SIZE = 200
+FOLLOWER_SET_MAX = int(os.getenv("FOLLOWER_SET_MAX", "20000"))
+# تعداد کاربران فالو شده که در هر اجرا با یک کوئری بررسی می‌شوند
+FOLLOW_BACK_BATCH_SIZE = 500
+# حداکثر بررسی تک‌تک (user_friendship) برای موارد نامشخص در هر اجرا
+FOLLOW_BACK_MAX_PROBES = 5
+
 # مسیر فایل‌های دیتا
 COMMENTS_FILE = "data/comments.json"
 HASHTAGS_FILE = "data/hashtags.json"
@@ -49,3 +158,18 @@ ACTIVITY_WEIGHTS = {
     "view_story": 70,     # دیدن استوری
     "dm": 30              # ارسال پیام مستقیم (کاهش یافته)
 }
+
+# حداکثر فراخوانی‌های مسدودکننده فعال هم‌زمان (instagrapi و دیتابیس)
+EXECUTOR_MAX_WORKERS = int(os.getenv("EXECUTOR_MAX_WORKERS", "4"))
+# نخ‌های استخر؛ فراخوانی‌های در حال انتظار (تاخیر، استراحت) ظرفیت بالا را
+# آزاد می‌کنند ولی نخ خود را نگه می‌دارند
+EXECUTOR_MAX_THREADS = int(os.getenv("EXECUTOR_MAX_THREADS", "32"))
+
+# حالت اجرای بات: embedded (اجرای بات داخل API) یا control (فقط کنترل workerها)
+BOT_RUN_MODE = os.getenv("BOT_RUN_MODE", "embedded")
+
+# تنظیمات worker های جداگانه (python -m app.worker)
+# باید کمتر از EXECUTOR_MAX_WORKERS باشد
+WORKER_MAX_ACCOUNTS = int(os.getenv("WORKER_MAX_ACCOUNTS", "3"))
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "90"))
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "30"))
@@ -0,0 +1,99 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from loguru import logger
+
+from app.config import (
+    DATABASE_URL,
+    ASYNC_DB_POOL_SIZE,
+    ASYNC_DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT
+)
+from app.database.connection import is_memory_database
+from app.database.dialect import IS_SQLITE, SQLITE_BUSY_TIMEOUT, set_sqlite_pragmas
+
+
+def async_database_url(url=DATABASE_URL):
+    """آدرس دیتابیس با درایور asyncpg یا aiosqlite (مدل‌ها بین دو موتور مشترک هستند)"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url.set(drivername="postgresql+asyncpg")
+
+
+def async_engine_options(url=DATABASE_URL):
+    """تنظیمات create_async_engine برای asyncpg یا aiosqlite"""
+    if IS_SQLITE and is_memory_database(url):
+        # دیتابیس حافظه‌ای فقط داخل یک اتصال وجود دارد
+        return {"poolclass": StaticPool,
+                "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT / 1000}}
+
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        "pool_size": ASYNC_DB_POOL_SIZE,
+        "max_overflow": ASYNC_DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        # asyncpg: زمان انتظار اتصال؛ aiosqlite: زمان انتظار قفل نوشتن
+        "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT / 1000 if IS_SQLITE else 15}
+    }
+    if IS_SQLITE:
+        # استخر پیش‌فرض aiosqlite بدون نگهداری اتصال (NullPool) است
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+_async_engine = None
+
+
+def get_async_engine():
+    """موتور غیرهمزمان برای endpoint های خواندنی API؛ در اولین درخواست ساخته می‌شود
+
+    هر درخواست در حال انتظار برای دیتابیس فقط یک coroutine است و نخی از
+    threadpool را اشغال نمی‌کند.
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            async_database_url(), **async_engine_options())
+        if IS_SQLITE:
+            event.listen(_async_engine.sync_engine, "connect", set_sqlite_pragmas)
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+async def dispose_async_engine():
+    """بستن اتصال‌های موتور غیرهمزمان (در صورت ساخته شدن)"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+class LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker ای که پیش از ساخت اولین نشست موتور را می‌سازد"""
+
+    def __call__(self, **local_kw):
+        get_async_engine()
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazyAsyncSessionmaker(
+    class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    """ایجاد یک نشست غیرهمزمان دیتابیس برای هر درخواست"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"خطا در استفاده از دیتابیس: {e}")
+            await db.rollback()
+            raise
+
+
+def __getattr__(name):
+    # سازگاری با «from app.database.async_connection import async_engine»
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,43 +1,96 @@
-from sqlalchemy import create_engine, text
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.config import DATABASE_URL
+from sqlalchemy.pool import StaticPool
+from app.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
+from app.database.dialect import IS_SQLITE, SQLITE_BUSY_TIMEOUT, set_sqlite_pragmas
 import logging
 from loguru import logger
-import time
 
 # تنظیم لاگر
 logging.basicConfig(level=logging.INFO)
 
-# تلاش برای ایجاد موتور دیتابیس با تلاش‌های مجدد
-max_retries = 5
-retry_interval = 3
 
-for attempt in range(max_retries):
-    try:
-        engine = create_engine(
-            DATABASE_URL,
-            pool_pre_ping=True,  # بررسی اتصال قبل از استفاده
-            pool_recycle=3600,   # بازیافت اتصال‌ها هر یک ساعت
-            # زمان انتظار بیشتر برای اتصال
-            connect_args={"connect_timeout": 15}
-        )
-        # تست اتصال
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        logger.info(f"اتصال به دیتابیس برقرار شد: {DATABASE_URL}")
-        break
-    except Exception as e:
-        logger.error(
-            f"خطا در اتصال به دیتابیس (تلاش {attempt+1}/{max_retries}): {e}")
-        if attempt < max_retries - 1:  # اگر هنوز تلاش‌های بیشتری باقی مانده
-            time.sleep(retry_interval)  # صبر قبل از تلاش مجدد
-        else:
-            logger.critical("نمی‌توان به دیتابیس متصل شد پس از چندین تلاش!")
-            raise  # اجازه می‌دهیم خطا ادامه یابد تا برنامه متوقف شود یا مسیر دیگری را دنبال کند
-
-# ایجاد کلاس جلسه دیتابیس
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def is_memory_database(url=DATABASE_URL):
+    """آیا آدرس یک دیتابیس SQLite حافظه‌ای است"""
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def pool_options():
+    """تنظیمات استخر اتصال (QueuePool) برای PostgreSQL و فایل SQLite"""
+    return {
+        "pool_pre_ping": True,  # بررسی اتصال قبل از استفاده
+        "pool_recycle": 3600,   # بازیافت اتصال‌ها هر یک ساعت
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT
+    }
+
+
+def engine_options(url=DATABASE_URL):
+    """تنظیمات create_engine برای PostgreSQL یا SQLite"""
+    if not IS_SQLITE:
+        # زمان انتظار بیشتر برای اتصال
+        return dict(pool_options(), connect_args={"connect_timeout": 15})
+
+    # اتصال‌ها بین نخ‌ها جابجا می‌شوند؛ timeout انتظار برای قفل نوشتن است
+    connect_args = {"check_same_thread": False,
+                    "timeout": SQLITE_BUSY_TIMEOUT / 1000}
+    if is_memory_database(url):
+        # دیتابیس حافظه‌ای فقط داخل یک اتصال وجود دارد؛ همه نخ‌ها از همان استفاده می‌کنند
+        return {"poolclass": StaticPool, "connect_args": connect_args}
+
+    database = make_url(url).database
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    return dict(pool_options(), connect_args=connect_args)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """موتور دیتابیس این پروسه؛ در اولین استفاده ساخته می‌شود
+
+    ساخت موتور اتصالی باز نمی‌کند و import این ماژول بدون دیتابیس هم سریع
+    است؛ سالم بودن اتصال‌ها هنگام استفاده با pool_pre_ping بررسی می‌شود.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, **engine_options())
+                if IS_SQLITE:
+                    event.listen(engine, "connect", set_sqlite_pragmas)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def __getattr__(name):
+    # سازگاری با «from app.database.connection import engine»
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker ای که پیش از ساخت اولین نشست موتور را می‌سازد"""
+
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+
+# ایجاد کلاس جلسه دیتابیس (اتصال به موتور در get_engine)
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
@@ -52,3 +105,34 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+@contextmanager
+def session_scope():
+    """نشست کوتاه برای یک واحد کار
+
+    در پایان بلوک commit و در صورت خطا rollback می‌شود و نشست همیشه بسته
+    می‌شود؛ بنابراین اتصال به استخر برمی‌گردد، نقشه هویت (identity map) با
+    هر واحد کار خالی می‌شود و یک تراکنش خراب به واحد کار بعدی منتقل نمی‌شود.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def with_session(func):
+    """دکوراتور اجرای تابع در یک session_scope؛ نشست با آرگومان db داده می‌شود"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if kwargs.get("db") is not None:
+            return func(*args, **kwargs)
+        with session_scope() as db:
+            kwargs["db"] = db
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,71 @@
+from sqlalchemy import DateTime, case, func, literal_column, type_coerce
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.config import (
+    DB_BACKEND,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE
+)
+
+IS_SQLITE = DB_BACKEND == "sqlite"
+
+# تنظیمات هر اتصال SQLite: WAL برای خواندن هم‌زمان با نوشتن و synchronous=NORMAL
+# که در حالت WAL فقط هنگام checkpoint همگام‌سازی می‌کند
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "cache_size": -SQLITE_CACHE_SIZE_KB,
+    "temp_store": "MEMORY",
+    "mmap_size": SQLITE_MMAP_SIZE
+}
+
+# قالب strftime معادل date_trunc برای SQLite؛ هم‌شکل با متن ذخیره شده DateTime
+# در SQLAlchemy تا مقایسه و کلیدهای یکتا (مثل bucket) با مقادیر درج شده یکسان باشند
+SQLITE_TRUNC_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+    "month": "%Y-%m-01 00:00:00.000000"
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """رویداد connect موتورهای SQLite"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def upsert(table):
+    """INSERT با پشتیبانی on_conflict_do_update/do_nothing برای دیتابیس فعلی
+
+    در هر دو دیتابیس تداخل با index_elements (ستون‌های کلید یکتا) مشخص می‌شود.
+    """
+    return (sqlite_insert if IS_SQLITE else pg_insert)(table)
+
+
+def greatest(first, second):
+    """بزرگ‌ترین مقدار غیر NULL (معادل GREATEST در PostgreSQL)"""
+    return case(
+        (first == None, second),
+        (second == None, first),
+        (first >= second, first),
+        else_=second)
+
+
+def date_trunc(unit, column):
+    """ابتدای ساعت، روز، هفته (دوشنبه) یا ماه یک ستون زمانی"""
+    if not IS_SQLITE:
+        # مقدار ثابت (نه پارامتر) تا GROUP BY با عبارت SELECT یکسان باشد
+        return func.date_trunc(literal_column(f"'{unit}'"), column)
+    if unit == "week":
+        arguments = [SQLITE_TRUNC_FORMATS["day"], column, "weekday 0", "-6 days"]
+    else:
+        arguments = [SQLITE_TRUNC_FORMATS[unit], column]
+    return type_coerce(func.strftime(*[
+        literal_column(f"'{argument}'") if isinstance(argument, str) else argument
+        for argument in arguments]), DateTime)
@@ -1,12 +1,16 @@
 # app/database/init_db.py
 
 import os
+import threading
 import time
 import psycopg2
 from loguru import logger
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import inspect, text
 from app.database.models import Base
+from app.database.dialect import IS_SQLITE
+from app.database import connection
+from app.database.migrations import LATEST_VERSION, run_migrations
+from app.database.partitions import maintain_partitions
 
 
 def wait_for_db(max_retries=30, retry_interval=5):
@@ -87,7 +91,9 @@ def check_tables(engine):
     try:
         inspector = inspect(engine)
         existing_tables = inspector.get_table_names()
-        required_tables = ["bot_sessions", "interactions", "daily_stats"]
+        required_tables = ["bot_sessions", "interactions",
+                           "daily_stats", "interaction_rollups", "relationships",
+                           "account_leases", "action_queue"]
 
         missing_tables = [
             table for table in required_tables if table not in existing_tables]
@@ -117,8 +123,24 @@ def create_tables(engine):
         return False
 
 
+def initialize_sqlite_database():
+    """آماده‌سازی دیتابیس SQLite (بدون سرور، ساخت دیتابیس و پارتیشن)"""
+    try:
+        if not check_tables(connection.get_engine()) and not create_tables(connection.get_engine()):
+            return False
+        run_migrations(connection.get_engine())
+        logger.info("✅ دیتابیس SQLite با موفقیت آماده شد.")
+        return True
+    except Exception as e:
+        logger.error(f"❌ خطا در آماده‌سازی دیتابیس SQLite: {e}")
+        return False
+
+
 def initialize_database():
     """آماده‌سازی کامل دیتابیس"""
+    if IS_SQLITE:
+        return initialize_sqlite_database()
+
     # بررسی آماده بودن سرور دیتابیس
     if not wait_for_db():
         logger.error(
@@ -130,11 +152,9 @@ def initialize_database():
         logger.error("خطا در ایجاد دیتابیس. نمی‌توان ادامه داد.")
         return False
 
-    # اتصال به دیتابیس
-    db_url = os.getenv(
-        "DATABASE_URL", "postgresql://postgres:postgres@db:5432/instagram_bot")
+    # اتصال به دیتابیس (موتور مشترک پروسه؛ دیتابیس اکنون وجود دارد)
     try:
-        engine = create_engine(db_url)
+        engine = connection.get_engine()
 
         # بررسی وجود جداول
         if not check_tables(engine):
@@ -143,6 +163,21 @@ def initialize_database():
                 logger.error("خطا در ایجاد جداول. نمی‌توان ادامه داد.")
                 return False
 
+        # اعمال مهاجرت‌های ساختار روی جداول موجود
+        try:
+            run_migrations(engine)
+        except Exception as e:
+            logger.error(f"❌ خطا در اعمال مهاجرت‌ها: {e}")
+            import traceback
+            logger.error(f"جزئیات خطا: {traceback.format_exc()}")
+            return False
+
+        # پارتیشن‌های ماه‌های آینده و بایگانی پارتیشن‌های قدیمی
+        try:
+            maintain_partitions(engine)
+        except Exception as e:
+            logger.error(f"❌ خطا در نگهداری پارتیشن‌های تعاملات: {e}")
+
         logger.info("✅ دیتابیس با موفقیت آماده شد.")
         return True
     except Exception as e:
@@ -150,3 +185,43 @@ def initialize_database():
         import traceback
         logger.error(f"جزئیات خطا: {traceback.format_exc()}")
         return False
+
+
+def schema_ready(engine):
+    """بررسی سریع به‌روز بودن ساختار دیتابیس با یک کوئری روی schema_version"""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text(
+                "SELECT MAX(version) FROM schema_version")).scalar()
+    except Exception as e:
+        # دیتابیس، جدول نسخه یا سرور هنوز آماده نیست
+        logger.info(f"ساختار دیتابیس نیاز به آماده‌سازی دارد: {str(e)[:100]}")
+        return False
+    return version == LATEST_VERSION
+
+
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+
+def bootstrap_database():
+    """آماده‌سازی یکباره دیتابیس در هر پروسه (API، worker یا اسکریپت)
+
+    اگر نسخه ساختار برابر آخرین مهاجرت باشد آماده‌سازی کامل (انتظار برای
+    سرور، ساخت دیتابیس، بررسی جداول و مهاجرت‌ها) رد می‌شود. نگهداری
+    پارتیشن‌ها در این حالت به حلقه دوره‌ای API و worker سپرده می‌شود.
+    """
+    global _bootstrapped
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return True
+        if schema_ready(connection.get_engine()):
+            logger.info(f"✅ ساختار دیتابیس به‌روز است (نسخه {LATEST_VERSION})")
+            _bootstrapped = True
+        else:
+            _bootstrapped = initialize_database()
+        return _bootstrapped
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bootstrap_database() else 1)
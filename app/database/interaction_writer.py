@@ -0,0 +1,333 @@
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.config import (
+    INTERACTION_FLUSH_SIZE,
+    INTERACTION_FLUSH_INTERVAL,
+    INTERACTION_BUFFER_MAX
+)
+from app.database.connection import SessionLocal, get_engine
+from app.database.dialect import upsert
+from app.database.journal import InteractionJournal
+from app.database.partitions import ensure_partitions
+from app.database.relationships import apply_relationship_history
+from app.database.rollups import upsert_rollups
+from app.database.models import Interaction, DailyStats
+
+# ستون شمارنده آمار روزانه هر نوع تعامل
+STATS_COLUMNS = {
+    "like": "likes_count",
+    "comment": "comments_count",
+    "follow": "follows_count",
+    "unfollow": "unfollows_count",
+    "view_story": "story_views_count",
+    "dm": "dms_count"
+}
+
+COUNTER_COLUMNS = list(STATS_COLUMNS.values()) + \
+    ["total_interactions", "failed_count"]
+
+
+def upsert_daily_stats(account_id, day, counters):
+    """دستور افزایش شمارنده‌های یک روز؛ success_rate در همان دستور محاسبه می‌شود"""
+    successes = counters.get("total_interactions", 0)
+    failures = counters.get("failed_count", 0)
+    stmt = upsert(DailyStats).values(
+        account_id=account_id,
+        date=day,
+        success_rate=(successes * 100.0 / (successes + failures)
+                      if successes + failures else 100.0),
+        **{column: counters.get(column, 0) for column in COUNTER_COLUMNS}
+    )
+
+    def current(column):
+        return func.coalesce(getattr(DailyStats, column), 0)
+
+    new_successes = current("total_interactions") + \
+        stmt.excluded.total_interactions
+    new_attempts = new_successes + current("failed_count") + \
+        stmt.excluded.failed_count
+    set_ = {column: current(column) + getattr(stmt.excluded, column)
+            for column in COUNTER_COLUMNS}
+    set_["success_rate"] = func.coalesce(
+        new_successes * 100.0 / func.nullif(new_attempts, 0), 100.0)
+
+    return stmt.on_conflict_do_update(
+        index_elements=["account_id", "date"], set_=set_)
+
+
+# ستون‌های هر رکورد بافر (همه ردیف‌های یک INSERT گروهی باید کلیدهای یکسان داشته باشند)
+ROW_FIELDS = ["session_id", "account_id", "interaction_type", "target_user_id",
+              "target_user_username", "target_media_id", "target_media_shortcode",
+              "content", "created_at", "success", "error", "event_id"]
+
+# حداکثر ردیف هر INSERT چند ردیفی
+WRITE_BATCH_SIZE = 1000
+
+
+def is_transient_error(error):
+    """خطای گذرا (اتصال یا در دسترس نبودن دیتابیس) در برابر خطای داده رکوردها"""
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    # پارتیشن لازم در _write ساخته می‌شود و تلاش بعدی موفق است
+    return "no partition of relation" in str(error)
+
+
+class InteractionWriter:
+    """بافر نوشتن تعاملات و شمارنده‌های آمار روزانه
+
+    رکوردهای Interaction در حافظه جمع می‌شوند و یک نخ پس‌زمینه آن‌ها را با
+    یک INSERT چند ردیفی همراه با افزایش شمارنده‌های daily_stats در یک تراکنش
+    می‌نویسد (با رسیدن به flush_size یا هر flush_interval ثانیه). بنابراین
+    مسیر اجرای عملیات منتظر دیتابیس نمی‌ماند.
+
+    اگر دیتابیس در دسترس نباشد رکوردها به ژورنال محلی (InteractionJournal)
+    نوشته و پس از اتصال مجدد به صورت گروهی بازپخش می‌شوند. هر رکورد یک
+    event_id یکتا دارد و INSERT با ON CONFLICT DO NOTHING انجام می‌شود، پس
+    بازپخش تکراری رکورد یا شمارنده‌ای را دو بار ثبت نمی‌کند. فقط اگر نوشتن
+    ژورنال هم شکست بخورد بافر تا max_buffer رکورد نگه داشته می‌شود.
+    """
+
+    def __init__(self, flush_size=INTERACTION_FLUSH_SIZE,
+                 flush_interval=INTERACTION_FLUSH_INTERVAL,
+                 max_buffer=INTERACTION_BUFFER_MAX,
+                 journal=None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.journal = journal or InteractionJournal()
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        # فقط یک flush هم‌زمان
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+        self.journaled = 0
+        self.replayed = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+    def start(self):
+        """شروع نخ پس‌زمینه (در صورت اجرا نبودن)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="interaction-writer", daemon=True)
+            self._thread.start()
+
+    def add(self, **row):
+        """افزودن یک تعامل به بافر"""
+        row = {field: row.get(field) for field in ROW_FIELDS}
+        row["created_at"] = row["created_at"] or datetime.now()
+        row["event_id"] = row["event_id"] or uuid.uuid4().hex
+        with self._lock:
+            self._buffer.append(row)
+            size = len(self._buffer)
+
+        if size >= self.max_buffer:
+            # فشار معکوس: نوشتن در همین نخ و در صورت شکست محدود کردن بافر
+            if not self.flush():
+                self._trim()
+        elif size >= self.flush_size:
+            self._wakeup.set()
+
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+
+    def _trim(self):
+        with self._lock:
+            overflow = len(self._buffer) - self.max_buffer
+            for _ in range(max(0, overflow)):
+                self._buffer.popleft()
+                self.dropped += 1
+        if overflow > 0:
+            logger.error(f"بافر تعاملات پر است؛ {overflow} رکورد کنار گذاشته شد")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """بازپخش ژورنال و نوشتن همه رکوردهای بافر
+
+        در صورت خطای دیتابیس رکوردها در ژورنال محلی نوشته می‌شوند و فقط اگر
+        آن هم ممکن نباشد به بافر برمی‌گردند.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+
+            # رکوردهای ژورنال پیش از رکوردهای جدید نوشته می‌شوند
+            if self._replay_journal() and rows:
+                try:
+                    self.flushed += self._write(rows)
+                    self.last_flush_at = datetime.now()
+                    return True
+                except Exception as e:
+                    logger.error(f"خطا در نوشتن گروهی {len(rows)} تعامل: {e}")
+            elif not rows:
+                return True
+
+            try:
+                self.journal.append(rows)
+                self.journaled += len(rows)
+                logger.warning(f"{len(rows)} تعامل در ژورنال محلی ثبت شد")
+                return True
+            except Exception as e:
+                logger.error(f"خطا در نوشتن ژورنال تعاملات: {e}")
+                with self._lock:
+                    self._buffer.extendleft(reversed(rows))
+                return False
+
+    def _write(self, rows, replay=False):
+        """نوشتن رکوردها و شمارنده‌های آن‌ها در یک تراکنش؛ خروجی تعداد ردیف جدید"""
+        db = SessionLocal()
+        try:
+            written = 0
+            for start in range(0, len(rows), WRITE_BATCH_SIZE):
+                batch = rows[start:start + WRITE_BATCH_SIZE]
+                stmt = upsert(Interaction).values(batch).on_conflict_do_nothing(
+                    index_elements=["event_id", "created_at"]
+                ).returning(Interaction.event_id)
+                inserted = set(db.execute(stmt).scalars())
+                # شمارنده‌ها فقط برای رکوردهایی که قبلاً ثبت نشده‌اند
+                batch = [row for row in batch if row["event_id"] in inserted]
+                self._apply_stats(db, batch)
+                if replay:
+                    # فالو و آنفالوهایی که هنگام قطعی در relationships ثبت نشده‌اند
+                    apply_relationship_history(db, batch)
+                written += len(batch)
+            db.commit()
+            self.last_error = None
+            return written
+        except Exception as e:
+            db.rollback()
+            self.last_error = str(e)
+            if "no partition of relation" in str(e):
+                # ساعت سیستم خارج از بازه پارتیشن‌های ساخته شده است
+                self._ensure_partitions(rows)
+            raise
+        finally:
+            db.close()
+
+    def _replay_journal(self):
+        """بازپخش segment های ژورنال؛ خروجی False یعنی دیتابیس هنوز در دسترس نیست"""
+        try:
+            segments = self.journal.segments()
+        except Exception as e:
+            logger.error(f"خطا در خواندن ژورنال تعاملات: {e}")
+            return True
+
+        if not segments:
+            return True
+        try:
+            # بررسی اتصال پیش از خواندن segment ها
+            with get_engine().connect():
+                pass
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+        for path in segments:
+            try:
+                rows = self.journal.read(path)
+                written = self._write(rows, replay=True)
+            except Exception as e:
+                if is_transient_error(e):
+                    logger.error(f"خطا در بازپخش ژورنال {path.name}: {e}")
+                    return False
+                # خطای داده با تلاش مجدد برطرف نمی‌شود؛ segment کنار گذاشته
+                # می‌شود تا بقیه ژورنال و رکوردهای جدید نوشته شوند
+                try:
+                    bad = self.journal.quarantine(path)
+                    logger.error(
+                        f"❌ ژورنال {path.name} به دلیل خطای داده به {bad.name} منتقل شد: {e}")
+                except Exception as move_error:
+                    logger.error(
+                        f"خطا در کنار گذاشتن ژورنال {path.name}: {move_error}")
+                    return False
+                continue
+            self.journal.remove(path)
+            self.replayed += written
+            self.last_flush_at = datetime.now()
+            logger.info(
+                f"✅ ژورنال {path.name} بازپخش شد: {written}/{len(rows)} تعامل جدید")
+        return True
+
+    def _ensure_partitions(self, rows):
+        try:
+            with get_engine().begin() as conn:
+                ensure_partitions(
+                    conn, dates=[row["created_at"] for row in rows])
+        except Exception as e:
+            logger.error(f"خطا در ساخت پارتیشن تعاملات: {e}")
+
+    def _apply_stats(self, db, rows):
+        """افزایش اتمی شمارنده‌های آمار روزانه با INSERT ... ON CONFLICT DO UPDATE
+
+        کلید هر ردیف حساب و تاریخ خود عملیات است، پس عملیات بعد از نیمه شب
+        در ردیف روز جدید ثبت می‌شوند و چند نویسنده هم‌زمان تداخلی ندارند.
+        شمارنده‌های ساعتی interaction_rollups در همان تراکنش افزایش می‌یابند.
+        """
+        upsert_rollups(db, rows)
+
+        increments = {}
+        for row in rows:
+            column = STATS_COLUMNS.get(row.get("interaction_type"))
+            if not column:
+                continue
+            day = row["created_at"].replace(
+                hour=0, minute=0, second=0, microsecond=0)
+            counters = increments.setdefault(
+                (row.get("account_id"), day),
+                dict.fromkeys(COUNTER_COLUMNS, 0))
+            if row.get("success"):
+                counters[column] += 1
+                counters["total_interactions"] += 1
+            else:
+                counters["failed_count"] += 1
+
+        for (account_id, day), counters in increments.items():
+            db.execute(upsert_daily_stats(account_id, day, counters))
+
+    def close(self):
+        """توقف نخ پس‌زمینه و نوشتن رکوردهای باقی‌مانده"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=30)
+        return self.flush()
+
+    def status(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return {
+            "pending": pending,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "journaled": self.journaled,
+            "replayed": self.replayed,
+            "journal": self.journal.status(),
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+            "last_error": self.last_error
+        }
+
+
+# نویسنده مشترک همه حساب‌های این پروسه
+interaction_writer = InteractionWriter()
@@ -0,0 +1,128 @@
+import fcntl
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from app.config import JOURNAL_DIR, JOURNAL_SEGMENT_BYTES
+
+
+class InteractionJournal:
+    """ژورنال محلی فقط-افزودنی تعاملات برای زمان در دسترس نبودن دیتابیس
+
+    هر دسته از رکوردها به صورت JSON سطری به انتهای فایل segment فعال اضافه و
+    با یک fsync پایدار می‌شود. segment ها با رسیدن به segment_bytes بسته و
+    segment جدید باز می‌شود. segment فعال هر پروسه با flock قفل است تا
+    پروسه‌های دیگر (worker ها) آن را هم‌زمان بازپخش و حذف نکنند.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, segment_bytes=JOURNAL_SEGMENT_BYTES):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self._file = None
+        self._path = None
+
+    def _open_segment(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # نام بر اساس زمان ساخت تا بازپخش به ترتیب ثبت انجام شود
+        self._path = self.directory / f"{time.time_ns()}-{os.getpid()}.jsonl"
+        self._file = open(self._path, "ab")
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._sync_directory()
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _close_segment(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._path = None
+
+    def append(self, rows):
+        """افزودن یک دسته رکورد با یک fsync"""
+        if not rows:
+            return
+        if not self._file:
+            self._open_segment()
+        data = b"".join(
+            json.dumps(row, default=datetime.isoformat,
+                       ensure_ascii=False).encode() + b"\n"
+            for row in rows)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if self._file.tell() >= self.segment_bytes:
+            self._close_segment()
+
+    def segments(self):
+        """segment های قابل بازپخش به ترتیب ثبت (شامل segment فعال همین پروسه)"""
+        if not self.directory.exists():
+            return []
+        ready = []
+        for path in sorted(self.directory.glob("*.jsonl"),
+                           key=lambda p: int(p.name.split("-")[0])):
+            if path == self._path or not self._locked(path):
+                ready.append(path)
+        return ready
+
+    @staticmethod
+    def _locked(path):
+        """آیا segment فعال یک پروسه دیگر است؟"""
+        try:
+            with open(path, "rb") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return True
+                fcntl.flock(f, fcntl.LOCK_UN)
+                return False
+        except FileNotFoundError:
+            return True
+
+    @staticmethod
+    def read(path):
+        """رکوردهای یک segment؛ سطر ناقص انتهایی (قطع برق هنگام نوشتن) نادیده گرفته می‌شود"""
+        rows = []
+        with open(path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    logger.warning(f"سطر {number} ژورنال {path.name} ناقص است")
+                    continue
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+                rows.append(row)
+        return rows
+
+    def remove(self, path):
+        """حذف segment پس از بازپخش موفق"""
+        if path == self._path:
+            self._close_segment()
+        path.unlink(missing_ok=True)
+        self._sync_directory()
+
+    def quarantine(self, path):
+        """کنار گذاشتن segment با داده نامعتبر (پسوند .bad) تا بازپخش بقیه ادامه یابد"""
+        if path == self._path:
+            self._close_segment()
+        bad = path.with_suffix(".bad")
+        path.rename(bad)
+        self._sync_directory()
+        return bad
+
+    def status(self):
+        segments = self.segments() if self.directory.exists() else []
+        return {
+            "segments": len(segments),
+            "bytes": sum(path.stat().st_size for path in segments if path.exists()),
+            "quarantined": len(list(self.directory.glob("*.bad")))
+            if self.directory.exists() else 0
+        }
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import or_
+
+from app.config import LEASE_TTL_SECONDS
+from app.database.connection import SessionLocal
+from app.database.dialect import upsert
+from app.database.models import AccountLease
+
+
+class LeaseManager:
+    """مدیریت اجاره حساب‌ها در جدول account_leases
+
+    هر worker حساب‌های آزاد یا منقضی شده را با FOR UPDATE SKIP LOCKED
+    برمی‌دارد و با heartbeat اجاره خود را تمدید می‌کند؛ اگر worker از کار
+    بیفتد، اجاره منقضی شده و حساب به worker دیگری می‌رسد.
+    """
+
+    def __init__(self, worker_id=None, ttl_seconds=LEASE_TTL_SECONDS):
+        self.worker_id = worker_id
+        self.ttl = timedelta(seconds=ttl_seconds)
+
+    def seed_accounts(self, account_ids):
+        """ثبت حساب‌ها در جدول اجاره (در صورت نبود)"""
+        if not account_ids:
+            return
+        db = SessionLocal()
+        try:
+            stmt = upsert(AccountLease).values([
+                {"account_id": account_id, "desired_state": "running",
+                 "status": "unassigned", "updated_at": datetime.now()}
+                for account_id in account_ids
+            ]).on_conflict_do_nothing(index_elements=["account_id"])
+            db.execute(stmt)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در ثبت حساب‌ها در جدول اجاره: {e}")
+        finally:
+            db.close()
+
+    def claim(self, limit, account_ids=None):
+        """برداشتن حداکثر limit حساب آزاد یا منقضی شده"""
+        if limit <= 0:
+            return []
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            query = db.query(AccountLease).filter(
+                AccountLease.desired_state != "stopped",
+                or_(AccountLease.worker_id == None,
+                    AccountLease.lease_expires_at == None,
+                    AccountLease.lease_expires_at < now)
+            )
+            # فقط حساب‌هایی که این worker اطلاعات ورود آن‌ها را دارد
+            if account_ids is not None:
+                query = query.filter(AccountLease.account_id.in_(account_ids))
+
+            leases = query.order_by(AccountLease.account_id).limit(
+                limit).with_for_update(skip_locked=True).all()
+
+            claimed = []
+            for lease in leases:
+                if lease.worker_id and lease.worker_id != self.worker_id:
+                    logger.warning(
+                        f"اجاره حساب {lease.account_id} از worker {lease.worker_id} منقضی شد")
+                lease.worker_id = self.worker_id
+                lease.lease_expires_at = now + self.ttl
+                lease.heartbeat_at = now
+                lease.status = "starting"
+                if lease.desired_state == "restart":
+                    lease.desired_state = "running"
+                claimed.append(lease.account_id)
+            db.commit()
+            return claimed
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در برداشتن اجاره حساب‌ها: {e}")
+            return []
+        finally:
+            db.close()
+
+    def heartbeat(self, statuses):
+        """تمدید اجاره حساب‌های این worker و ثبت وضعیت آن‌ها
+
+        خروجی: دیکشنری account_id -> desired_state برای حساب‌هایی که هنوز
+        در اختیار این worker هستند.
+        """
+        if not statuses:
+            return {}
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            leases = db.query(AccountLease).filter(
+                AccountLease.account_id.in_(list(statuses.keys())),
+                AccountLease.worker_id == self.worker_id
+            ).with_for_update().all()
+
+            owned = {}
+            for lease in leases:
+                status = statuses[lease.account_id]
+                lease.lease_expires_at = now + self.ttl
+                lease.heartbeat_at = now
+                lease.status = status.get("status", "unknown")
+                lease.status_details = status
+                owned[lease.account_id] = lease.desired_state
+            db.commit()
+            return owned
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در تمدید اجاره حساب‌ها: {e}")
+            # در صورت خطای دیتابیس حساب‌ها را تا انقضای اجاره نگه می‌داریم
+            return None
+        finally:
+            db.close()
+
+    def release(self, account_ids, status="stopped", desired_state=None):
+        """آزاد کردن اجاره حساب‌ها"""
+        if not account_ids:
+            return
+        db = SessionLocal()
+        try:
+            leases = db.query(AccountLease).filter(
+                AccountLease.account_id.in_(list(account_ids)),
+                AccountLease.worker_id == self.worker_id
+            ).all()
+            for lease in leases:
+                lease.worker_id = None
+                lease.lease_expires_at = None
+                lease.status = status
+                if desired_state:
+                    lease.desired_state = desired_state
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در آزادسازی اجاره حساب‌ها: {e}")
+        finally:
+            db.close()
+
+    def set_desired_state(self, account_ids, desired_state):
+        """تعیین وضعیت مطلوب حساب‌ها از سوی API کنترل"""
+        db = SessionLocal()
+        try:
+            query = db.query(AccountLease)
+            if account_ids is not None:
+                query = query.filter(
+                    AccountLease.account_id.in_(list(account_ids)))
+            count = query.update(
+                {AccountLease.desired_state: desired_state,
+                 AccountLease.updated_at: datetime.now()},
+                synchronize_session=False)
+            db.commit()
+            return count
+        except Exception as e:
+            db.rollback()
+            logger.error(f"خطا در تعیین وضعیت مطلوب حساب‌ها: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def list_leases(self):
+        """فهرست همه اجاره‌ها"""
+        db = SessionLocal()
+        try:
+            return db.query(AccountLease).order_by(AccountLease.account_id).all()
+        finally:
+            db.close()
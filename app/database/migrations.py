@@ -0,0 +1,339 @@
+from collections import namedtuple
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import inspect, text
+
+from app.config import DEFAULT_ACCOUNT_ID
+from app.database.dialect import IS_SQLITE
+from app.database.rollups import backfill_rollups
+from app.database.relationships import backfill_relationships
+from app.database.partitions import (
+    PARENT_TABLE,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    add_months,
+    partition_name,
+    ensure_partitions
+)
+
+# هر مهاجرت: شماره نسخه، نام، لیست مراحل (دستور SQL یا تابع با ورودی conn)
+# مهاجرت‌های concurrent خارج از تراکنش اجرا می‌شوند (CREATE INDEX CONCURRENTLY)
+Migration = namedtuple("Migration", ["version", "name", "steps", "concurrent"])
+Migration.__new__.__defaults__ = (False,)
+
+# کلید قفل مشورتی تا فقط یک پروسه هم‌زمان مهاجرت‌ها را اجرا کند
+MIGRATION_LOCK_KEY = 720_431_001
+
+# دیتابیس‌های SQLite از مدل‌های این نسخه ساخته می‌شوند؛ مهاجرت‌های تا این
+# نسخه (ستون‌ها، ایندکس‌ها و پارتیشن‌های PostgreSQL) فقط ثبت می‌شوند
+SQLITE_BASELINE_VERSION = 8
+
+
+def _add_account_columns(conn):
+    """افزودن ستون account_id به جداول دیتابیس‌های قدیمی (تک حسابی)"""
+    inspector = inspect(conn)
+    for table in ["bot_sessions", "interactions", "daily_stats"]:
+        columns = [c["name"] for c in inspector.get_columns(table)]
+        if "account_id" in columns:
+            continue
+
+        logger.info(f"افزودن ستون account_id به جدول {table}...")
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN account_id VARCHAR"))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_account_id ON {table} (account_id)"))
+        # رکوردهای قبلی متعلق به حساب پیش‌فرض هستند
+        conn.execute(text(
+            f"UPDATE {table} SET account_id = :account_id WHERE account_id IS NULL"),
+            {"account_id": DEFAULT_ACCOUNT_ID})
+
+        if table == "daily_stats":
+            # یکتایی تاریخ به یکتایی (حساب، تاریخ) تغییر می‌کند
+            conn.execute(text("DROP INDEX IF EXISTS ix_daily_stats_date"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_daily_stats_date ON daily_stats (date)"))
+            conn.execute(text(
+                "ALTER TABLE daily_stats ADD CONSTRAINT uq_daily_stats_account_date UNIQUE (account_id, date)"))
+
+
+def _drop_invalid_indexes(conn):
+    """حذف ایندکس‌های نامعتبر باقی‌مانده از یک CREATE INDEX CONCURRENTLY ناتمام"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = 'interactions'::regclass AND NOT i.indisvalid")).scalars().all()
+    for name in names:
+        logger.warning(f"حذف ایندکس نامعتبر {name}")
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+
+# ایندکس‌های جدول interactions در زمان مهاجرت 4 (ستون‌های index=True و مهاجرت 3)
+PARTITIONED_INDEXES_V4 = [
+    ("ix_interactions_id", "(id)"),
+    ("ix_interactions_session_id", "(session_id)"),
+    ("ix_interactions_account_id", "(account_id)"),
+    ("ix_interactions_interaction_type", "(interaction_type)"),
+    ("ix_interactions_target_user_id", "(target_user_id)"),
+    ("ix_interactions_target_media_id", "(target_media_id)"),
+    ("ix_interactions_created_at", "(created_at)"),
+    ("ix_interactions_type_success_created",
+     "(interaction_type, success, created_at)"),
+    ("ix_interactions_account_type_created",
+     "(account_id, interaction_type, created_at)"),
+    ("ix_interactions_username_created", "(target_user_username, created_at)"),
+    ("ix_interactions_follows",
+     "(account_id, created_at) INCLUDE (target_user_id, target_user_username) "
+     "WHERE interaction_type = 'follow' AND success"),
+]
+
+
+def _partition_interactions(conn):
+    """تبدیل interactions به جدول پارتیشن‌بندی شده ماهانه روی created_at
+
+    برای هر ماه تاریخچه قبلی یک پارتیشن ماهانه ساخته و ردیف‌های آن ماه با
+    یک INSERT ... SELECT (دسته‌های ماهانه) منتقل می‌شوند، سپس جدول قبلی حذف
+    می‌شود. بنابراین سیاست نگهداری ماه‌های قدیمی را هم ماه به ماه بایگانی
+    می‌کند. ایندکس‌ها پس از انتقال داده و یک بار برای هر پارتیشن ساخته
+    می‌شوند. جدول خالی (نصب جدید) مستقیماً حذف می‌شود.
+    """
+    if is_partitioned(conn):
+        ensure_partitions(conn)
+        return
+
+    legacy = f"{PARENT_TABLE}_legacy"
+    logger.info("تبدیل جدول interactions به جدول پارتیشن‌بندی شده...")
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}"))
+    # نام ایندکس‌ها سراسری است؛ ایندکس‌های جدول قبلی تا حذف آن تغییر نام می‌دهند
+    names = conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": legacy}).scalars().all()
+    for name in names:
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"'))
+
+    # کلید اصلی جدول پارتیشن‌بندی شده باید شامل کلید پارتیشن باشد
+    conn.execute(text(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE {legacy} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (created_at)"))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, created_at)"))
+    # sequence شناسه به جدول جدید منتقل می‌شود تا با حذف جدول قبلی حذف نشود
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                            {"table": legacy}).scalar()
+    if sequence:
+        conn.execute(text(
+            f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+
+    count, oldest, newest = conn.execute(text(
+        f"SELECT count(*), min(created_at), max(created_at) FROM {legacy}")).one()
+    if count:
+        # ردیف‌های بدون created_at در ماه جاری ثبت می‌شوند
+        now = datetime.now()
+        first = month_start(min(oldest or now, now))
+        last = month_start(max(newest or now, now))
+        months = [first]
+        while months[-1] < last:
+            months.append(add_months(months[-1], 1))
+        ensure_partitions(conn, dates=months)
+
+        columns = [f'"{column["name"]}"'
+                   for column in inspect(conn).get_columns(legacy)]
+        select = ", ".join(
+            "COALESCE(created_at, CAST(:now AS timestamp))"
+            if column == '"created_at"' else column for column in columns)
+        insert = (f"INSERT INTO {PARENT_TABLE} ({', '.join(columns)}) "
+                  f"SELECT {select} FROM {legacy} ")
+        for month in months:
+            moved = conn.execute(text(
+                insert + "WHERE created_at >= :start AND created_at < :end"),
+                {"now": now, "start": month, "end": add_months(month, 1)}).rowcount
+            if moved:
+                logger.info(f"{moved} تعامل به {partition_name(month)} منتقل شد")
+        conn.execute(text(insert + "WHERE created_at IS NULL"), {"now": now})
+    conn.execute(text(f"DROP TABLE {legacy}"))
+
+    # فهرست ثابت ایندکس‌های نسخه 4؛ ایندکس‌های بعدی مدل (مثل event_id که
+    # ستون آن در مهاجرت 8 اضافه می‌شود) در مهاجرت خود و بدون قفل ساخته می‌شوند
+    for name, definition in PARTITIONED_INDEXES_V4:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {PARENT_TABLE} {definition}"))
+    ensure_partitions(conn)
+
+
+def _partitioned_index(name, definition, unique=False):
+    """مرحله ساخت ایندکس روی interactions بدون قفل کردن نوشتن
+
+    CREATE INDEX CONCURRENTLY روی جدول پارتیشن‌بندی شده پشتیبانی نمی‌شود؛
+    بنابراین ایندکس ابتدا فقط روی جدول اصلی (ON ONLY) ساخته می‌شود، سپس روی
+    هر پارتیشن به صورت CONCURRENTLY و در پایان به ایندکس اصلی متصل می‌شود.
+    پارتیشن‌های بعدی ایندکس را خودکار دریافت می‌کنند.
+    """
+    create = "CREATE UNIQUE INDEX" if unique else "CREATE INDEX"
+
+    def step(conn):
+        if not is_partitioned(conn):
+            conn.execute(text(
+                f"{create} CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {PARENT_TABLE} {definition}"))
+            return
+
+        conn.execute(text(
+            f"{create} IF NOT EXISTS {name} ON ONLY {PARENT_TABLE} {definition}"))
+        for partition, _, _ in list_partitions(conn):
+            # پارتیشن‌هایی که ایندکس را هنگام ساخت جدول دریافت کرده‌اند (نصب جدید)
+            inherited = conn.execute(text(
+                "SELECT 1 FROM pg_inherits h JOIN pg_index i ON i.indexrelid = h.inhrelid "
+                "WHERE h.inhparent = to_regclass(:parent) AND i.indrelid = to_regclass(:table)"),
+                {"parent": name, "table": f'"{partition}"'}).scalar()
+            if inherited:
+                continue
+            index_name = f"{partition}_{name.removeprefix('ix_interactions_')}"
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i "
+                "WHERE i.indexrelid = to_regclass(:name)"),
+                {"name": index_name}).scalar()
+            if valid is False:
+                conn.execute(text(
+                    f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+            conn.execute(text(
+                f'{create} CONCURRENTLY IF NOT EXISTS "{index_name}" '
+                f'ON "{partition}" {definition}'))
+            attached = conn.execute(text(
+                "SELECT 1 FROM pg_inherits "
+                "WHERE inhrelid = to_regclass(:child) AND inhparent = to_regclass(:parent)"),
+                {"child": index_name, "parent": name}).scalar()
+            if not attached:
+                conn.execute(text(
+                    f'ALTER INDEX {name} ATTACH PARTITION "{index_name}"'))
+    return step
+
+
+MIGRATIONS = [
+    Migration(1, "account_id columns", [_add_account_columns]),
+    Migration(2, "daily_stats failed_count", [
+        "ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS failed_count INTEGER DEFAULT 0"
+    ]),
+    # ایندکس‌های ترکیبی برای فیلترهای آمار، تعاملات و اسکن آنفالو
+    Migration(3, "interactions composite indexes", [
+        _drop_invalid_indexes,
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interactions_created_at "
+        "ON interactions (created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interactions_type_success_created "
+        "ON interactions (interaction_type, success, created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interactions_account_type_created "
+        "ON interactions (account_id, interaction_type, created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interactions_username_created "
+        "ON interactions (target_user_username, created_at)",
+        # ایندکس جزئی فالوهای موفق؛ اسکن آنفالو و فالوبک فقط از ایندکس خوانده می‌شوند
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_interactions_follows "
+        "ON interactions (account_id, created_at) "
+        "INCLUDE (target_user_id, target_user_username) "
+        "WHERE interaction_type = 'follow' AND success",
+    ], concurrent=True),
+    Migration(4, "monthly interactions partitions", [_partition_interactions]),
+    # پر کردن شمارنده‌های ساعتی از تاریخچه موجود
+    Migration(5, "interaction rollups backfill", [backfill_rollups]),
+    # اسکن فقط-ایندکسی برای گروه‌بندی کاربران در most-interacted
+    Migration(6, "most interacted users index", [
+        _partitioned_index(
+            "ix_interactions_created_username",
+            "(created_at, target_user_username) "
+            "INCLUDE (interaction_type, success) "
+            "WHERE target_user_username IS NOT NULL"),
+    ], concurrent=True),
+    Migration(7, "relationships backfill", [backfill_relationships]),
+    # شناسه یکتای هر رویداد برای بازپخش تکرارپذیر ژورنال محلی
+    Migration(8, "interactions event_id", [
+        "ALTER TABLE interactions ADD COLUMN IF NOT EXISTS event_id VARCHAR",
+        _partitioned_index(
+            "ux_interactions_event", "(event_id, created_at)", unique=True),
+    ], concurrent=True),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"))
+
+
+def current_version(engine):
+    """بالاترین نسخه مهاجرت اعمال شده (0 برای دیتابیس بدون مهاجرت)"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text(
+            "SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def _run_steps(conn, steps):
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            conn.execute(text(step))
+
+
+def run_migrations(engine):
+    """اعمال مهاجرت‌های جدید به ترتیب نسخه؛ خروجی نسخه نهایی"""
+    if IS_SQLITE:
+        return _run_sqlite_migrations(engine)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"),
+                          {"key": MIGRATION_LOCK_KEY})
+        try:
+            version = current_version(engine)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+
+                logger.info(
+                    f"اعمال مهاجرت {migration.version}: {migration.name}...")
+                if migration.concurrent:
+                    # CREATE INDEX CONCURRENTLY نوشتن روی جدول را قفل نمی‌کند
+                    # ولی داخل تراکنش قابل اجرا نیست
+                    _run_steps(lock_conn, migration.steps)
+                    with engine.begin() as conn:
+                        _record(conn, migration)
+                else:
+                    with engine.begin() as conn:
+                        _run_steps(conn, migration.steps)
+                        _record(conn, migration)
+                version = migration.version
+
+            logger.info(f"✅ نسخه ساختار دیتابیس: {version}")
+            return version
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"),
+                              {"key": MIGRATION_LOCK_KEY})
+
+
+def _run_sqlite_migrations(engine):
+    """مهاجرت‌های SQLite؛ قفل نوشتن خود SQLite اجرای هم‌زمان را مرتب می‌کند"""
+    version = current_version(engine)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with engine.begin() as conn:
+            if migration.version > SQLITE_BASELINE_VERSION:
+                logger.info(
+                    f"اعمال مهاجرت {migration.version}: {migration.name}...")
+                _run_steps(conn, migration.steps)
+            _record(conn, migration)
+        version = migration.version
+
+    logger.info(f"✅ نسخه ساختار دیتابیس: {version}")
+    return version
+
+
+def _record(conn, migration):
+    conn.execute(text(
+        "INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name})
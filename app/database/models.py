@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, JSON, UniqueConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -12,6 +12,7 @@ class BotSession(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, unique=True, index=True)
+    account_id = Column(String, index=True, nullable=True)
     started_at = Column(DateTime, default=datetime.now)
     ended_at = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
@@ -21,9 +22,31 @@ class BotSession(Base):
 class Interaction(Base):
     """مدل تعاملات بات"""
     __tablename__ = "interactions"
+    # ایندکس‌های ترکیبی (برای دیتابیس‌های موجود در app/database/migrations.py)
+    # جدول در دیتابیس به صورت ماهانه روی created_at پارتیشن‌بندی شده است (مهاجرت 4)
+    __table_args__ = (
+        Index("ix_interactions_created_at", "created_at"),
+        Index("ix_interactions_type_success_created",
+              "interaction_type", "success", "created_at"),
+        Index("ix_interactions_account_type_created",
+              "account_id", "interaction_type", "created_at"),
+        Index("ix_interactions_username_created",
+              "target_user_username", "created_at"),
+        Index("ix_interactions_follows", "account_id", "created_at",
+              postgresql_include=["target_user_id", "target_user_username"],
+              postgresql_where=text("interaction_type = 'follow' AND success"),
+              sqlite_where=text("interaction_type = 'follow' AND success")),
+        Index("ix_interactions_created_username", "created_at", "target_user_username",
+              postgresql_include=["interaction_type", "success"],
+              postgresql_where=text("target_user_username IS NOT NULL"),
+              sqlite_where=text("target_user_username IS NOT NULL")),
+        # یکتایی رویدادها برای بازپخش تکرارپذیر ژورنال (شامل کلید پارتیشن)
+        Index("ux_interactions_event", "event_id", "created_at", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, index=True)
+    account_id = Column(String, index=True, nullable=True)
     # like, comment, follow, unfollow, view_story, dm
     interaction_type = Column(String, index=True)
     target_user_id = Column(String, index=True, nullable=True)
@@ -34,14 +57,21 @@ class Interaction(Base):
     created_at = Column(DateTime, default=datetime.now)
     success = Column(Boolean, default=True)
     error = Column(Text, nullable=True)
+    # شناسه یکتای رویداد که هنگام ثبت در بافر تعیین می‌شود
+    event_id = Column(String, nullable=True)
 
 
 class DailyStats(Base):
     """آمار روزانه بات"""
     __tablename__ = "daily_stats"
+    __table_args__ = (
+        UniqueConstraint("account_id", "date",
+                         name="uq_daily_stats_account_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, unique=True, index=True)
+    account_id = Column(String, index=True, nullable=True)
+    date = Column(DateTime, index=True)
     likes_count = Column(Integer, default=0)
     comments_count = Column(Integer, default=0)
     follows_count = Column(Integer, default=0)
@@ -49,4 +79,95 @@ class DailyStats(Base):
     story_views_count = Column(Integer, default=0)
     dms_count = Column(Integer, default=0)
     total_interactions = Column(Integer, default=0)
+    # تعداد عملیات ناموفق برای محاسبه تدریجی success_rate
+    failed_count = Column(Integer, default=0)
     success_rate = Column(Float, default=100.0)
+
+
+class InteractionRollup(Base):
+    """شمارش ساعتی تعاملات هر حساب و نوع (برای endpoint های آمار)"""
+    __tablename__ = "interaction_rollups"
+    __table_args__ = (
+        UniqueConstraint("bucket", "account_id", "interaction_type",
+                         name="uq_interaction_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False, index=True)  # ابتدای ساعت
+    account_id = Column(String, nullable=False)
+    interaction_type = Column(String, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    success = Column(Integer, nullable=False, default=0)
+
+
+class Relationship(Base):
+    """وضعیت کاربرانی که هر حساب فالو کرده است (با فالو و آنفالو به‌روز می‌شود)"""
+    __tablename__ = "relationships"
+    __table_args__ = (
+        UniqueConstraint("account_id", "user_id",
+                         name="uq_relationships_account_user"),
+        # کاندیداهای آنفالو: فالو شده، هنوز آنفالو نشده و فالوبک نکرده
+        Index("ix_relationships_unfollow_candidates", "account_id", "followed_at",
+              postgresql_where=text(
+                  "unfollowed_at IS NULL AND followed_back IS NOT TRUE"),
+              sqlite_where=text(
+                  "unfollowed_at IS NULL AND followed_back IS NOT TRUE")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    username = Column(String, nullable=True)
+    followed_at = Column(DateTime, nullable=True)
+    unfollowed_at = Column(DateTime, nullable=True)
+    # None یعنی هنوز بررسی نشده است
+    followed_back = Column(Boolean, nullable=True)
+    last_checked = Column(DateTime, nullable=True)
+
+
+class AccountLease(Base):
+    """اجاره حساب‌ها بین پروسه‌های worker"""
+    __tablename__ = "account_leases"
+
+    account_id = Column(String, primary_key=True)
+    worker_id = Column(String, index=True, nullable=True)
+    lease_expires_at = Column(DateTime, index=True, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    # وضعیت مطلوب تعیین شده از سوی API: running, stopped, restart
+    desired_state = Column(String, default="running")
+    # وضعیت گزارش شده از سوی worker
+    status = Column(String, default="unassigned")
+    status_details = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class ActionQueueItem(Base):
+    """صف پایدار عملیات (لایک، کامنت، فالو، آنفالو، استوری، دایرکت)"""
+    __tablename__ = "action_queue"
+    __table_args__ = (
+        Index("ix_action_queue_dequeue", "status",
+              "account_id", "priority", "not_before"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(String, nullable=False)
+    # like, comment, follow, unfollow, view_story, dm
+    action_type = Column(String, nullable=False)
+    target_user_id = Column(String, nullable=True)
+    target_user_username = Column(String, nullable=True)
+    target_media_id = Column(String, nullable=True)
+    target_media_shortcode = Column(String, nullable=True)
+    content = Column(Text, nullable=True)
+    priority = Column(Integer, default=0)  # عدد بزرگ‌تر یعنی اولویت بیشتر
+    not_before = Column(DateTime, default=datetime.now)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    # pending, running, done, failed
+    status = Column(String, default="pending")
+    idempotency_key = Column(String, unique=True, nullable=False)
+    source = Column(String, nullable=True)  # hashtag, follow_back, unfollow, api
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,175 @@
+import gzip
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import text
+
+from app.config import (
+    PARTITION_MONTHS_AHEAD,
+    INTERACTIONS_RETENTION_MONTHS,
+    ARCHIVE_DIR
+)
+
+# جدول interactions به صورت RANGE روی created_at و ماهانه پارتیشن‌بندی شده است
+# (تبدیل جدول‌های موجود در مهاجرت 4 در app/database/migrations.py انجام می‌شود)
+PARENT_TABLE = "interactions"
+
+# کلید قفل مشورتی تا فقط یک پروسه هم‌زمان نگهداری پارتیشن‌ها را انجام دهد
+PARTITION_LOCK_KEY = 720_431_002
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def _parse_bound(value):
+    """مرز پارتیشن؛ None برای MINVALUE/MAXVALUE"""
+    value = value.strip()
+    if not value.startswith("'"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn):
+    """پارتیشن‌های متصل به جدول اصلی به صورت (نام، شروع، پایان)"""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {"parent": PARENT_TABLE}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if not match:
+            continue
+        partitions.append(
+            (name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda p: p[2] or datetime.max)
+
+
+def is_partitioned(conn):
+    return conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:parent)"),
+        {"parent": PARENT_TABLE}).scalar() or False
+
+
+def _covered(partitions, month):
+    return any((start is None or start <= month) and (end is None or month < end)
+               for _, start, end in partitions)
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD, dates=()):
+    """ساخت پارتیشن ماه جاری، months_ahead ماه آینده و ماه‌های تاریخ‌های داده شده"""
+    if not is_partitioned(conn):
+        return []
+
+    current = month_start(datetime.now())
+    months = {add_months(current, offset)
+              for offset in range(months_ahead + 1)}
+    months.update(month_start(value) for value in dates if value)
+
+    partitions = list_partitions(conn)
+    created = []
+    for month in sorted(months):
+        if _covered(partitions, month):
+            continue
+        name = partition_name(month)
+        end = add_months(month, 1)
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"))
+        partitions.append((name, month, end))
+        created.append(name)
+
+    if created:
+        logger.info(f"پارتیشن‌های جدید تعاملات: {', '.join(created)}")
+    return created
+
+
+def _export_partition(engine, name, archive_dir):
+    """خروجی CSV فشرده یک پارتیشن؛ فایل ابتدا موقت نوشته و سپس جابجا می‌شود"""
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.csv.gz"
+    tmp_path = path.with_suffix(".gz.tmp")
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        with gzip.open(tmp_path, "wb") as f:
+            cursor.copy_expert(
+                f'COPY (SELECT * FROM "{name}" ORDER BY created_at, id) '
+                f"TO STDOUT WITH CSV HEADER", f)
+        cursor.close()
+        raw.commit()
+    finally:
+        raw.close()
+
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
+    return path
+
+
+def apply_retention(engine, retention_months=INTERACTIONS_RETENTION_MONTHS,
+                    archive_dir=ARCHIVE_DIR):
+    """جدا کردن پارتیشن‌های قدیمی‌تر از retention_months ماه پس از بایگانی روی دیسک
+
+    هر پارتیشن ابتدا به فایل csv.gz در archive_dir نوشته می‌شود و فقط پس از
+    موفقیت آن از جدول جدا و حذف می‌شود. retention_months=0 یعنی نگهداری دائمی.
+    """
+    if not retention_months:
+        return []
+
+    cutoff = add_months(month_start(datetime.now()), -retention_months)
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return []
+        expired = [name for name, _, end in list_partitions(conn)
+                   if end is not None and end <= cutoff]
+
+    archived = []
+    for name in expired:
+        path = _export_partition(engine, name, archive_dir)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        logger.info(f"پارتیشن {name} بایگانی شد: {path}")
+        archived.append(name)
+    return archived
+
+
+def maintain_partitions(engine):
+    """ساخت پارتیشن‌های آینده و اعمال سیاست نگهداری؛ در صورت اجرای هم‌زمان رد می‌شود"""
+    if engine.dialect.name != "postgresql":
+        # پارتیشن‌بندی و بایگانی فقط در PostgreSQL
+        return None
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                   {"key": PARTITION_LOCK_KEY}).scalar()
+        if not locked:
+            return None
+        try:
+            with engine.begin() as conn:
+                created = ensure_partitions(conn)
+            archived = apply_retention(engine)
+            return {"created": created, "archived": archived}
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"),
+                              {"key": PARTITION_LOCK_KEY})
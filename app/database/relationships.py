@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import case, func, or_, text
+
+from app.config import DEFAULT_ACCOUNT_ID
+from app.database.connection import session_scope
+from app.database.dialect import greatest, upsert
+from app.database.models import Relationship
+
+
+class RelationshipStore:
+    """وضعیت فالو کاربران یک حساب در جدول relationships
+
+    فالو و آنفالو موفق این جدول را به‌روز می‌کنند، بنابراین انتخاب کاربران
+    برای آنفالو و فالوبک به جای اسکن جدول interactions با یک کوئری ایندکس‌دار
+    انجام می‌شود.
+    """
+
+    def __init__(self, account_id):
+        self.account_id = account_id
+
+    def record_follow(self, user_id, username=None, followed_at=None):
+        """ثبت فالو موفق (فالو مجدد یک کاربر آنفالو شده را دوباره فعال می‌کند)"""
+        now = followed_at or datetime.now()
+        try:
+            with session_scope() as db:
+                stmt = upsert(Relationship).values(
+                    account_id=self.account_id,
+                    user_id=str(user_id),
+                    username=username,
+                    followed_at=now
+                )
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["account_id", "user_id"],
+                    set_={
+                        "username": func.coalesce(stmt.excluded.username, Relationship.username),
+                        "followed_at": stmt.excluded.followed_at,
+                        "unfollowed_at": None
+                    }))
+            return True
+        except Exception as e:
+            logger.error(f"خطا در ثبت فالو {user_id}: {e}")
+            return False
+
+    def record_unfollow(self, user_id, username=None, unfollowed_at=None):
+        """ثبت آنفالو موفق"""
+        now = unfollowed_at or datetime.now()
+        try:
+            with session_scope() as db:
+                stmt = upsert(Relationship).values(
+                    account_id=self.account_id,
+                    user_id=str(user_id),
+                    username=username,
+                    unfollowed_at=now
+                )
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["account_id", "user_id"],
+                    set_={
+                        "username": func.coalesce(stmt.excluded.username, Relationship.username),
+                        "unfollowed_at": stmt.excluded.unfollowed_at
+                    }))
+            return True
+        except Exception as e:
+            logger.error(f"خطا در ثبت آنفالو {user_id}: {e}")
+            return False
+
+    def mark_checked(self, user_id, followed_back):
+        """ثبت نتیجه بررسی فالوبک یک کاربر"""
+        try:
+            with session_scope() as db:
+                db.query(Relationship).filter(
+                    Relationship.account_id == self.account_id,
+                    Relationship.user_id == str(user_id)
+                ).update({"followed_back": followed_back,
+                          "last_checked": datetime.now()},
+                         synchronize_session=False)
+            return True
+        except Exception as e:
+            logger.error(f"خطا در ثبت بررسی فالوبک {user_id}: {e}")
+            return False
+
+    def mark_checked_many(self, results):
+        """ثبت گروهی نتیجه بررسی فالوبک ({user_id: followed_back}) با یک UPDATE"""
+        if not results:
+            return True
+        followers = [str(user_id) for user_id, followed in results.items() if followed]
+        try:
+            with session_scope() as db:
+                db.query(Relationship).filter(
+                    Relationship.account_id == self.account_id,
+                    Relationship.user_id.in_([str(user_id) for user_id in results])
+                ).update({"followed_back": Relationship.user_id.in_(followers),
+                          "last_checked": datetime.now()},
+                         synchronize_session=False)
+            return True
+        except Exception as e:
+            logger.error(f"خطا در ثبت گروهی بررسی فالوبک: {e}")
+            return False
+
+    def unfollow_candidates(self, days_limit=7, limit=50):
+        """کاربرانی که بیش از days_limit روز پیش فالو شده‌اند، آنفالو نشده‌اند
+        و فالوبک نکرده‌اند (ابتدا کاربرانی که کمتر بررسی شده‌اند)"""
+        date_limit = datetime.now() - timedelta(days=days_limit)
+        with session_scope() as db:
+            return db.query(
+                Relationship.user_id,
+                Relationship.username,
+                Relationship.followed_at
+            ).filter(
+                Relationship.account_id == self.account_id,
+                Relationship.unfollowed_at == None,
+                Relationship.followed_back.isnot(True),
+                Relationship.followed_at <= date_limit
+            ).order_by(
+                Relationship.last_checked.asc().nullsfirst(),
+                Relationship.followed_at
+            ).limit(limit).all()
+
+    def followed_ids(self, user_ids):
+        """شناسه‌هایی از user_ids که قبلاً توسط این حساب فالو شده‌اند"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return set()
+        with session_scope() as db:
+            rows = db.query(Relationship.user_id).filter(
+                Relationship.account_id == self.account_id,
+                Relationship.followed_at != None,
+                Relationship.user_id.in_(user_ids)
+            ).all()
+        return {row.user_id for row in rows}
+
+
+def apply_relationship_history(db, rows):
+    """اعمال فالو و آنفالوهای موفق رکوردهای تعامل (بازپخش ژورنال) روی relationships
+
+    جدیدترین زمان هر رویداد نگه داشته می‌شود، بنابراین ترتیب اعمال رکوردها
+    و ثبت مستقیم هم‌زمان توسط RelationshipStore نتیجه را تغییر نمی‌دهد.
+    """
+    history = {}
+    for row in rows:
+        kind = row.get("interaction_type")
+        if kind not in ("follow", "unfollow") or not row.get("success") \
+                or not row.get("target_user_id"):
+            continue
+        key = (row.get("account_id") or DEFAULT_ACCOUNT_ID, str(row["target_user_id"]))
+        item = history.setdefault(key, {
+            "account_id": key[0], "user_id": key[1], "username": None,
+            "followed_at": None, "unfollowed_at": None})
+        item["username"] = row.get("target_user_username") or item["username"]
+        column = "followed_at" if kind == "follow" else "unfollowed_at"
+        if not item[column] or row["created_at"] > item[column]:
+            item[column] = row["created_at"]
+    if not history:
+        return
+    for item in history.values():
+        if item["unfollowed_at"] and item["followed_at"] \
+                and item["unfollowed_at"] < item["followed_at"]:
+            item["unfollowed_at"] = None
+
+    stmt = upsert(Relationship).values(
+        [history[key] for key in sorted(history)])
+    followed_at = greatest(Relationship.followed_at, stmt.excluded.followed_at)
+    unfollowed_at = greatest(Relationship.unfollowed_at, stmt.excluded.unfollowed_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["account_id", "user_id"],
+        set_={
+            "username": func.coalesce(stmt.excluded.username, Relationship.username),
+            "followed_at": followed_at,
+            # آنفالو قدیمی‌تر از آخرین فالو یعنی کاربر دوباره فالو شده است
+            "unfollowed_at": case(
+                (or_(followed_at == None, unfollowed_at > followed_at), unfollowed_at))
+        }))
+
+
+def backfill_relationships(conn):
+    """ساخت جدول relationships از تاریخچه فالو و آنفالوهای موفق"""
+    conn.execute(text(
+        "INSERT INTO relationships (account_id, user_id, username, followed_at, unfollowed_at) "
+        "SELECT account_id, user_id, username, followed_at, "
+        "CASE WHEN unfollowed_at > COALESCE(followed_at, '-infinity') "
+        "THEN unfollowed_at END "
+        "FROM (SELECT COALESCE(account_id, :account_id) AS account_id, "
+        "target_user_id AS user_id, max(target_user_username) AS username, "
+        "max(created_at) FILTER (WHERE interaction_type = 'follow') AS followed_at, "
+        "max(created_at) FILTER (WHERE interaction_type = 'unfollow') AS unfollowed_at "
+        "FROM interactions WHERE success AND target_user_id IS NOT NULL "
+        "AND interaction_type IN ('follow', 'unfollow') "
+        "GROUP BY 1, 2) AS history "
+        "ON CONFLICT ON CONSTRAINT uq_relationships_account_user DO NOTHING"),
+        {"account_id": DEFAULT_ACCOUNT_ID})
@@ -0,0 +1,89 @@
+from sqlalchemy import func, select, text
+
+from app.config import DEFAULT_ACCOUNT_ID
+from app.database.dialect import date_trunc, upsert
+from app.database.models import Interaction, InteractionRollup
+
+# کلید خروجی API برای شمارنده هر نوع تعامل
+TYPE_KEYS = {
+    "like": "likes",
+    "comment": "comments",
+    "follow": "follows",
+    "unfollow": "unfollows",
+    "view_story": "story_views",
+    "dm": "dms"
+}
+
+
+def hour_bucket(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_increments(rows):
+    """جمع رکوردهای تعامل به تفکیک (ساعت، حساب، نوع) -> [کل، موفق]"""
+    increments = {}
+    for row in rows:
+        if not row.get("interaction_type"):
+            continue
+        key = (hour_bucket(row["created_at"]),
+               row.get("account_id") or DEFAULT_ACCOUNT_ID,
+               row["interaction_type"])
+        counts = increments.setdefault(key, [0, 0])
+        counts[0] += 1
+        if row.get("success"):
+            counts[1] += 1
+    return increments
+
+
+def upsert_rollups(db, rows):
+    """افزایش اتمی شمارنده‌های ساعتی با یک INSERT ... ON CONFLICT DO UPDATE"""
+    increments = rollup_increments(rows)
+    if not increments:
+        return
+
+    # ترتیب ثابت کلیدها از بن‌بست بین چند نویسنده هم‌زمان جلوگیری می‌کند
+    stmt = upsert(InteractionRollup).values([
+        {"bucket": bucket, "account_id": account_id,
+         "interaction_type": interaction_type, "total": total, "success": success}
+        for (bucket, account_id, interaction_type), (total, success)
+        in sorted(increments.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["bucket", "account_id", "interaction_type"],
+        set_={
+            "total": InteractionRollup.total + stmt.excluded.total,
+            "success": InteractionRollup.success + stmt.excluded.success
+        }))
+
+
+def backfill_rollups(conn, since=None):
+    """محاسبه مجدد شمارنده‌های ساعتی از جدول interactions (از زمان since به بعد)"""
+    bucket = date_trunc("hour", Interaction.created_at)
+    query = select(
+        bucket,
+        func.coalesce(Interaction.account_id, DEFAULT_ACCOUNT_ID),
+        Interaction.interaction_type,
+        func.count(),
+        func.count().filter(Interaction.success == True)
+    ).where(Interaction.interaction_type != None)
+    if since:
+        query = query.where(Interaction.created_at >= hour_bucket(since))
+    # گروه‌بندی با شماره ستون تا پارامتر حساب پیش‌فرض دو بار متفاوت ارسال نشود
+    query = query.group_by(text("1, 2, 3"))
+
+    stmt = upsert(InteractionRollup).from_select(
+        ["bucket", "account_id", "interaction_type", "total", "success"], query)
+    result = conn.execute(stmt.on_conflict_do_update(
+        index_elements=["bucket", "account_id", "interaction_type"],
+        set_={"total": stmt.excluded.total, "success": stmt.excluded.success}))
+    return result.rowcount
+
+
+def success_by_type(*conditions):
+    """ستون‌های تجمعی تعداد موفق هر نوع تعامل (با کلیدهای TYPE_KEYS)"""
+    return [
+        func.coalesce(func.sum(InteractionRollup.success).filter(
+            InteractionRollup.interaction_type == interaction_type,
+            *conditions), 0).label(key)
+        for interaction_type, key in TYPE_KEYS.items()
+    ]
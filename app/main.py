@@ -1,4 +1,5 @@
 import time
+STARTUP_BEGAN = time.perf_counter()
 import asyncio
 import uvicorn
 import traceback
@@ -10,40 +11,32 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
-from app.database.init_db import initialize_database
-from app.database.connection import get_db, engine
+from app.database.init_db import bootstrap_database
+from app.database.connection import get_db, get_engine
+from app.database.async_connection import dispose_async_engine
 from app.database.models import Base
-from app.bot.session_manager import SessionManager
-from app.bot.interaction_manager import InteractionManager
-from app.bot.follower_manager import FollowerManager
-from app.bot.comment_manager import CommentManager
+from app.database.interaction_writer import interaction_writer
+from app.database.partitions import maintain_partitions
 from app.api.router import router as api_router
 from app.api.stats import router as stats_router
 from app.api.interactions import router as interactions_router
-from app.bot.automated_bot import AutomatedBot
-
-
-# اطمینان از وجود دیتابیس و آماده‌سازی آن
-print("در حال بررسی و آماده‌سازی دیتابیس...")
-try:
-    from app.database.init_db import initialize_database
-
-    for attempt in range(3):  # سه بار تلاش
-        if initialize_database():
-            print("✅ دیتابیس با موفقیت آماده شد.")
-            break
-        elif attempt < 2:  # اگر هنوز تلاش‌های بیشتری باقی مانده
-            print(
-                f"⚠️ خطا در آماده‌سازی دیتابیس. تلاش مجدد ({attempt+2}/3)...")
-            time.sleep(5)  # کمی صبر قبل از تلاش بعدی
-        else:
-            print("❌ خطا در آماده‌سازی دیتابیس پس از سه بار تلاش.")
-            # ادامه اجرا - ممکن است دیتابیس بعداً در دسترس قرار گیرد
-except Exception as e:
-    print(f"❌ خطا در فرآیند آماده‌سازی دیتابیس: {e}")
-    traceback.print_exc()
-    import sys
-    sys.exit(1)
+from app.api.queue import router as queue_router
+from app.bot.account_registry import AccountRegistry, load_managers
+from app.bot.remote_registry import RemoteAccountRegistry
+from app.bot.executor import BotExecutor
+from app.config import BOT_RUN_MODE, PARTITION_MAINTENANCE_INTERVAL
+
+# زمان‌بندی مراحل راه‌اندازی (میلی‌ثانیه از شروع import این ماژول)
+# آماده‌سازی دیتابیس و بارگذاری مدیرها پس از شروع گوش دادن API در پس‌زمینه
+# انجام می‌شود تا شروع سرد یا راه‌اندازی مجدد watchdog معطل آن‌ها نماند
+startup = {"phases": {"imports": round(
+    (time.perf_counter() - STARTUP_BEGAN) * 1000, 1)}, "database": "pending"}
+database_ready = asyncio.Event()
+
+
+def mark_startup(phase):
+    startup["phases"][phase] = round(
+        (time.perf_counter() - STARTUP_BEGAN) * 1000, 1)
 
 
 # اطمینان از وجود پوشه data
@@ -63,12 +56,20 @@ app = FastAPI(
     openapi_url="/openapi.json"
 )
 
-# نمونه‌های کلاس‌های اصلی با مقادیر اولیه None
-session_manager = None
-interaction_manager = None
-follower_manager = None
-comment_manager = None
-automated_bot = None
+# اجراکننده مشترک برای عملیات مسدودکننده بات (خارج از حلقه رویداد)
+executor = BotExecutor()
+# نخ جداگانه برای ping سلامت تا /health پشت فراخوانی‌های طولانی بات‌ها
+# (ورود، challenge) در صف نماند و واچ‌داگ کانتینر را بی‌دلیل ریستارت نکند
+health_executor = BotExecutor(max_workers=1, max_threads=1)
+
+# رجیستری حساب‌ها؛ هر حساب پشته مدیرها و بات خودکار مخصوص خود را دارد
+# در حالت control بات‌ها در پروسه‌های app.worker اجرا می‌شوند و API فقط
+# وضعیت آن‌ها را از جدول account_leases می‌خواند
+# (ثبت حساب‌ها در جدول اجاره پس از آماده‌سازی دیتابیس در bootstrap)
+if BOT_RUN_MODE == "control":
+    registry = RemoteAccountRegistry(executor)
+else:
+    registry = AccountRegistry(executor)
 
 # میدلور برای مدیریت خطاها
 
@@ -78,8 +79,6 @@ async def handle_exceptions(request, call_next):
     try:
         return await call_next(request)
     except Exception as e:
-        if session_manager and session_manager.logger:
-            session_manager.logger.error(f"خطای HTTP: {e}")
         logging.error(f"خطای HTTP: {e}")
         logging.error(traceback.format_exc())
         return JSONResponse(
@@ -94,28 +93,34 @@ async def handle_exceptions(request, call_next):
 async def rate_limit_middleware(request, call_next):
     # محدودیت ساده برای جلوگیری از فشار زیاد به سرور
     if request.url.path in ["/start", "/stop", "/auto-mode/on", "/auto-mode/off"]:
-        time.sleep(1)  # تاخیر کوچک برای عملیات‌های مدیریتی
+        await asyncio.sleep(1)  # تاخیر کوچک برای عملیات‌های مدیریتی
     return await call_next(request)
 
 # افزودن endpoint سلامتی برای بررسی وضعیت
 
 
+def ping_database():
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
 @app.get("/health")
-def health_check():
+async def health_check():
     """بررسی وضعیت سلامت سرویس"""
-    global session_manager
-
     db_status = "online"
     try:
         # بررسی اتصال به دیتابیس
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        await health_executor.run(ping_database)
     except Exception as e:
         db_status = "offline"
         logging.error(f"خطا در اتصال به دیتابیس: {e}")
 
-    bot_status = "online" if session_manager and session_manager.logged_in else "offline"
-    auto_status = "running" if automated_bot and automated_bot.running else "stopped"
+    await registry.refresh()
+
+    bot_status = "online" if any(
+        stack.logged_in for stack in registry) else "offline"
+    auto_status = "running" if any(
+        stack.running for stack in registry) else "stopped"
 
     return {
         "status": "healthy",
@@ -123,125 +128,124 @@ def health_check():
         "database": db_status,
         "bot": bot_status,
         "auto_mode": auto_status,
-        "uptime": "available" if session_manager else "unavailable"
+        "accounts": len(registry),
+        "interaction_writer": interaction_writer.status(),
+        "startup": startup,
+        "uptime": "available" if any(
+            stack.session_manager for stack in registry) else "unavailable"
     }
 
 
+@app.get("/startup")
+def startup_status():
+    """زمان‌بندی مراحل راه‌اندازی و وضعیت آماده‌سازی دیتابیس"""
+    return startup
+
+
 # افزودن روترهای API
 app.include_router(api_router, prefix="/api")
 app.include_router(stats_router, prefix="/api/stats")
 app.include_router(interactions_router, prefix="/api/interactions")
+app.include_router(queue_router, prefix="/api/queue")
 
-# تابع اجرای بات در پس‌زمینه
 
+async def get_account(account_id):
+    """دریافت پشته حساب یا خطای 404"""
+    await registry.refresh()
+    try:
+        return registry.get(account_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=404, detail=f"حساب {account_id} تعریف نشده است")
 
-async def run_bot():
-    global session_manager, interaction_manager, follower_manager, comment_manager, automated_bot
 
-    try:
-        # ایجاد نمونه‌های کلاس اصلی اگر وجود ندارند
-        if not session_manager:
-            session_manager = SessionManager()
-            logging.info("نمونه SessionManager ایجاد شد")
-
-        # لاگین به اینستاگرام - با منطق بهبود یافته
-        login_attempts = 0
-        max_attempts = 3
-
-        while login_attempts < max_attempts:
-            try:
-                login_success = session_manager.login()
-                if login_success:
-                    session_manager.logger.info(
-                        "✅ لاگین موفقیت‌آمیز به اینستاگرام")
-                    logging.info("لاگین موفقیت‌آمیز به اینستاگرام")
-                    break
-                else:
-                    login_attempts += 1
-                    session_manager.logger.error(
-                        f"❌ تلاش {login_attempts}/{max_attempts} لاگین ناموفق بود")
-                    logging.error(
-                        f"تلاش {login_attempts}/{max_attempts} لاگین ناموفق بود")
-                    if login_attempts < max_attempts:
-                        # انتظار بیشتر قبل از تلاش مجدد
-                        await asyncio.sleep(60)
-            except Exception as e:
-                login_attempts += 1
-                session_manager.logger.error(
-                    f"❌ خطا در تلاش {login_attempts}/{max_attempts} لاگین: {e}")
-                logging.error(
-                    f"خطا در تلاش {login_attempts}/{max_attempts} لاگین: {e}")
-                logging.error(traceback.format_exc())
-                if login_attempts < max_attempts:
-                    await asyncio.sleep(60)  # انتظار بیشتر قبل از تلاش مجدد
-
-        if login_attempts >= max_attempts:
-            session_manager.logger.error("❌ تمام تلاش‌های لاگین ناموفق بودند")
-            logging.error("تمام تلاش‌های لاگین ناموفق بودند")
-            return
-
-        # ثبت شروع سشن در دیتابیس
-        session_manager.record_session_start()
-
-        # ایجاد نمونه‌های مدیر تعامل، فالو و کامنت
-        if not interaction_manager:
-            interaction_manager = InteractionManager(session_manager)
-            logging.info("نمونه InteractionManager ایجاد شد")
-
-        if not follower_manager:
-            follower_manager = FollowerManager(
-                session_manager, interaction_manager)
-            logging.info("نمونه FollowerManager ایجاد شد")
-
-        if not comment_manager:
-            comment_manager = CommentManager(
-                session_manager, interaction_manager)
-            logging.info("نمونه CommentManager ایجاد شد")
-
-        # ایجاد و شروع بات خودکار
-        if not automated_bot:
-            automated_bot = AutomatedBot(
-                session_manager, interaction_manager, follower_manager, comment_manager)
-            logging.info("نمونه AutomatedBot ایجاد شد")
-            await automated_bot.start()
-            logging.info("چرخه کاری خودکار بات شروع شد")
-
-        session_manager.logger.info(
-            "بات با موفقیت راه‌اندازی شد و در حال کار خودکار است")
-        logging.info("بات با موفقیت راه‌اندازی شد و در حال کار خودکار است")
-    except Exception as e:
-        # ثبت خطای کلی
-        if session_manager and session_manager.logger:
-            session_manager.logger.error(f"خطای کلی در راه‌اندازی بات: {e}")
-            session_manager.logger.error(
-                f"Traceback: {traceback.format_exc()}")
-        logging.error(f"خطای کلی در راه‌اندازی بات: {e}")
-        logging.error(traceback.format_exc())
+async def start_account(stack, background_tasks):
+    """راه‌اندازی یک حساب (یا ادامه چرخه خودکار آن)"""
+    if stack.logged_in:
+        if stack.running:
+            return "running"
+        elif stack.automated_bot:
+            await stack.automated_bot.start()
+            logging.info(
+                f"چرخه کاری خودکار حساب {stack.account_id} مجدداً شروع شد")
+            return "started"
+
+    if stack.starting:
+        return "starting"
+
+    background_tasks.add_task(when_database_ready, stack.start)
+    return "starting"
 
 # مدیریت رهاسازی منابع هنگام خروج
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    global session_manager, automated_bot
+async def when_database_ready(func, *args):
+    """اجرای یک coroutine پس از پایان آماده‌سازی دیتابیس"""
+    await database_ready.wait()
+    return await func(*args)
 
-    logging.info("در حال خروج از برنامه...")
 
-    # توقف بات خودکار
-    if automated_bot and automated_bot.running:
+async def partition_maintenance_loop():
+    """ساخت دوره‌ای پارتیشن‌های آینده و بایگانی پارتیشن‌های قدیمی تعاملات"""
+    while True:
         try:
-            await automated_bot.stop()
-            logging.info("بات خودکار متوقف شد")
+            await executor.run(maintain_partitions, get_engine())
         except Exception as e:
-            logging.error(f"خطا در توقف بات خودکار: {e}")
+            logging.error(f"خطا در نگهداری پارتیشن‌های تعاملات: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
 
-    # ثبت پایان سشن
-    if session_manager and session_manager.logged_in:
+async def bootstrap():
+    """آماده‌سازی یکباره دیتابیس و سرویس‌های وابسته در پس‌زمینه"""
+    startup["database"] = "initializing"
+    while not await executor.run(bootstrap_database):
+        # دیتابیس ممکن است بعداً در دسترس قرار گیرد؛ API در این مدت پاسخ می‌دهد
+        logging.error("خطا در آماده‌سازی دیتابیس؛ تلاش مجدد پس از 30 ثانیه")
+        startup["database"] = "retrying"
+        await asyncio.sleep(30)
+    startup["database"] = "ready"
+    mark_startup("database")
+    database_ready.set()
+
+    if registry.remote:
+        await registry.seed()
+    else:
+        # پیش‌بارگذاری instagrapi و مدیرها برای راه‌اندازی سریع‌تر اولین حساب
+        await executor.run(load_managers)
+        mark_startup("managers")
+
+    await partition_maintenance_loop()
+
+
+@app.on_event("startup")
+async def startup_event():
+    # بازپخش ژورنال محلی تعاملات از اجرای قبلی (در نبود دیتابیس منتظر می‌ماند)
+    interaction_writer.start()
+    app.state.bootstrap_task = asyncio.create_task(bootstrap())
+    mark_startup("listening")
+    logging.info(f"زمان‌بندی راه‌اندازی (میلی‌ثانیه): {startup['phases']}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logging.info("در حال خروج از برنامه...")
+    app.state.bootstrap_task.cancel()
+
+    # توقف بات‌های خودکار و ثبت پایان سشن‌ها (worker ها مستقل از API هستند)
+    if not registry.remote:
         try:
-            session_manager.record_session_end()
-            logging.info("پایان سشن ثبت شد")
+            await registry.stop_all()
+            logging.info("بات‌های خودکار متوقف شدند")
         except Exception as e:
-            logging.error(f"خطا در ثبت پایان سشن: {e}")
+            logging.error(f"خطا در توقف بات‌های خودکار: {e}")
+
+    # نوشتن تعاملات باقی‌مانده در بافر
+    await executor.run(interaction_writer.close)
+
+    # بستن استخر نخ اجراکننده و اتصال‌های موتور غیرهمزمان
+    executor.shutdown()
+    health_executor.shutdown()
+    await dispose_async_engine()
 
 # مسیرهای API اصلی
 
@@ -258,92 +262,111 @@ def read_root():
 
 @app.post("/start")
 async def start_bot(background_tasks: BackgroundTasks):
-    """راه‌اندازی بات"""
-    global session_manager, automated_bot
-
+    """راه‌اندازی بات برای همه حساب‌ها"""
     logging.info("درخواست راه‌اندازی بات دریافت شد")
 
-    if session_manager and session_manager.logged_in:
-        if automated_bot and automated_bot.running:
-            logging.info("بات در حال اجرای خودکار است")
-            return {"message": "بات در حال اجرای خودکار است", "status": "running"}
-        elif automated_bot:
-            await automated_bot.start()
-            logging.info("چرخه کاری خودکار بات مجدداً شروع شد")
-            return {"message": "چرخه کاری خودکار بات مجدداً شروع شد", "status": "started"}
+    if not len(await registry.refresh()):
+        return {"message": "هیچ حسابی تعریف نشده است", "status": "error"}
+
+    states = {}
+    for stack in registry:
+        states[stack.account_id] = await start_account(stack, background_tasks)
+
+    if all(state == "running" for state in states.values()):
+        logging.info("بات در حال اجرای خودکار است")
+        return {"message": "بات در حال اجرای خودکار است", "status": "running", "accounts": states}
 
-    background_tasks.add_task(run_bot)
     logging.info("بات در حال راه‌اندازی و شروع کار خودکار است")
-    return {"message": "بات در حال راه‌اندازی و شروع کار خودکار است", "status": "starting"}
+    return {"message": "بات در حال راه‌اندازی و شروع کار خودکار است", "status": "starting", "accounts": states}
 
 
 @app.post("/stop")
 async def stop_bot():
-    """توقف بات"""
-    global session_manager, automated_bot
-
+    """توقف بات برای همه حساب‌ها"""
     logging.info("درخواست توقف بات دریافت شد")
 
-    if not session_manager or not session_manager.logged_in:
+    if not registry.remote and not any(stack.logged_in or stack.running for stack in registry):
         logging.info("بات در حال اجرا نیست")
         return {"message": "بات در حال اجرا نیست", "status": "stopped"}
 
-    # توقف بات خودکار
-    if automated_bot and automated_bot.running:
-        try:
-            await automated_bot.stop()
-            logging.info("بات خودکار متوقف شد")
-        except Exception as e:
-            logging.error(f"خطا در توقف بات خودکار: {e}")
-            return {"message": f"خطا در توقف بات: {str(e)}", "status": "error"}
-
-    # ثبت پایان سشن در دیتابیس
     try:
-        session_manager.record_session_end()
-        session_manager.logged_in = False
+        await registry.stop_all()
         logging.info("بات متوقف شد و پایان سشن ثبت شد")
     except Exception as e:
-        logging.error(f"خطا در ثبت پایان سشن: {e}")
-        return {"message": f"خطا در ثبت پایان سشن: {str(e)}", "status": "error"}
+        logging.error(f"خطا در توقف بات: {e}")
+        return {"message": f"خطا در توقف بات: {str(e)}", "status": "error"}
 
     return {"message": "بات متوقف شد", "status": "stopped"}
 
 
 @app.get("/status")
-def get_status():
-    """دریافت وضعیت بات"""
-    global session_manager, automated_bot
-
+async def get_status():
+    """دریافت وضعیت بات (حساب پیش‌فرض و خلاصه همه حساب‌ها)"""
     logging.info("درخواست وضعیت بات دریافت شد")
+    await registry.refresh()
 
-    if not session_manager:
+    stack = registry.default()
+    if not stack or (not registry.remote and not stack.session_manager):
         return {
             "status": "stopped",
             "message": "بات راه‌اندازی نشده است",
             "details": {
                 "time": datetime.now().isoformat()
-            }
+            },
+            "accounts": registry.status()["accounts"]
         }
 
-    auto_status = "running" if (
-        automated_bot and automated_bot.running) else "stopped"
+    status = stack.status()
+    status["details"] = {"uptime": "نامشخص"}
+    status["accounts"] = registry.status()["accounts"]
+    return status
 
-    # اطلاعات آماری ساده
-    stats = {
-        "uptime": "نامشخص"
-    }
 
-    if hasattr(session_manager, 'logged_in_time'):
-        uptime = datetime.now() - session_manager.logged_in_time
-        stats["uptime"] = f"{uptime.total_seconds() / 3600:.1f} ساعت"
+@app.get("/accounts")
+async def list_accounts():
+    """دریافت وضعیت همه حساب‌ها"""
+    return (await registry.refresh()).status()
+
+
+@app.post("/accounts/{account_id}/start")
+async def start_account_bot(account_id: str, background_tasks: BackgroundTasks):
+    """راه‌اندازی بات یک حساب"""
+    stack = await get_account(account_id)
+    logging.info(f"درخواست راه‌اندازی حساب {account_id} دریافت شد")
+
+    state = await start_account(stack, background_tasks)
+    return {"account_id": account_id, "status": state}
+
+
+@app.post("/accounts/{account_id}/stop")
+async def stop_account_bot(account_id: str):
+    """توقف بات یک حساب"""
+    stack = await get_account(account_id)
+    logging.info(f"درخواست توقف حساب {account_id} دریافت شد")
+
+    try:
+        await stack.stop()
+    except Exception as e:
+        logging.error(f"خطا در توقف حساب {account_id}: {e}")
+        return {"account_id": account_id, "message": f"خطا در توقف بات: {str(e)}", "status": "error"}
 
+    return {"account_id": account_id, "status": "stopped"}
+
+
+@app.get("/accounts/{account_id}/status")
+async def get_account_status(account_id: str):
+    """دریافت وضعیت بات یک حساب"""
+    return (await get_account(account_id)).status()
+
+
+@app.get("/accounts/{account_id}/limits")
+async def get_account_limits(account_id: str):
+    """دریافت بودجه باقی‌مانده و سرعت فعلی عملیات یک حساب"""
+    status = (await get_account(account_id)).status()
     return {
-        "status": "running" if session_manager.logged_in else "stopped",
-        "auto_mode": auto_status,
-        "session_id": session_manager.session_id,
-        "last_operation": session_manager.last_operation,
-        "last_error": session_manager.last_error,
-        "details": stats
+        "account_id": account_id,
+        "rate_limits": status.get("rate_limits"),
+        "throttle": status.get("throttle")
     }
 
 # تنظیم حالت خودکار بات
@@ -351,83 +374,58 @@ def get_status():
 
 @app.post("/auto-mode/{state}")
 async def set_auto_mode(state: str):
-    """تنظیم حالت خودکار بات"""
-    global session_manager, automated_bot
-
+    """تنظیم حالت خودکار بات برای همه حساب‌های فعال"""
     logging.info(f"درخواست تنظیم حالت خودکار بات به {state} دریافت شد")
 
-    if not session_manager or not session_manager.logged_in:
+    if state.lower() not in ["on", "off"]:
+        logging.warning(f"دستور نامعتبر حالت خودکار: {state}")
+        return {"message": "دستور نامعتبر. از 'on' یا 'off' استفاده کنید", "success": False}
+
+    # در حالت control حالت خودکار همان وضعیت مطلوب حساب‌ها در worker هاست
+    if registry.remote:
+        if state.lower() == "on":
+            await registry.start_all()
+            return {"message": "حالت خودکار بات فعال شد", "success": True}
+        await registry.stop_all()
+        return {"message": "حالت خودکار بات غیرفعال شد", "success": True}
+
+    bots = [stack.automated_bot for stack in registry
+            if stack.logged_in and stack.automated_bot]
+    if not bots:
         logging.warning("بات در حال اجرا نیست")
         return {"message": "بات در حال اجرا نیست", "success": False}
 
-    if not automated_bot:
-        logging.warning("بات خودکار هنوز آماده نشده است")
-        return {"message": "بات خودکار هنوز آماده نشده است", "success": False}
+    try:
+        for bot in bots:
+            if state.lower() == "on" and not bot.running:
+                await bot.start()
+            elif state.lower() == "off" and bot.running:
+                await bot.stop()
+    except Exception as e:
+        logging.error(f"خطا در تنظیم حالت خودکار: {e}")
+        return {"message": f"خطا در تنظیم حالت خودکار: {str(e)}", "success": False}
 
     if state.lower() == "on":
-        if automated_bot.running:
-            logging.info("بات از قبل در حالت خودکار است")
-            return {"message": "بات از قبل در حالت خودکار است", "success": True}
-
-        try:
-            await automated_bot.start()
-            logging.info("حالت خودکار بات فعال شد")
-            return {"message": "حالت خودکار بات فعال شد", "success": True}
-        except Exception as e:
-            logging.error(f"خطا در فعال‌سازی حالت خودکار: {e}")
-            return {"message": f"خطا در فعال‌سازی حالت خودکار: {str(e)}", "success": False}
-
-    elif state.lower() == "off":
-        if not automated_bot.running:
-            logging.info("بات از قبل در حالت خودکار نیست")
-            return {"message": "بات از قبل در حالت خودکار نیست", "success": True}
-
-        try:
-            await automated_bot.stop()
-            logging.info("حالت خودکار بات غیرفعال شد")
-            return {"message": "حالت خودکار بات غیرفعال شد", "success": True}
-        except Exception as e:
-            logging.error(f"خطا در غیرفعال‌سازی حالت خودکار: {e}")
-            return {"message": f"خطا در غیرفعال‌سازی حالت خودکار: {str(e)}", "success": False}
+        logging.info("حالت خودکار بات فعال شد")
+        return {"message": "حالت خودکار بات فعال شد", "success": True}
 
-    logging.warning(f"دستور نامعتبر حالت خودکار: {state}")
-    return {"message": "دستور نامعتبر. از 'on' یا 'off' استفاده کنید", "success": False}
+    logging.info("حالت خودکار بات غیرفعال شد")
+    return {"message": "حالت خودکار بات غیرفعال شد", "success": True}
 
 # راه‌اندازی مجدد اجباری
 
 
 @app.post("/force-restart")
 async def force_restart(background_tasks: BackgroundTasks):
-    """راه‌اندازی مجدد اجباری بات"""
-    global session_manager, automated_bot
-
+    """راه‌اندازی مجدد اجباری همه حساب‌ها"""
     logging.info("درخواست راه‌اندازی مجدد اجباری بات دریافت شد")
 
-    # توقف بات فعلی
-    if automated_bot and automated_bot.running:
-        try:
-            await automated_bot.stop()
-            logging.info("بات خودکار متوقف شد")
-        except Exception as e:
-            logging.error(f"خطا در توقف بات خودکار: {e}")
+    # توقف و بازنشانی پشته‌های فعلی
+    await registry.reset_all()
 
-    # ثبت پایان سشن فعلی
-    if session_manager and session_manager.logged_in:
-        try:
-            session_manager.record_session_end()
-            logging.info("پایان سشن ثبت شد")
-        except Exception as e:
-            logging.error(f"خطا در ثبت پایان سشن: {e}")
-
-    # بازنشانی نمونه‌ها
-    session_manager = None
-    interaction_manager = None
-    follower_manager = None
-    comment_manager = None
-    automated_bot = None
-
-    # شروع مجدد
-    background_tasks.add_task(run_bot)
+    # شروع مجدد (در حالت control خود worker ها حساب‌ها را دوباره راه‌اندازی می‌کنند)
+    if not registry.remote:
+        background_tasks.add_task(when_database_ready, registry.start_all)
     logging.info("بات در حال راه‌اندازی مجدد است")
 
     return {"message": "بات در حال راه‌اندازی مجدد اجباری است", "status": "restarting"}
@@ -438,14 +436,13 @@ if __name__ == "__main__":
 
 
 @app.get("/quick-status")
-def quick_status():
+async def quick_status():
     """دریافت سریع وضعیت بات"""
-    global session_manager, automated_bot
-
-    bot_status = "running" if (
-        session_manager and session_manager.logged_in) else "offline"
-    auto_status = "running" if (
-        automated_bot and automated_bot.running) else "stopped"
+    await registry.refresh()
+    bot_status = "running" if any(
+        stack.logged_in for stack in registry) else "offline"
+    auto_status = "running" if any(
+        stack.running for stack in registry) else "stopped"
 
     return {
         "status": "healthy",
@@ -0,0 +1,193 @@
+"""پروسه worker بات برای اجرای بخشی از حساب‌ها
+
+اجرا:
+    python -m app.worker --max-accounts 3
+
+هر worker حساب‌ها را از جدول account_leases اجاره می‌کند، اجاره را با
+heartbeat تمدید می‌کند و با از کار افتادن یک worker حساب‌های آن پس از
+انقضای اجاره به worker های دیگر منتقل می‌شوند.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import socket
+import time
+import uuid
+
+from app.config import (
+    INSTAGRAM_ACCOUNTS,
+    EXECUTOR_MAX_WORKERS,
+    WORKER_MAX_ACCOUNTS,
+    LEASE_TTL_SECONDS,
+    LEASE_HEARTBEAT_SECONDS,
+    PARTITION_MAINTENANCE_INTERVAL
+)
+from app.database.init_db import bootstrap_database
+from app.database.leases import LeaseManager
+from app.database.interaction_writer import interaction_writer
+from app.database.partitions import maintain_partitions
+from app.database.connection import get_engine
+from app.bot.account_registry import AccountRegistry
+from app.bot.executor import BotExecutor
+from app.bot.utils import setup_logger
+
+
+class BotWorker:
+    """اجرای حساب‌های اجاره شده روی یک حلقه رویداد و استخر نخ"""
+
+    def __init__(self, worker_id, max_accounts=WORKER_MAX_ACCOUNTS,
+                 ttl_seconds=LEASE_TTL_SECONDS, heartbeat_seconds=LEASE_HEARTBEAT_SECONDS):
+        self.worker_id = worker_id
+        self.max_accounts = max_accounts
+        self.heartbeat_seconds = heartbeat_seconds
+        self.logger = setup_logger().bind(account_id=worker_id)
+        self.leases = LeaseManager(worker_id, ttl_seconds)
+        self.executor = BotExecutor()
+        # نخ جداگانه برای اجاره‌ها تا heartbeat پشت انتظارهای طولانی بات‌ها
+        # (استراحت، challenge) در صف نماند و اجاره منقضی نشود
+        self.lease_executor = BotExecutor(max_workers=1, max_threads=1)
+        self.registry = AccountRegistry(self.executor, accounts=[])
+        self.credentials = {account["username"]: account["password"]
+                            for account in INSTAGRAM_ACCOUNTS}
+        self.tasks = {}
+        self.stopping = asyncio.Event()
+        # اولین نگهداری در اولین دور (bootstrap با ساختار به‌روز آن را رد می‌کند)
+        self.next_maintenance = time.monotonic()
+
+    async def run(self):
+        """حلقه اصلی worker"""
+        self.logger.info(f"🚀 شروع worker {self.worker_id}")
+        # بازپخش ژورنال محلی تعاملات از اجرای قبلی
+        interaction_writer.start()
+        await self.lease_executor.run(
+            self.leases.seed_accounts, list(self.credentials))
+
+        while not self.stopping.is_set():
+            try:
+                await self._tick()
+            except Exception as e:
+                self.logger.error(f"خطا در چرخه worker: {e}")
+
+            try:
+                await asyncio.wait_for(
+                    self.stopping.wait(), timeout=self.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        await self._shutdown()
+
+    async def _tick(self):
+        """تمدید اجاره‌ها، اعمال وضعیت مطلوب و برداشتن حساب‌های جدید"""
+        statuses = {stack.account_id: stack.status()
+                    for stack in self.registry}
+        owned = await self.lease_executor.run(self.leases.heartbeat, statuses)
+
+        if owned is not None:
+            for account_id in list(statuses):
+                desired = owned.get(account_id)
+                if desired is None:
+                    # اجاره از دست رفته است (مثلاً منقضی و به worker دیگری داده شده)
+                    self.logger.warning(f"اجاره حساب {account_id} از دست رفت")
+                    await self._drop(account_id, release=False)
+                elif desired == "stopped":
+                    await self._drop(account_id)
+                elif desired == "restart":
+                    await self._restart(account_id)
+
+        # حساب‌هایی که راه‌اندازی آن‌ها (مثلاً لاگین) ناموفق بوده آزاد می‌شوند
+        for account_id, task in list(self.tasks.items()):
+            stack = self.registry.stacks.get(account_id)
+            if task.done() and stack and not stack.logged_in:
+                self.logger.warning(f"راه‌اندازی حساب {account_id} ناموفق بود")
+                await self._drop(account_id)
+
+        # نگهداری پارتیشن‌ها (قفل مشورتی اجرای هم‌زمان چند worker را رد می‌کند)
+        if time.monotonic() >= self.next_maintenance:
+            self.next_maintenance = time.monotonic() + PARTITION_MAINTENANCE_INTERVAL
+            await self.executor.run(maintain_partitions, get_engine())
+
+        capacity = self.max_accounts - len(self.registry)
+        claimed = await self.lease_executor.run(
+            self.leases.claim, capacity, list(self.credentials))
+        for account_id in claimed:
+            stack = self.registry.add(
+                account_id, self.credentials[account_id])
+            self.tasks[account_id] = asyncio.create_task(stack.start())
+            self.logger.info(f"حساب {account_id} به این worker اختصاص یافت")
+
+    async def _drop(self, account_id, release=True):
+        """توقف و حذف یک حساب از این worker"""
+        stack = self.registry.remove(account_id)
+        task = self.tasks.pop(account_id, None)
+        if task and not task.done():
+            task.cancel()
+        if stack:
+            try:
+                await stack.stop()
+            except Exception as e:
+                self.logger.error(f"خطا در توقف حساب {account_id}: {e}")
+        if release:
+            await self.lease_executor.run(self.leases.release, [account_id])
+        self.logger.info(f"حساب {account_id} از این worker حذف شد")
+
+    async def _restart(self, account_id):
+        """راه‌اندازی مجدد اجباری یک حساب"""
+        stack = self.registry.get(account_id)
+        await stack.reset()
+        await self.lease_executor.run(
+            self.leases.set_desired_state, [account_id], "running")
+        self.tasks[account_id] = asyncio.create_task(stack.start())
+
+    async def _shutdown(self):
+        """توقف همه حساب‌ها و آزادسازی اجاره‌ها"""
+        self.logger.info(f"🛑 توقف worker {self.worker_id}")
+        account_ids = [stack.account_id for stack in self.registry]
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+        await self.registry.stop_all()
+        await self.executor.run(interaction_writer.close)
+        await self.lease_executor.run(self.leases.release, account_ids)
+        self.executor.shutdown()
+        self.lease_executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instagram bot worker")
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--max-accounts", type=int,
+                        default=WORKER_MAX_ACCOUNTS)
+    parser.add_argument("--lease-ttl", type=int, default=LEASE_TTL_SECONDS)
+    parser.add_argument("--heartbeat", type=int,
+                        default=LEASE_HEARTBEAT_SECONDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    # هر حساب در حال اجرا می‌تواند یک ظرفیت اجراکننده را اشغال کند؛ دست‌کم
+    # یک ظرفیت برای ژورنال تعاملات و نگهداری پارتیشن‌ها آزاد می‌ماند
+    if args.max_accounts >= EXECUTOR_MAX_WORKERS:
+        raise SystemExit(
+            f"--max-accounts ({args.max_accounts}) باید کمتر از "
+            f"EXECUTOR_MAX_WORKERS ({EXECUTOR_MAX_WORKERS}) باشد")
+
+    if not bootstrap_database():
+        raise SystemExit("دیتابیس آماده نیست")
+
+    worker_id = args.worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    worker = BotWorker(worker_id, args.max_accounts,
+                       args.lease_ttl, args.heartbeat)
+
+    async def runner():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stopping.set)
+        await worker.run()
+
+    asyncio.run(runner())
+
+
+if __name__ == "__main__":
+    main()